@@ -0,0 +1,40 @@
+"""Boot Django against a throwaway SQLite database for benchmarking."""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup(db_path=None):
+    sys.path.insert(0, str(BASE_DIR))
+    import django
+    from django.conf import settings
+
+    from ecommerce import settings as project_settings
+
+    db_path = db_path or os.path.join(tempfile.mkdtemp(prefix="shop-bench-"), "bench.sqlite3")
+    values = {name: getattr(project_settings, name) for name in dir(project_settings) if name.isupper()}
+    # Connection reuse (DB_CONN_MAX_AGE, DB_POOL_SIZE, ...) follows the
+    # environment, as in settings.py, so the same run compares them.
+    # Concurrent benchmark workers share the file: take the write lock when a
+    # transaction starts (a deferred read->write upgrade fails instead of
+    # waiting) and wait for it rather than erroring
+    values["DATABASES"] = {
+        "default": {
+            **project_settings.DATABASES["default"],
+            "ENGINE": "users.db.sqlite3",
+            "NAME": db_path,
+            "OPTIONS": {"timeout": 30, "transaction_mode": "IMMEDIATE"},
+        }
+    }
+    values["DATABASE_REPLICAS"] = []  # one file; DB_REPLICAS would point at the project's database
+    values["DEBUG"] = False
+    values["ALLOWED_HOSTS"] = ["testserver", "127.0.0.1", "localhost"]
+    settings.configure(**values)
+    django.setup()
+
+    from django.core.management import call_command
+    call_command("migrate", verbosity=0)
+    return db_path
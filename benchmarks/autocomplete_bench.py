@@ -0,0 +1,59 @@
+"""Time prefix lookups against the in-process autocomplete index.
+
+    python benchmarks/autocomplete_bench.py --products 100000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from _django import setup
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=5000)
+    args = parser.parse_args()
+
+    setup()
+    from django.db.models.signals import post_save
+
+    from search_bench import WORDS, vocabulary
+    from users import autocomplete, search
+    from users.models import Category, Product
+
+    post_save.disconnect(search.reindex_product, sender=Product)
+    post_save.disconnect(autocomplete.index_product_name, sender=Product)
+    rng = random.Random(7)
+    vocab = vocabulary(rng)
+    categories = [Category.objects.create(name=word.title()) for word in WORDS[:20]]
+    Product.objects.bulk_create(
+        (Product(
+            category=rng.choice(categories),
+            name=" ".join(rng.choices(vocab, k=3)).title(),
+            slug=f"p-{i}",
+            price=100,
+            sold=int(rng.paretovariate(1.2)),
+        ) for i in range(args.products)),
+        batch_size=5000,
+    )
+
+    start = time.perf_counter()
+    autocomplete.index.build()
+    print(f"products: {args.products}, index build: {time.perf_counter() - start:.2f}s")
+
+    prefixes = [word[:rng.randint(2, len(word))] for word in rng.choices(vocab, k=args.lookups)]
+    autocomplete.index._cache.clear()
+    for label in ("cold", "cached"):
+        samples = []
+        for prefix in prefixes:
+            t = time.perf_counter()
+            autocomplete.index.lookup(prefix, 8)
+            samples.append((time.perf_counter() - t) * 1_000_000)
+        samples.sort()
+        print(f"{label:>7}: p50 {statistics.median(samples):.0f} us, p99 {samples[int(len(samples) * 0.99)]:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Compare the search index with the old name__icontains scan.
+
+    python benchmarks/search_bench.py --products 100000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from _django import setup
+
+WORDS = (
+    "cotton linen silk denim leather wool summer winter classic slim regular "
+    "casual formal party kurta saree shirt dress jeans jacket shoe sneaker "
+    "sandal bag watch scarf belt cap red blue black white green printed"
+).split()
+
+
+def vocabulary(rng, size=5000):
+    # Common product words plus a long tail of synthetic brand/style words
+    tail = {"".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(4, 9))) for _ in range(size)}
+    return WORDS + sorted(tail)
+
+
+def seed(n_products):
+    from django.db.models.signals import post_save
+
+    from users.models import Category, Product
+    from users.search import rebuild_index, reindex_product
+
+    categories = [Category.objects.create(name=f"Category {i}") for i in range(20)]
+    rng = random.Random(42)
+    vocab = vocabulary(rng)
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]  # Zipfian word frequency
+    post_save.disconnect(reindex_product, sender=Product)
+    batch = []
+    for i in range(n_products):
+        name = " ".join(rng.choices(vocab, weights, k=3))
+        batch.append(Product(
+            category=rng.choice(categories),
+            name=name.title(),
+            slug=f"p-{i}",
+            description=" ".join(rng.choices(vocab, weights, k=20)),
+            price=rng.randint(100, 5000),
+            sold=int(rng.paretovariate(1.2)),
+            is_featured=rng.random() < 0.02,
+        ))
+        if len(batch) == 5000:
+            Product.objects.bulk_create(batch)
+            batch = []
+    Product.objects.bulk_create(batch)
+
+    start = time.perf_counter()
+    rebuild_index(batch_size=5000)
+    return time.perf_counter() - start
+
+
+def timed(fn, queries, repeat):
+    samples = []
+    for _ in range(repeat):
+        for q in queries:
+            start = time.perf_counter()
+            fn(q)
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup()
+    index_seconds = seed(args.products)
+
+    from users.models import Product
+    from users.search import search_products
+
+    queries = ["shirt", "silk saree", "black leather jacket", "summer cotton dress", "watch"]
+
+    def icontains(q):
+        # What the views did before: every match, unranked, name only
+        return list(Product.objects.filter(name__icontains=q))
+
+    def indexed(q):
+        return list(search_products(q, per_page=20).object_list)
+
+    print(f"products: {args.products}, index build: {index_seconds:.1f}s")
+    for label, fn in (("icontains", icontains), ("search index", indexed)):
+        p50, p95 = timed(fn, queries, args.repeat)
+        print(f"{label:>14}: p50 {p50:.1f} ms, p95 {p95:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
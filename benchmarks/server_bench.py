@@ -0,0 +1,199 @@
+"""Compare WSGI and ASGI serving of the async storefront views under slow clients.
+
+    pip install uvicorn
+    python benchmarks/server_bench.py --clients 40 --slow-ms 2000 --threads 16
+
+Each of --clients concurrent clients opens a connection, trickles its request
+headers over --slow-ms (a phone on a poor network), reads the response and
+starts over, for --duration seconds per server. The WSGI server has a fixed
+pool of --threads workers, like gunicorn's gthread worker, so a slow client
+holds a worker while it sends; the ASGI server (uvicorn) reads requests on
+its event loop. Latency is measured from the last request byte to the end of
+the response, i.e. the time spent queued and served, not the deliberate
+trickle. Servers and clients share one process, so absolute numbers are
+pessimistic; compare the two rows.
+
+Both servers serve the async views (ASYNC_VIEWS=1, as ecommerce/asgi.py
+sets). For the sync views WSGI deployments get, run the WSGI row on its own:
+
+    ASYNC_VIEWS=0 python benchmarks/server_bench.py --servers wsgi
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from _django import setup
+from storefront_bench import SEARCH_TERMS, percentile, seed
+
+ENDPOINTS = ("shop", "product_detail", "search", "cart_count")
+
+
+# --------------------- SERVERS --------------------- #
+def start_wsgi_server(threads):
+    from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+    from django.core.wsgi import get_wsgi_application
+
+    class PooledServer(WSGIServer):
+        pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+        request_queue_size = 1024
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self.handle, request, client_address)
+
+        def handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = make_server("127.0.0.1", 0, get_wsgi_application(), server_class=PooledServer, handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_port, server.shutdown
+
+
+def start_asgi_server():
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("The ASGI run needs uvicorn: pip install uvicorn")
+    from django.core.asgi import get_asgi_application
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(
+        get_asgi_application(), host="127.0.0.1", port=port, log_level="warning", lifespan="off", backlog=1024,
+    ))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+    return port, stop
+
+
+# --------------------- CLIENTS --------------------- #
+def paths(slugs):
+    from django.urls import reverse
+
+    def path(endpoint, rng):
+        if endpoint == "product_detail":
+            return reverse("users:product_detail", args=[rng.choice(slugs)])
+        if endpoint == "search":
+            return reverse("users:search") + "?q=" + rng.choice(SEARCH_TERMS).replace(" ", "+")
+        return reverse(f"users:{endpoint}")
+    return path
+
+
+async def slow_request(port, path, cookie, slow_ms, chunks=8):
+    """(status, seconds from the last request byte to the end of the response)."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookie}\r\nConnection: close\r\n\r\n".encode()
+    step = -(-len(head) // chunks)
+    for i in range(0, len(head), step):
+        writer.write(head[i:i + step])
+        await writer.drain()
+        if i + step < len(head):
+            await asyncio.sleep(slow_ms / 1000 / chunks)
+    start = time.perf_counter()
+    response = await reader.read()
+    elapsed = time.perf_counter() - start
+    writer.close()
+    status = int(response.split(b" ", 2)[1]) if response.startswith(b"HTTP/") else 0
+    return status, elapsed
+
+
+async def drive(port, args, path, cookie):
+    samples = {endpoint: [] for endpoint in args.endpoints}
+    errors = 0
+    deadline = time.perf_counter() + args.duration
+
+    async def client(index):
+        nonlocal errors
+        rng = random.Random(index)
+        turn = index
+        while time.perf_counter() < deadline:
+            endpoint = args.endpoints[turn % len(args.endpoints)]
+            turn += 1
+            try:
+                status, elapsed = await slow_request(port, path(endpoint, rng), cookie, args.slow_ms)
+            except OSError:
+                status, elapsed = 0, 0
+            if status != 200:
+                errors += 1
+                continue
+            samples[endpoint].append(elapsed * 1000)
+
+    await asyncio.gather(*(client(i) for i in range(args.clients)))
+    return samples, errors
+
+
+def report(name, samples, errors, duration):
+    total = sum(len(s) for s in samples.values())
+    print(f"{name}: {total / duration:.1f} req/s, {errors} errors")
+    print(f"  {'endpoint':<16} {'reqs':>6} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for endpoint, values in samples.items():
+        values.sort()
+        print(f"  {endpoint:<16} {len(values):>6} {percentile(values, 0.5):>8.1f} "
+              f"{percentile(values, 0.95):>8.1f} {percentile(values, 0.99):>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", help="Reuse (or create) this SQLite file instead of a temporary one.")
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--sellers", type=int, default=10)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--clients", type=int, default=40, help="Concurrent slow clients.")
+    parser.add_argument("--slow-ms", type=int, default=2000, help="Time each client takes to send its request.")
+    parser.add_argument("--threads", type=int, default=16, help="WSGI worker threads.")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per server.")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--servers", default="wsgi,asgi")
+    args = parser.parse_args()
+    args.endpoints = args.endpoints.split(",")
+
+    fresh = not (args.db and os.path.exists(args.db))
+    os.environ.setdefault("ASYNC_VIEWS", "1")
+    setup(args.db)
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+
+    from users.models import Product
+
+    if fresh:
+        start = time.perf_counter()
+        seed(args)
+        print(f"seeded in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    client = Client()
+    client.force_login(get_user_model().objects.filter(username__startswith="user").first())
+    cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+    path = paths(list(Product.objects.order_by("-sold").values_list("slug", flat=True)[:200]))
+
+    for name in args.servers.split(","):
+        port, stop = start_wsgi_server(args.threads) if name == "wsgi" else start_asgi_server()
+        samples, errors = asyncio.run(drive(port, args, path, cookie))
+        stop()
+        report(f"{name} ({args.threads} threads)" if name == "wsgi" else name, samples, errors, args.duration)
+
+
+if __name__ == "__main__":
+    main()
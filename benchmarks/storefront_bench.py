@@ -0,0 +1,319 @@
+"""Load-test the storefront's key pages and compare against a stored baseline.
+
+    python benchmarks/storefront_bench.py --products 20000 --workers 8
+    python benchmarks/storefront_bench.py --wsgi            # real HTTP server
+    python benchmarks/storefront_bench.py --save-baseline   # after an intended change
+
+Seeds a throwaway SQLite database (or reuses --db), then drives each endpoint
+with --workers concurrent clients and reports p50/p95/p99 latency,
+throughput, queries and connection acquire time per request (read from the
+Server-Timing header the view metrics middleware adds). Query counts are compared exactly against the
+baseline; latencies only with --tolerance, and only mean something when the
+baseline was recorded on the same machine.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.request import HTTPRedirectHandler
+
+from _django import setup
+
+BASELINE = Path(__file__).resolve().parent / "baselines" / "storefront.json"
+ENDPOINTS = ("shop", "product_list", "search", "view_cart", "checkout", "my_orders", "seller_dashboard")
+SEARCH_TERMS = ("shirt", "silk saree", "black leather jacket", "summer cotton dress", "watch")
+CHECKOUT_FORM = {
+    "full_name": "Bench Buyer", "email": "buyer@example.com", "address": "1 Main St", "city": "Pune",
+    "state": "MH", "zip_code": "411001", "phone": "12345", "payment_method": "cod",
+}
+
+
+# --------------------- SEEDING --------------------- #
+def seed(args):
+    from users.analytics import rebuild_rollups
+    from users.models import Product
+    from users.recommendations import rebuild_recommendations
+    from users.search import rebuild_index
+    from users.seeding import StoreSeeder
+
+    seeder = StoreSeeder(args.seed)
+    seeder.categories(args.categories)
+    seeder.users(args.sellers + args.users, args.sellers)
+    seeder.products(args.products)
+    seeder.carts(1.0)
+    seeder.wishlists(0.3)
+    seeder.orders(args.orders)
+    seeder.update_sold_counts()
+    Product.objects.update(stock=1_000_000)  # checkout runs must not sell out
+    rebuild_index()
+    rebuild_rollups()
+    rebuild_recommendations()
+
+
+# --------------------- TRANSPORTS --------------------- #
+class ClientTransport:
+    """In-process requests through django.test.Client."""
+
+    def __init__(self, user):
+        from django.test import Client
+
+        self.client = Client(raise_request_exception=False)
+        self.client.force_login(user)
+
+    def request(self, method, path, data=None):
+        response = getattr(self.client, method)(path, data or {})
+        return response.status_code, response.get("Server-Timing", "")
+
+
+class WSGITransport:
+    """Real HTTP requests against a local threaded WSGI server."""
+
+    def __init__(self, user, base_url):
+        from http.cookiejar import CookieJar
+        from urllib.request import HTTPCookieProcessor, build_opener
+
+        from django.conf import settings
+        from django.test import Client
+
+        client = Client()
+        client.force_login(user)
+        self.base_url = base_url
+        self.jar = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.jar), _NoRedirects())
+        self.session = client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.session_cookie = settings.SESSION_COOKIE_NAME
+        self.csrf_token = None
+
+    def request(self, method, path, data=None):
+        from urllib.error import HTTPError
+        from urllib.parse import urlencode
+        from urllib.request import Request
+
+        body = None
+        if method == "get" and data:
+            path = f"{path}?{urlencode(data)}"
+        headers = {"Cookie": f"{self.session_cookie}={self.session}"}
+        if method == "post":
+            if self.csrf_token is None:
+                self.request("get", path)
+                self.csrf_token = next(c.value for c in self.jar if c.name == "csrftoken")
+            headers["Cookie"] += f"; csrftoken={self.csrf_token}"
+            body = urlencode(dict(data or {}, csrfmiddlewaretoken=self.csrf_token)).encode()
+        request = Request(self.base_url + path, data=body, headers=headers, method=method.upper())
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status, response.headers.get("Server-Timing", "")
+        except HTTPError as e:
+            return e.code, e.headers.get("Server-Timing", "")
+
+
+class _NoRedirects(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def start_wsgi_server():
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+    from django.core.wsgi import get_wsgi_application
+
+    class Server(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = make_server("127.0.0.1", 0, get_wsgi_application(), server_class=Server, handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+# --------------------- SCENARIOS --------------------- #
+def scenario(endpoint, rng):
+    """(method, url name, data) for one request to the endpoint."""
+    if endpoint == "search":
+        return "get", "users:search", {"q": rng.choice(SEARCH_TERMS)}
+    if endpoint == "checkout":
+        return "post", "users:checkout", CHECKOUT_FORM
+    return "get", f"users:{endpoint}", None
+
+
+def refill_cart(user, products, rng):
+    from users.models import Cart, CartItem
+
+    cart, _ = Cart.objects.get_or_create(user=user)
+    CartItem.objects.bulk_create(
+        CartItem(cart=cart, product_id=product_id, quantity=1) for product_id in rng.sample(products, 2)
+    )
+
+
+def queries_from(server_timing):
+    for part in server_timing.split(","):
+        if part.strip().startswith("db;") and 'desc="' in part:
+            return int(part.split('desc="')[1].split()[0])
+    return None
+
+
+def connect_ms_from(server_timing):
+    for part in server_timing.split(","):
+        if part.strip().startswith("conn;dur="):
+            return float(part.split("dur=")[1].split(";")[0])
+    return None
+
+
+def run_endpoint(endpoint, transports, requests_per_endpoint, products, warmup):
+    from django.db import close_old_connections
+    from django.urls import reverse
+
+    def worker(index):
+        transport, user = transports[index]
+        rng = random.Random(index)
+        samples, queries, connects, errors = [], [], [], 0
+        count = requests_per_endpoint // len(transports) + (index < requests_per_endpoint % len(transports))
+        for i in range(warmup + count):
+            method, name, data = scenario(endpoint, rng)
+            if endpoint == "checkout":
+                refill_cart(user, products, rng)  # not timed
+            start = time.perf_counter()
+            status, timing = transport.request(method, reverse(name), data)
+            elapsed = (time.perf_counter() - start) * 1000
+            if i < warmup:
+                continue
+            if status >= 400:
+                errors += 1
+            samples.append(elapsed)
+            if (q := queries_from(timing)) is not None:
+                queries.append(q)
+            if (c := connect_ms_from(timing)) is not None:
+                connects.append(c)
+        close_old_connections()
+        return samples, queries, connects, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(transports)) as pool:
+        results = list(pool.map(worker, range(len(transports))))
+    wall = time.perf_counter() - start
+
+    samples = sorted(s for r in results for s in r[0])
+    queries = [q for r in results for q in r[1]]
+    connects = [c for r in results for c in r[2]]
+    return {
+        "requests": len(samples),
+        "errors": sum(r[3] for r in results),
+        "p50_ms": round(percentile(samples, 0.50), 2),
+        "p95_ms": round(percentile(samples, 0.95), 2),
+        "p99_ms": round(percentile(samples, 0.99), 2),
+        "throughput_rps": round(len(samples) / wall, 1) if wall else 0,
+        "queries": round(statistics.mean(queries), 1) if queries else None,
+        "max_queries": max(queries) if queries else None,
+        "connect_ms": round(statistics.mean(connects), 2) if connects else None,
+    }
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+# --------------------- BASELINES --------------------- #
+def compare(results, baseline, tolerance):
+    """Human-readable regressions of results against the baseline."""
+    regressions = []
+    for endpoint, result in results.items():
+        base = baseline.get(endpoint)
+        if not base:
+            continue
+        if result["errors"]:
+            regressions.append(f"{endpoint}: {result['errors']} failed requests")
+        if base.get("max_queries") is not None and (result["max_queries"] or 0) > base["max_queries"]:
+            regressions.append(f"{endpoint}: {result['max_queries']} queries (baseline {base['max_queries']})")
+        for key in ("p95_ms", "p99_ms"):
+            if result[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{endpoint}: {key} {result[key]} (baseline {base[key]}, +{tolerance:.0%} allowed)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", help="Reuse (or create) this SQLite file instead of a temporary one.")
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--sellers", type=int, default=10)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100, help="Timed requests per endpoint.")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed requests per worker and endpoint.")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--wsgi", action="store_true", help="Go through a local WSGI server instead of the test client.")
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed latency growth over the baseline.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    fresh = not (args.db and os.path.exists(args.db))
+    setup(args.db)
+    from django.contrib.auth import get_user_model
+    from users.models import Product
+
+    User = get_user_model()
+    if fresh:
+        start = time.perf_counter()
+        seed(args)
+        print(f"seeded in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    buyers = list(User.objects.filter(username__startswith="user").order_by("id")[:args.workers])
+    seller = Product.objects.exclude(seller=None).values_list("seller", flat=True).first()
+    seller = User.objects.get(pk=seller)
+    products = list(Product.objects.values_list("id", flat=True)[:1000])
+
+    server = None
+    if args.wsgi:
+        server, base_url = start_wsgi_server()
+        make = lambda user: WSGITransport(user, base_url)  # noqa: E731
+    else:
+        make = ClientTransport
+
+    results = {}
+    for endpoint in args.endpoints.split(","):
+        users = [seller] * args.workers if endpoint == "seller_dashboard" else buyers
+        transports = [(make(user), user) for user in users]
+        results[endpoint] = run_endpoint(endpoint, transports, args.requests, products, args.warmup)
+    if server:
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'endpoint':<18} {'reqs':>5} {'err':>4} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'queries':>8} "
+              f"{'conn ms':>8}")
+        for endpoint, r in results.items():
+            print(f"{endpoint:<18} {r['requests']:>5} {r['errors']:>4} {r['p50_ms']:>8} {r['p95_ms']:>8} "
+                  f"{r['p99_ms']:>8} {r['throughput_rps']:>8} {r['queries'] if r['queries'] is not None else '-':>8} "
+                  f"{r['connect_ms'] if r['connect_ms'] is not None else '-':>8}")
+
+    if args.save_baseline:
+        Path(args.baseline).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.baseline).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        print(f"baseline saved to {args.baseline}", file=sys.stderr)
+    elif os.path.exists(args.baseline):
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce.settings')
+# Persistent connections are per thread, and each ASGI request gets its own
+# thread for database work, so share connections through a pool instead
+os.environ.setdefault('DB_POOL_SIZE', '20')
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'users.metrics.ViewMetricsMiddleware',
+    'users.db.replicas.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,7 +60,7 @@ ROOT_URLCONF = 'ecommerce.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'users.metrics.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -63,6 +68,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'users.context_processors.navbar_counts',
             ],
         },
     },
@@ -70,21 +76,74 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'ecommerce.wsgi.application'
 
+# Serve the read-heavy storefront pages with their async views (see
+# users/urls.py). ecommerce/asgi.py turns it on; under WSGI every async view
+# would need an event loop of its own, about 4 ms per request.
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "0") == "1"
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'ecommerce_db2305',
-        'USER': 'root',
-        'PASSWORD': 'amol**2301',
-        'HOST': 'localhost',
-        'PORT': '3306',
+#
+# Read from the environment; without DB_ENGINE=mysql it falls back to the
+# local SQLite file (handy for benchmarks and quick local runs).
+#   DB_ENGINE              mysql | sqlite
+#   DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+#   DB_CONN_MAX_AGE        seconds a connection is kept for later requests
+#   DB_CONN_HEALTH_CHECKS  check a kept or pooled connection before reusing it
+#   DB_POOL_SIZE           connections per process in the users.db pool, 0 = off.
+#                          ecommerce/asgi.py turns it on: under ASGI a request's
+#                          queries run on a thread of its own, so per-thread
+#                          persistent connections would never be reused.
+#   DB_REPLICAS            comma-separated read replicas: hosts for mysql (same
+#                          name and credentials), files for sqlite. They become
+#                          aliases replica1, replica2, ... which
+#                          users.db.replicas routes catalog and reporting reads
+#                          to. Locally, `manage.py sync_replica` copies the
+#                          SQLite primary over its replicas.
+
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 0))
+
+if DB_ENGINE == "mysql":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'users.db.mysql',
+            'NAME': os.environ.get("DB_NAME", "ecommerce"),
+            'USER': os.environ.get("DB_USER", "root"),
+            'PASSWORD': os.environ.get("DB_PASSWORD", ""),
+            'HOST': os.environ.get("DB_HOST", "localhost"),
+            'PORT': os.environ.get("DB_PORT", "3306"),
+        }
+    }
+elif DB_ENGINE == "sqlite":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'users.db.sqlite3',
+            'NAME': os.environ.get("DB_NAME", BASE_DIR / "db.sqlite3"),
+            'OPTIONS': {"timeout": 20},
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"DB_ENGINE must be mysql or sqlite, not {DB_ENGINE!r}")
+
+DATABASES['default'].update({
+    # Pooled connections go back to the pool at the end of each request instead
+    'CONN_MAX_AGE': 0 if DB_POOL_SIZE else int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+    'CONN_HEALTH_CHECKS': os.environ.get("DB_CONN_HEALTH_CHECKS", "1") == "1",
+    'POOL': {'SIZE': DB_POOL_SIZE},
+})
+
+DATABASE_REPLICAS = []
+for number, replica in enumerate(filter(None, os.environ.get("DB_REPLICAS", "").split(",")), 1):
+    DATABASE_REPLICAS.append(f"replica{number}")
+    DATABASES[f"replica{number}"] = {
+        **DATABASES['default'],
+        'HOST' if DB_ENGINE == "mysql" else 'NAME': replica.strip(),
+        'TEST': {'MIRROR': 'default'},
     }
-}
 
+DATABASE_ROUTERS = ['users.db.replicas.ReplicaRouter']
 
 
 # Password validation
@@ -120,6 +179,29 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Per-view query/latency metrics (users/metrics.py); `manage.py view_metrics`
+# prints the histogram the workers flush here
+VIEW_METRICS_DIR = BASE_DIR / "var" / "view-metrics"
+VIEW_METRICS_FLUSH_INTERVAL = 30
+VIEW_METRICS_SERVER_TIMING = True
+
+# Opt-in slow/duplicate query report (users/querylog.py)
+QUERY_INSPECTOR = False
+QUERY_REPORT_FILE = BASE_DIR / "var" / "queries.jsonl"
+SLOW_QUERY_MS = 100
+DUPLICATE_QUERY_THRESHOLD = 5
+
+# Navbar counts and catalog fragments (users/fragments.py) live here. The
+# default 300-entry limit evicts a catalog's product cards faster than they are
+# reused; with several workers use a shared backend (Redis/Memcached) so a
+# product edit invalidates every worker's copy.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 100_000},
+    }
+}
+
 # Redirect users to this login URL if they are not logged in
 LOGIN_URL = 'login'  # This should match the name of your login URL
 LOGIN_REDIRECT_URL = 'base'  # e.g., home page
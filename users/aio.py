@@ -0,0 +1,106 @@
+import asyncio
+import inspect
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .db.pool import PoolExhausted, borrowing
+
+
+# --------------------- ASYNC VIEWS --------------------- #
+# Under ASGI the read-heavy storefront views (shop, search, product detail,
+# cart count) are async, so a request waiting on the database doesn't hold a
+# worker thread. Straight-line lookups use the async ORM. Independent groups
+# of queries go through gather(): awaiting several async ORM calls at once
+# doesn't help, because Django runs them one at a time on the request's
+# thread, so gather() runs each group on a pool thread with its own
+# connection instead. Template rendering goes through sync_to_async, since
+# context processors and template tags may query.
+#
+# Under WSGI they would need an event loop of their own per request, so
+# users/urls.py serves the sync versions unless settings.ASYNC_VIEWS is on.
+
+
+async def resolve_user(request):
+    """request.auser(), also stored as request.user for sync code run later."""
+    # The sync and async accessors cache separately; without this a context
+    # processor reading request.user would load the user a second time
+    user = await request.auser()
+    request.user = user
+    return user
+
+
+_NO_CONNECTION = object()
+
+
+def _on_own_connection(func):
+    def run():
+        close_old_connections()
+        try:
+            with borrowing():
+                return func()
+        except PoolExhausted:
+            return _NO_CONNECTION  # raised by the first query, before func has done anything
+        finally:
+            close_old_connections()  # closed or kept per CONN_MAX_AGE, as at the end of a request
+    return run
+
+
+@sync_to_async
+def _in_transaction():
+    return connection.in_atomic_block
+
+
+async def gather(*calls):
+    """Run independent query groups concurrently; returns their results in order.
+
+    Each call is an awaitable or a blocking function. The first function runs
+    on the request's own thread and connection, the others on pool threads
+    with connections of their own. Inside a transaction they all run on the
+    request's connection, one after another, since other connections can't
+    see its uncommitted rows; so do the ones that find the connection pool
+    (users/db/pool.py) exhausted.
+    """
+    if await _in_transaction():
+        return [await call if inspect.isawaitable(call) else await sync_to_async(call)() for call in calls]
+    own_thread = True
+    tasks = []
+    for call in calls:
+        if not inspect.isawaitable(call):
+            call = sync_to_async(call)() if own_thread else sync_to_async(
+                _on_own_connection(call), thread_sensitive=False
+            )()
+            own_thread = False
+        tasks.append(call)
+    results = await asyncio.gather(*tasks)
+    for i, result in enumerate(results):
+        if result is _NO_CONNECTION:
+            results[i] = await sync_to_async(calls[i])()
+    return results
+
+
+def condition(etag_func):
+    """django.views.decorators.http.condition(etag_func=...) for async views.
+
+    Django's decorator calls etag_func on the event loop, where it can't
+    query; this one runs it through sync_to_async.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            etag = None
+            if request.method in ("GET", "HEAD"):
+                await resolve_user(request)
+                etag = await sync_to_async(etag_func)(request, *args, **kwargs)
+                etag = quote_etag(etag) if etag else None
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if etag:
+                response.headers.setdefault("ETag", etag)
+            return response
+        return inner
+    return decorator
@@ -0,0 +1,141 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import OrderItem, SellerDailySales, SellerProductSales
+
+
+# --------------------- SELLER ANALYTICS --------------------- #
+# Orders are folded into SellerDailySales / SellerProductSales when they are
+# placed. Dashboard reads only touch those rollups, so their cost depends on
+# the number of days and products shown, not the number of orders.
+
+TOP_PRODUCTS = 5
+
+
+def _increment(model, lookup, values):
+    """UPDATE ... SET col = col + n, inserting the row the first time."""
+    increments = {field: F(field) + value for field, value in values.items()}
+    if model.objects.filter(**lookup).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **values)
+    except IntegrityError:
+        # Another checkout created the row first
+        model.objects.filter(**lookup).update(**increments)
+
+
+def record_orders(orders, items):
+    """Add freshly placed orders and their items to the seller rollups."""
+    orders_by_id = {order.pk: order for order in orders}
+    daily = defaultdict(lambda: {"orders": 0, "units": 0, "revenue": Decimal("0")})
+    by_product = defaultdict(lambda: {"units": 0, "revenue": Decimal("0")})
+
+    for order in orders:
+        daily[(order.seller_id, timezone.localdate(order.created_at))]["orders"] += 1
+    for item in items:
+        order = orders_by_id[item.order_id]
+        day = daily[(order.seller_id, timezone.localdate(order.created_at))]
+        day["units"] += item.quantity
+        day["revenue"] += item.total_price
+        product = by_product[(order.seller_id, item.product_id)]
+        product["units"] += item.quantity
+        product["revenue"] += item.total_price
+
+    for (seller_id, day), values in daily.items():
+        _increment(SellerDailySales, {"seller_id": seller_id, "day": day}, values)
+    for (seller_id, product_id), values in by_product.items():
+        _increment(SellerProductSales, {"seller_id": seller_id, "product_id": product_id}, values)
+
+
+def _bulk_insert(model, rows, batch_size=1000):
+    # bulk_create() materializes its argument; feed it one batch at a time
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        model.objects.bulk_create(batch)
+
+
+@transaction.atomic
+def rebuild_rollups(seller=None):
+    """Recompute the rollups from Order/OrderItem with database aggregation."""
+    items = OrderItem.objects.all()
+    daily_rows = SellerDailySales.objects.all()
+    product_rows = SellerProductSales.objects.all()
+    if seller is not None:
+        items = items.filter(order__seller=seller)
+        daily_rows = daily_rows.filter(seller=seller)
+        product_rows = product_rows.filter(seller=seller)
+    daily_rows.delete()
+    product_rows.delete()
+
+    revenue = Sum(F("quantity") * F("price"))
+    daily = (
+        items.values(seller_ref=F("order__seller_id"), day=TruncDate("order__created_at"))
+        .annotate(orders=Count("order_id", distinct=True), units=Sum("quantity"), revenue=revenue)
+        .order_by()
+    )
+    _bulk_insert(SellerDailySales, (
+        SellerDailySales(seller_id=row["seller_ref"], day=row["day"], orders=row["orders"],
+                         units=row["units"], revenue=row["revenue"]) for row in daily.iterator()
+    ))
+    by_product = (
+        items.values("product_id", seller_ref=F("order__seller_id"))
+        .annotate(units=Sum("quantity"), revenue=revenue)
+        .order_by()
+    )
+    _bulk_insert(SellerProductSales, (
+        SellerProductSales(seller_id=row["seller_ref"], product_id=row["product_id"],
+                           units=row["units"], revenue=row["revenue"]) for row in by_product.iterator()
+    ))
+
+
+def seller_stats(seller, days=30, weeks=12):
+    """Totals, top products and daily/weekly series for the seller dashboard."""
+    rollups = SellerDailySales.objects.filter(seller=seller)
+    totals = rollups.aggregate(orders=Sum("orders"), units=Sum("units"), revenue=Sum("revenue"))
+
+    today = timezone.localdate()
+    this_week = today - timedelta(days=today.weekday())
+    start = min(today - timedelta(days=days - 1), this_week - timedelta(weeks=weeks - 1))
+    recent = {
+        row["day"]: row
+        for row in rollups.filter(day__gte=start).values("day", "orders", "units", "revenue")
+    }
+
+    empty = {"orders": 0, "units": 0, "revenue": Decimal("0")}
+    daily = []
+    for offset in range(days - 1, -1, -1):
+        day = today - timedelta(days=offset)
+        daily.append(dict(recent.get(day, empty), day=day))
+
+    weekly = []
+    for offset in range(weeks - 1, -1, -1):
+        week_start = this_week - timedelta(weeks=offset)
+        week = dict(empty, week=week_start)
+        for i in range(7):
+            row = recent.get(week_start + timedelta(days=i))
+            if row:
+                for field in ("orders", "units", "revenue"):
+                    week[field] += row[field]
+        weekly.append(week)
+
+    top_products = (
+        SellerProductSales.objects.filter(seller=seller)
+        .select_related("product")
+        .order_by("-revenue")[:TOP_PRODUCTS]
+    )
+    return {
+        "total_orders": totals["orders"] or 0,
+        "total_units": totals["units"] or 0,
+        "total_revenue": totals["revenue"] or Decimal("0"),
+        "top_products": list(top_products),
+        "daily_sales": daily,
+        "weekly_sales": weekly,
+    }
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class UsersConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'users'
+
+    def ready(self):
+        # Connect the signal handlers that keep derived data in sync
+        from . import autocomplete, cart, conditional, counters, fragments, images, metrics, search  # noqa: F401
@@ -0,0 +1,213 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from django.db import connections
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from .models import Category, Product
+from .search import TOKEN_RE, normalize, tokenize
+
+
+# --------------------- AUTOCOMPLETE --------------------- #
+# In-process prefix index for search-as-you-type. Every word of a product or
+# category name goes into a sorted list of (word, kind, id) tuples; a lookup is
+# a bisect to the first word with the prefix plus a short scan. The index is
+# built by the first lookup, kept up to date from signals in this process, and
+# rebuilt after MAX_AGE seconds so other worker processes' edits show up
+# eventually. That rebuild runs on a background thread, one at a time, while
+# lookups keep using the old index.
+
+MIN_PREFIX = 2
+MAX_AGE = 300
+CACHE_SIZE = 1000  # recent lookups kept, least recently used dropped first
+
+
+def _query_words(query):
+    # The last word is still being typed: "be" or "for" are stop words, but
+    # also the start of "belt" and "formal"
+    *complete, prefix = TOKEN_RE.findall(query.lower()) or [""]
+    return tokenize(" ".join(complete)) + ([normalize(prefix)] if prefix else [])
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._keys = []
+        self._entries = {}
+        self._cache = OrderedDict()
+        self._pending = None  # changes made while a build reads the database
+        self.built_at = None
+
+    # ---- building ---- #
+    def build(self):
+        with self._lock:
+            self._pending = []
+        try:
+            entries, keys = self._load()
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            self._entries = entries
+            self._keys = keys
+            # Saves and deletes during the build may not be in what it read
+            for change, args in self._pending:
+                change(*args)
+            self._pending = None
+            self._cache.clear()
+            self.built_at = time.monotonic()
+
+    def _load(self):
+        entries = {}
+        products = Product.objects.values_list("id", "name", "slug", "sold")
+        for pk, name, slug, sold in products.iterator(chunk_size=2000):
+            entries[("product", pk)] = self._entry(name, slug, sold)
+        categories = Category.objects.annotate(popularity=Coalesce(Sum("products__sold"), 0))
+        for pk, name, slug, popularity in categories.values_list("id", "name", "slug", "popularity"):
+            entries[("category", pk)] = self._entry(name, slug, popularity)
+
+        keys = sorted(
+            (word, kind, pk)
+            for (kind, pk), entry in entries.items()
+            for word in entry["words"]
+        )
+        return entries, keys
+
+    def _entry(self, name, slug, popularity):
+        return {"label": name, "slug": slug, "popularity": popularity or 0, "words": set(tokenize(name))}
+
+    def ensure_built(self):
+        if self.built_at is None:
+            with self._build_lock:
+                if self.built_at is None:  # unless built while we waited
+                    self.build()
+        elif time.monotonic() - self.built_at > MAX_AGE and self._build_lock.acquire(blocking=False):
+            threading.Thread(target=self._rebuild, daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            self.build()  # on failure built_at stays old, so a later lookup retries
+        finally:
+            connections.close_all()
+            self._build_lock.release()
+
+    # ---- incremental updates ---- #
+    def update(self, kind, pk, name, slug, popularity):
+        entry = self._entry(name, slug, popularity)
+        with self._lock:
+            if self.built_at is None and self._pending is None:
+                return  # the first lookup will build from the database
+            self._change(self._add, (kind, pk), entry)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            self._change(self._remove, (kind, pk))
+
+    def popularity(self, kind, pk):
+        """The indexed popularity of an entry, 0 if it isn't indexed."""
+        with self._lock:
+            entry = self._entries.get((kind, pk))
+            return entry["popularity"] if entry else 0
+
+    def _change(self, change, *args):
+        change(*args)
+        if self._pending is not None:
+            self._pending.append((change, args))
+        self._cache.clear()
+
+    def _add(self, key, entry):
+        self._remove(key)
+        self._entries[key] = entry
+        kind, pk = key
+        for word in entry["words"]:
+            insort(self._keys, (word, kind, pk))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        kind, pk = key
+        for word in entry["words"]:
+            i = bisect_left(self._keys, (word, kind, pk))
+            if i < len(self._keys) and self._keys[i] == (word, kind, pk):
+                del self._keys[i]
+
+    # ---- lookups ---- #
+    def lookup(self, query, limit=8):
+        """Top `limit` entries whose words start with the query words, by popularity."""
+        words = _query_words(query)
+        if not words or len(words[-1]) < MIN_PREFIX:
+            return []
+        cache_key = (" ".join(words), limit)
+        *complete, prefix = words
+        with self._lock:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                self._cache.move_to_end(cache_key)
+                return cached
+            candidates = set()
+            i = bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and self._keys[i][0].startswith(prefix):
+                candidates.add(self._keys[i][1:])
+                i += 1
+            matches = [
+                (key, self._entries[key]) for key in candidates
+                if all(any(w.startswith(c) for w in self._entries[key]["words"]) for c in complete)
+            ]
+            results = heapq.nlargest(limit, matches, key=lambda m: (m[1]["popularity"], m[0][1]))
+            results = [
+                {"type": kind, "id": pk, "label": entry["label"], "slug": entry["slug"]}
+                for (kind, pk), entry in results
+            ]
+            self._cache[cache_key] = results
+            if len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return results
+
+
+index = PrefixIndex()
+
+
+def suggest(query, limit=8):
+    index.ensure_built()
+    return [
+        dict(result, url=reverse(
+            "users:product_detail" if result["type"] == "product" else "users:category_view",
+            args=[result["slug"]],
+        ))
+        for result in index.lookup(query, limit)
+    ]
+
+
+@receiver(post_save, sender=Product)
+def index_product_name(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index.update("product", instance.pk, instance.name, instance.slug, instance.sold)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_name(sender, instance, **kwargs):
+    index.remove("product", instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def index_category_name(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Keep the popularity we already have; it is refreshed on the next rebuild
+    popularity = index.popularity("category", instance.pk)
+    index.update("category", instance.pk, instance.name, instance.slug, popularity)
+
+
+@receiver(post_delete, sender=Category)
+def unindex_category_name(sender, instance, **kwargs):
+    index.remove("category", instance.pk)
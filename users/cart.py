@@ -0,0 +1,159 @@
+from decimal import Decimal
+
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.dispatch import receiver
+
+from . import counters
+from .models import Cart, CartItem, Product, order_totals
+
+
+# --------------------- CART --------------------- #
+# Every cart page and AJAX endpoint goes through these helpers: line totals
+# are computed by the database and the cart summary is one aggregate query,
+# instead of loading each item's product to add up prices in Python.
+
+LINE_TOTAL = ExpressionWrapper(
+    F("quantity") * F("product__price"), output_field=DecimalField(max_digits=12, decimal_places=2)
+)
+CENT = Decimal("0.01")
+EMPTY_SUMMARY = {
+    "subtotal": Decimal("0"),
+    "shipping": Decimal("0"),
+    "total": Decimal("0"),
+    "item_count": 0,
+    "line_count": 0,
+}
+
+
+def cart_items(user):
+    """The user's cart items with their product and a line_total annotation."""
+    return (
+        CartItem.objects.filter(cart__user=user)
+        .select_related("product")
+        .annotate(line_total=LINE_TOTAL)
+        .order_by("id")
+    )
+
+
+def cart_totals(subtotal):
+    """(subtotal, shipping, total); an empty cart ships for free."""
+    if not subtotal:
+        return Decimal("0"), Decimal("0"), Decimal("0")
+    return order_totals(subtotal)
+
+
+def cart_summary(user):
+    """Subtotal, shipping, total and counts for the user's cart in one query."""
+    totals = CartItem.objects.filter(cart__user=user).aggregate(
+        subtotal=Sum(LINE_TOTAL), item_count=Sum("quantity"), line_count=Count("id")
+    )
+    subtotal, shipping, total = cart_totals(totals["subtotal"])
+    return {
+        "subtotal": subtotal,
+        "shipping": shipping,
+        "total": total,
+        "item_count": totals["item_count"] or 0,
+        "line_count": totals["line_count"],
+    }
+
+
+def money(value):
+    """Two-decimal string for JSON; SQLite returns sums without a fixed scale."""
+    return str(Decimal(value).quantize(CENT))
+
+
+def summary_json(summary):
+    return {
+        "cart_total": money(summary["subtotal"]),
+        "shipping": money(summary["shipping"]),
+        "total": money(summary["total"]),
+        "item_count": summary["item_count"],
+    }
+
+
+# --------------------- ANONYMOUS CART --------------------- #
+# Visitors who aren't logged in keep their cart in the session as
+# {"<product id>": quantity}, so browsing and adding to the cart writes no
+# cart rows. On login/registration the session cart is folded into the
+# user's Cart with one bulk update + one bulk insert.
+
+SESSION_KEY = "cart"
+
+
+def session_lines(session):
+    """{product_id: quantity} from the session cart."""
+    return {int(pk): int(qty) for pk, qty in session.get(SESSION_KEY, {}).items()}
+
+
+def set_session_quantity(session, product_id, quantity):
+    lines = dict(session.get(SESSION_KEY, {}))
+    if quantity > 0:
+        lines[str(product_id)] = quantity
+    else:
+        lines.pop(str(product_id), None)
+    session[SESSION_KEY] = lines
+
+
+def add_to_session(session, product_id, quantity=1):
+    current = session_lines(session).get(product_id, 0)
+    set_session_quantity(session, product_id, current + quantity)
+
+
+def session_cart_items(session):
+    """Unsaved CartItems for the session cart; item.id is the product id."""
+    lines = session_lines(session)
+    products = Product.objects.in_bulk(list(lines))
+    items = []
+    for product_id, quantity in lines.items():
+        if product_id in products:
+            item = CartItem(id=product_id, product=products[product_id], quantity=quantity)
+            item.line_total = item.product.price * quantity
+            items.append(item)
+    return items
+
+
+def summarize(items):
+    """cart_summary() for items that are already loaded."""
+    subtotal, shipping, total = cart_totals(sum(item.line_total for item in items))
+    return {
+        "subtotal": subtotal,
+        "shipping": shipping,
+        "total": total,
+        "item_count": sum(item.quantity for item in items),
+        "line_count": len(items),
+    }
+
+
+def merge_session_cart(user, lines):
+    """Add the session cart lines to the user's cart; returns the number of lines merged."""
+    if not lines:
+        return 0
+    with transaction.atomic():
+        cart, _ = Cart.objects.get_or_create(user=user)
+        valid = set(Product.objects.filter(id__in=list(lines)).values_list("id", flat=True))
+        existing = {
+            item.product_id: item
+            for item in CartItem.objects.filter(cart=cart, product_id__in=valid, size__isnull=True)
+        }
+        for product_id, item in existing.items():
+            item.quantity += lines[product_id]
+        CartItem.objects.bulk_update(existing.values(), ["quantity"])
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product_id=product_id, quantity=lines[product_id])
+            for product_id in valid - set(existing)
+        ])
+    counters.invalidate(user.pk)  # bulk writes send no signals
+    return len(valid)
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    # login() keeps an anonymous session's data, so the cart is still there
+    if request is None or not hasattr(request, "session"):
+        return
+    lines = session_lines(request.session)
+    if lines:
+        merge_session_cart(user, lines)
+        del request.session[SESSION_KEY]
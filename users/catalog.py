@@ -0,0 +1,72 @@
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import Category, Product
+
+
+# --------------------- CATALOG --------------------- #
+# The shop page used to run one products query per category plus separate
+# queries for featured products and best sellers. Everything here is built
+# from two queries (categories + ranked products) and grouped in Python, so
+# the cost no longer grows with the number of categories.
+
+BEST_SELLERS_LIMIT = 10
+
+
+def _ranked_products():
+    return Product.objects.select_related("category").annotate(
+        category_rank=Window(
+            RowNumber(),
+            partition_by=[F("category_id")],
+            order_by=[F("created_at").desc(), F("id").desc()],
+        ),
+        sold_rank=Window(
+            RowNumber(),
+            order_by=[F("sold").desc(), F("id").asc()],
+        ),
+    )
+
+
+def build_catalog(per_category_limit=None, best_sellers_limit=BEST_SELLERS_LIMIT, featured_limit=None,
+                  categories=None):
+    """Return the category -> products map, featured products and best sellers.
+
+    Given categories, only those categories and their products are loaded.
+    """
+    products = _ranked_products()
+    if categories is None:
+        categories = list(Category.objects.order_by("id"))
+    else:
+        categories = list(categories)
+        products = products.filter(category__in=categories)
+    if per_category_limit is not None:
+        products = products.filter(
+            Q(category_rank__lte=per_category_limit)
+            | Q(sold_rank__lte=best_sellers_limit)
+            | Q(is_featured=True)
+        )
+
+    category_products = {category: [] for category in categories}
+    featured_products = []
+    best_sellers = []
+
+    for product in products.order_by("category_rank"):
+        in_category = per_category_limit is None or product.category_rank <= per_category_limit
+        if in_category and product.category in category_products:
+            category_products[product.category].append(product)
+        if product.is_featured:
+            featured_products.append(product)
+        if product.sold_rank <= best_sellers_limit:
+            best_sellers.append(product)
+
+    featured_products.sort(key=lambda p: (p.created_at, p.id), reverse=True)
+    if featured_limit is not None:
+        featured_products = featured_products[:featured_limit]
+    best_sellers.sort(key=lambda p: p.sold_rank)
+
+    return {
+        "categories": categories,
+        "category_products": category_products,
+        "featured_products": featured_products,
+        "best_sellers": best_sellers,
+    }
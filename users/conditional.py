@@ -0,0 +1,144 @@
+import hashlib
+import os
+import posixpath
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.static import serve
+
+from . import fragments
+from .context_processors import navbar_counts
+from .models import Category, Product
+from .pagination import ORDERINGS
+
+
+# --------------------- CONDITIONAL GET --------------------- #
+# Product and category pages get an ETag built only from cached values: the
+# object's fragment generation (users/fragments.py), the product's
+# "neighbors" generation for the frequently-bought-together list, and the
+# viewer (user, navbar counts, CSRF secret). A revalidation whose
+# If-None-Match still matches is answered 304 by the condition() decorator
+# before the view looks up the product or renders anything. Slugs are mapped
+# to pks through the cache too, so the only queries left are the session and
+# user lookups every request makes.
+#
+# Pages are private (they carry the viewer's cart count and CSRF token) and
+# no-cache, so browsers revalidate every time instead of guessing freshness
+# from Last-Modified.
+
+SLUG_TIMEOUT = 60 * 60 * 24
+MEDIA_MAX_AGE = 60 * 60
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+def _slug_key(model, slug):
+    return f"slug-pk:{model._meta.model_name}:{slug}"
+
+
+def _slug_pk(model, slug):
+    key = _slug_key(model, slug)
+    pk = cache.get(key)
+    if pk is None:
+        pk = model.objects.filter(slug=slug).values_list("pk", flat=True).first()
+        if pk is None:
+            return None  # let the view 404; a later create must not find a stale miss
+        cache.set(key, pk, SLUG_TIMEOUT)
+    return pk
+
+
+def _viewer(request):
+    # The CSRF secret rather than the rendered token, which is re-masked on
+    # every render; without a cookie the page has to be rendered to set one
+    csrf = request.META.get("CSRF_COOKIE")
+    if not csrf:
+        return None
+    user = request.user
+    counts = navbar_counts(request)
+    return [
+        user.pk if user.is_authenticated else "anon",
+        user.get_username(),
+        counts["cart_count"],
+        counts["wishlist_count"],
+        csrf,
+    ]
+
+
+def _etag(parts):
+    return hashlib.md5(":".join(map(str, parts)).encode()).hexdigest()
+
+
+def product_etag(request, slug):
+    viewer = _viewer(request)
+    pk = _slug_pk(Product, slug)
+    if viewer is None or pk is None:
+        return None
+    generation = fragments.generations("product", [pk])[pk]
+    neighbors = fragments.generations("neighbors", [pk, "all"])
+    return _etag(["product", pk, generation, neighbors[pk], neighbors["all"], *viewer])
+
+
+def category_etag(request, slug):
+    ordering = request.GET.get("order") or "new"
+    if ordering not in ORDERINGS or ordering == "popular":
+        return None  # sold counts change on every checkout without bumping anything
+    viewer = _viewer(request)
+    pk = _slug_pk(Category, slug)
+    if viewer is None or pk is None:
+        return None
+    generation = fragments.generations("category", [pk])[pk]
+    return _etag(["category", pk, generation, ordering, request.GET.get("cursor", ""), *viewer])
+
+
+def revalidate(response, last_modified=None):
+    """Mark a page response as private and always revalidated."""
+    patch_cache_control(response, private=True, no_cache=True)
+    if last_modified is not None and not response.has_header("Last-Modified"):
+        response.headers["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+# --------------------- MEDIA --------------------- #
+def serve_media(request, path):
+    """django.views.static.serve with an ETag and Cache-Control.
+
+    Derivatives are named after their content hash, so they never change.
+    """
+    try:
+        stat = os.stat(safe_join(settings.MEDIA_ROOT, posixpath.normpath(path).lstrip("/")))
+    except (OSError, ValueError, SuspiciousFileOperation):
+        stat = None
+    if stat is None:
+        return serve(request, path, document_root=settings.MEDIA_ROOT)  # 404s as usual
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    response.headers["ETag"] = etag
+    if path.startswith("derivatives/"):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=MEDIA_MAX_AGE)
+    return response
+
+
+# --------------------- INVALIDATION --------------------- #
+@receiver(pre_save, sender=Category)
+def remember_previous_slug(sender, instance, raw=False, **kwargs):
+    if not raw and instance.pk is not None:
+        instance._previous_slug = Category.objects.filter(pk=instance.pk).values_list("slug", flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def forget_slug(sender, instance, **kwargs):
+    # Product's previous slug is recorded by fragments.remember_previous_values
+    slugs = {instance.slug, getattr(instance, "_previous_slug", None)} - {None}
+    cache.delete_many([_slug_key(sender, slug) for slug in slugs])
@@ -0,0 +1,89 @@
+from functools import partial
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import aio
+from .models import Cart, CartItem, Product, Wishlist
+
+
+# --------------------- NAVBAR COUNTERS --------------------- #
+# Every page shows cart and wishlist badges. The counts are cached per user
+# and dropped whenever the user's cart items or wishlist change, so pages
+# render them without querying (see users/context_processors.py).
+
+CACHE_TIMEOUT = 60 * 60
+
+
+def _cache_key(user_id):
+    return f"navbar-counts:{user_id}"
+
+
+def navbar_counts(user):
+    """{"cart_count", "wishlist_count"} for a logged-in user."""
+    key = _cache_key(user.pk)
+    counts = cache.get(key)
+    if counts is None:
+        counts = {"cart_count": _cart_count(user), "wishlist_count": _wishlist_count(user)}
+        cache.set(key, counts, CACHE_TIMEOUT)
+    return counts
+
+
+async def anavbar_counts(user):
+    """navbar_counts() for async views; on a miss both counts are queried at once."""
+    key = _cache_key(user.pk)
+    counts = await cache.aget(key)
+    if counts is None:
+        cart, wishlist = await aio.gather(partial(_cart_count, user), partial(_wishlist_count, user))
+        counts = {"cart_count": cart, "wishlist_count": wishlist}
+        await cache.aset(key, counts, CACHE_TIMEOUT)
+    return counts
+
+
+def _cart_count(user):
+    return CartItem.objects.filter(cart__user=user).aggregate(n=Sum("quantity"))["n"] or 0
+
+
+def _wishlist_count(user):
+    return Wishlist.items.through.objects.filter(wishlist__user=user).count()
+
+
+def invalidate(*user_ids):
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def invalidate_cart_count(sender, instance, **kwargs):
+    if CartItem.cart.is_cached(instance) and instance.cart is not None:
+        invalidate(instance.cart.user_id)
+    elif instance.cart_id is not None:
+        invalidate(*Cart.objects.filter(pk=instance.cart_id).values_list("user_id", flat=True))
+
+
+@receiver(m2m_changed, sender=Wishlist.items.through)
+def invalidate_wishlist_count(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        invalidate(instance.user_id)
+    elif pk_set:
+        invalidate(*Wishlist.objects.filter(pk__in=pk_set).values_list("user_id", flat=True))
+    else:
+        # product.wishlist_set.clear(): we don't know whose wishlists changed
+        invalidate(*Wishlist.objects.values_list("user_id", flat=True))
+
+
+@receiver(pre_delete, sender=Product)
+def note_wishlisting_users(sender, instance, **kwargs):
+    # Deleting a product drops its wishlist rows without any m2m_changed
+    instance._wishlist_user_ids = list(
+        Wishlist.objects.filter(items=instance).values_list("user_id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_deleted_product_counts(sender, instance, **kwargs):
+    invalidate(*getattr(instance, "_wishlist_user_ids", ()))
@@ -0,0 +1,7 @@
+from django.db.backends.mysql import base
+
+from ..pool import ConnectionManagementMixin
+
+
+class DatabaseWrapper(ConnectionManagementMixin, base.DatabaseWrapper):
+    """Django's MySQL backend with connect timing and optional pooling (users/db/pool.py)."""
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from .. import metrics
+
+
+# --------------------- CONNECTION MANAGEMENT --------------------- #
+# The users.db.mysql and users.db.sqlite3 backends are Django's, plus:
+#
+# - every connect is timed into the request's metrics (the "conn" entry of
+#   the Server-Timing header and `manage.py view_metrics`), so the cost of
+#   opening connections shows up per view;
+# - an optional per-process pool, enabled with DATABASES[...]["POOL"]["SIZE"].
+#   Closing a connection hands the driver connection back to the pool
+#   instead of closing it, and the next connect takes it from there.
+#
+# Persistent connections (CONN_MAX_AGE) are per thread, which suits WSGI
+# workers. Under ASGI each request's sync code runs on a thread of its own,
+# so they would never be reused; the ASGI entry point turns the pool on
+# instead (see ecommerce/asgi.py and settings.py).
+#
+# The extra connections aio.gather() opens for a request are borrowed: they
+# don't wait for the pool, since the request already holds a connection it
+# can fall back to. Waiting while holding one would let a burst of requests
+# deadlock the pool until TIMEOUT.
+
+POOL_DEFAULTS = {
+    "SIZE": 0,  # most connections open at once per process; 0 turns the pool off
+    "TIMEOUT": 10,  # seconds to wait for a free connection before failing
+    "MAX_IDLE": 300,  # close connections idle this long (stay under the server's wait_timeout)
+}
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class ConnectionPool:
+    """A bounded LIFO stack of idle driver connections, shared by a process's threads."""
+
+    def __init__(self, size, timeout=POOL_DEFAULTS["TIMEOUT"], max_idle=POOL_DEFAULTS["MAX_IDLE"]):
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.idle = deque()  # (connection, released at)
+        self.open = 0
+        self.lock = threading.Condition()
+
+    def acquire(self, connect, usable=None, timeout=None):
+        """An idle connection that passes usable(), or a new one from connect().
+
+        Raises PoolExhausted when SIZE connections stay in use for timeout
+        (default TIMEOUT) seconds.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            stale = []
+            with self.lock:
+                while True:
+                    while self.idle and time.monotonic() - self.idle[0][1] > self.max_idle:
+                        stale.append(self.idle.popleft()[0])
+                        self.open -= 1
+                    if self.idle:
+                        conn = self.idle.pop()[0]
+                        break
+                    if self.open < self.size:
+                        self.open += 1
+                        conn = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self.lock.wait(remaining):
+                        raise PoolExhausted(f"No free database connection after {timeout}s ({self.size} in use)")
+            for old in stale:
+                _close_quietly(old)
+            if conn is None:
+                try:
+                    return connect()
+                except BaseException:
+                    self._forget()
+                    raise
+            if usable is None or usable(conn):
+                return conn
+            self.discard(conn)
+
+    def release(self, conn):
+        with self.lock:
+            self.idle.append((conn, time.monotonic()))
+            self.lock.notify()
+
+    def discard(self, conn):
+        _close_quietly(conn)
+        self._forget()
+
+    def _forget(self):
+        with self.lock:
+            self.open -= 1
+            self.lock.notify()
+
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, deque()
+            self.open -= len(idle)
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_borrowing = threading.local()
+
+
+@contextmanager
+def borrowing():
+    """Connections opened inside don't wait for the pool; PoolExhausted is raised at once."""
+    _borrowing.active = True
+    try:
+        yield
+    finally:
+        _borrowing.active = False
+
+
+def get_pool(alias, settings_dict):
+    """The process's pool for a database alias, or None when it's turned off."""
+    options = {**POOL_DEFAULTS, **(settings_dict.get("POOL") or {})}
+    if not options["SIZE"]:
+        return None
+    key = (alias, os.getpid())  # a forked worker mustn't share its parent's sockets
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(options["SIZE"], options["TIMEOUT"], options["MAX_IDLE"])
+        return _pools[key]
+
+
+class ConnectionManagementMixin:
+    """Connect timing and optional pooling for a Django DatabaseWrapper."""
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            metrics.record_connect(time.perf_counter() - start)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        borrowed = getattr(_borrowing, "active", False)
+        try:
+            return pool.acquire(
+                lambda: super(ConnectionManagementMixin, self).get_new_connection(conn_params),
+                self._pooled_connection_usable if self.settings_dict["CONN_HEALTH_CHECKS"] else None,
+                timeout=0 if borrowed else None,
+            )
+        except PoolExhausted as e:
+            if borrowed:
+                raise  # for the borrower to fall back on, not a database error
+            raise self.Database.OperationalError(str(e)) from e
+
+    def _pooled_connection_usable(self, conn):
+        self.connection = conn
+        try:
+            return self.is_usable()
+        finally:
+            self.connection = None
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        conn = self.connection
+        if self.errors_occurred:
+            pool.discard(conn)
+            return
+        try:
+            if self.in_atomic_block or not self.autocommit:
+                conn.rollback()  # never hand out a connection mid-transaction
+        except self.Database.Error:
+            pool.discard(conn)
+            return
+        pool.release(conn)
@@ -0,0 +1,180 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# --------------------- READ REPLICAS --------------------- #
+# With DATABASE_REPLICAS set (see DB_REPLICAS in settings.py), reads of the
+# catalog and reporting models below go to a replica, picked once per
+# request so its queries see one consistent snapshot. Everything else
+# (users, sessions, carts, wishlists) and every write goes to the primary.
+#
+# Replicas lag, so a request reads from the primary instead when:
+#
+# - it is not a safe method (POST etc.): checkout reads stock it's about
+#   to decrement;
+# - it has already written to a replicated model, or a transaction is open;
+# - the browser carries the pin cookie, set for PIN_SECONDS on responses to
+#   requests that wrote a replicated model, so a buyer sees their order in
+#   my_orders straight after checkout;
+# - it reads the catalog within PIN_SECONDS of a product or category
+#   change by anyone: pages re-rendered after users/fragments.py bumps a
+#   generation are cached under the new key, and must not be rendered
+#   from a replica that hasn't seen the change yet.
+#
+# Outside requests (management commands, background jobs) everything reads
+# from the primary.
+
+CATALOG_MODELS = {
+    "users.category", "users.product", "users.imagederivative", "users.productneighbor",
+    "users.searchdocument", "users.searchposting",
+}
+REPORTING_MODELS = {
+    "users.order", "users.orderitem", "users.sellerdailysales", "users.sellerproductsales",
+}
+REPLICATED_MODELS = CATALOG_MODELS | REPORTING_MODELS
+
+PIN_SECONDS = getattr(settings, "REPLICA_PIN_SECONDS", 5)  # comfortably above the replicas' usual lag
+PIN_COOKIE = "pin_primary"
+CATALOG_PIN_KEY = "replica-pin:catalog"
+
+_routing = ContextVar("replica_routing", default=None)
+
+
+def replicas():
+    return list(getattr(settings, "DATABASE_REPLICAS", ()))
+
+
+def pin_catalog():
+    """Send everyone's catalog reads to the primary for PIN_SECONDS."""
+    if replicas():
+        cache.set(CATALOG_PIN_KEY, True, PIN_SECONDS)
+
+
+class Routing:
+    """Where the current request reads from."""
+
+    def __init__(self, replica, pinned=False, catalog_pinned=False):
+        self.replica = replica
+        self.pinned = pinned
+        self.catalog_pinned = catalog_pinned
+        self.wrote = False
+
+    def db_for_read(self, label):
+        if self.pinned or label not in REPLICATED_MODELS or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if self.catalog_pinned and label in CATALOG_MODELS:
+            return DEFAULT_DB_ALIAS
+        return self.replica
+
+    def written(self, label):
+        if label in REPLICATED_MODELS:
+            self.pinned = self.wrote = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        return DEFAULT_DB_ALIAS if routing is None else routing.db_for_read(model._meta.label_lower)
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.written(model._meta.label_lower)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows, so a Product read from one can be
+        # assigned to a CartItem read from the primary
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        return False if db in replicas() else None
+
+
+def _streamed(content, routing):
+    # Streaming responses (order exports) are iterated after the middleware
+    # has returned, so each chunk is produced under the request's routing
+    content = iter(content)
+    while True:
+        token = _routing.set(routing)
+        try:
+            chunk = next(content)
+        except StopIteration:
+            return
+        finally:
+            _routing.reset(token)
+        yield chunk
+
+
+async def _astreamed(content, routing):
+    content = aiter(content)
+    while True:
+        token = _routing.set(routing)
+        try:
+            chunk = await anext(content)
+        except StopAsyncIteration:
+            return
+        finally:
+            _routing.reset(token)
+        yield chunk
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = self.routing(request)
+        if routing is None:
+            return self.get_response(request)
+        routing.catalog_pinned = bool(cache.get(CATALOG_PIN_KEY))
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(response, routing)
+
+    async def __acall__(self, request):
+        routing = self.routing(request)
+        if routing is None:
+            return await self.get_response(request)
+        routing.catalog_pinned = bool(await cache.aget(CATALOG_PIN_KEY))
+        token = _routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(response, routing)
+
+    def routing(self, request):
+        aliases = replicas()
+        if not aliases:
+            return None
+        return Routing(
+            random.choice(aliases),
+            pinned=request.method not in ("GET", "HEAD", "OPTIONS") or PIN_COOKIE in request.COOKIES,
+        )
+
+    def finish(self, response, routing):
+        if routing.wrote:
+            response.set_cookie(PIN_COOKIE, "1", max_age=PIN_SECONDS, httponly=True, samesite="Lax")
+        if response.streaming:
+            streamed = _astreamed if response.is_async else _streamed
+            response.streaming_content = streamed(response.streaming_content, routing)
+        return response
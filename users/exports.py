@@ -0,0 +1,160 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django import forms
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import Order, OrderItem
+
+
+# --------------------- ORDER / SALES EXPORT --------------------- #
+# Streams orders as CSV (one row per order item) or JSONL (one object per
+# order, items nested). Orders are read with .iterator(chunk_size=...):
+# shipping address, payment, buyer and seller are joined with select_related
+# and the items are prefetched one chunk at a time, so an export costs
+# roughly two queries per CHUNK_SIZE orders and only one chunk is held in
+# memory. Totals are the stored Order columns, not recomputed per row.
+# Filters map onto the Order indexes: created_at, (status, created_at) and
+# (seller, created_at).
+#
+# Under ASGI, Django would read a sync iterator into a list before sending
+# any of it, so the view hands over arows() instead, which pulls BATCH_ROWS
+# rows at a time on the request's thread.
+#
+# CSV cells starting with a formula character get a leading quote, so a
+# product or address named "=HYPERLINK(...)" isn't evaluated by a
+# spreadsheet.
+
+CHUNK_SIZE = 2000
+BATCH_ROWS = 500
+FORMATS = ("csv", "jsonl")
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+CSV_HEADER = [
+    "order_id", "created_at", "status", "buyer", "seller", "checkout_ref",
+    "subtotal", "shipping_fee", "order_total",
+    "payment_method", "payment_status", "transaction_id",
+    "address", "city", "state", "zipcode", "country", "phone",
+    "product_id", "product", "size", "quantity", "unit_price", "line_total",
+]
+
+
+class OrderExportForm(forms.Form):
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False, help_text="Inclusive.")
+    status = forms.ChoiceField(required=False, choices=[("", "Any")] + Order.STATUS_CHOICES)
+    seller = forms.ModelChoiceField(required=False, queryset=get_user_model().objects.all())
+    format = forms.ChoiceField(required=False, choices=[(f, f) for f in FORMATS])
+
+    def clean_format(self):
+        return self.cleaned_data["format"] or "csv"
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def export_queryset(date_from=None, date_to=None, status=None, seller=None):
+    orders = Order.objects.all()
+    if date_from:
+        orders = orders.filter(created_at__gte=_start_of(date_from))
+    if date_to:
+        orders = orders.filter(created_at__lt=_start_of(date_to + timedelta(days=1)))
+    if status:
+        orders = orders.filter(status=status)
+    if seller is not None:
+        orders = orders.filter(seller=seller)
+    items = OrderItem.objects.select_related("product").only(
+        "order_id", "quantity", "price", "size", "product__id", "product__name"
+    ).order_by("id")
+    return (
+        orders.select_related("user", "seller", "shippingaddress", "payment")
+        .prefetch_related(Prefetch("items", queryset=items))
+        .order_by("created_at", "id")
+    )
+
+
+def _related(order, name):
+    # Reverse one-to-ones raise when the row is missing (e.g. seeded orders)
+    return getattr(order, name, None)
+
+
+def order_record(order):
+    payment = _related(order, "payment")
+    address = _related(order, "shippingaddress")
+    return {
+        "order_id": order.pk,
+        "created_at": order.created_at.isoformat(),
+        "status": order.status,
+        "buyer": order.user.username,
+        "seller": order.seller.username,
+        "checkout_ref": str(order.checkout_ref or ""),
+        "subtotal": str(order.subtotal),
+        "shipping_fee": str(order.shipping_fee),
+        "order_total": str(order.total_price),
+        "payment_method": payment.payment_method if payment else "",
+        "payment_status": payment.payment_status if payment else "",
+        "transaction_id": (payment.transaction_id or "") if payment else "",
+        "address": address.address if address else "",
+        "city": address.city if address else "",
+        "state": address.state if address else "",
+        "zipcode": address.zipcode if address else "",
+        "country": address.country if address else "",
+        "phone": address.phone if address else "",
+        "items": [
+            {
+                "product_id": item.product_id,
+                "product": item.product.name,
+                "size": item.size or "",
+                "quantity": item.quantity,
+                "unit_price": str(item.price),
+                "line_total": str(item.total_price),
+            }
+            for item in order.items.all()
+        ],
+    }
+
+
+class _Echo:
+    # csv.writer target that hands each formatted row back instead of buffering it
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_rows(orders, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for order in orders.iterator(chunk_size=chunk_size):
+        record = order_record(order)
+        items = record.pop("items") or [{}]  # orders without items still get a row
+        for item in items:
+            line = {**record, **item}
+            yield writer.writerow([_cell(line.get(column, "")) for column in CSV_HEADER])
+
+
+def jsonl_rows(orders, chunk_size=CHUNK_SIZE):
+    for order in orders.iterator(chunk_size=chunk_size):
+        yield json.dumps(order_record(order)) + "\n"
+
+
+async def arows(rows):
+    """An async iterator over rows, fetching BATCH_ROWS at a time from a thread."""
+    rows = iter(rows)
+    next_batch = sync_to_async(lambda: "".join(islice(rows, BATCH_ROWS)))
+    while batch := await next_batch():
+        yield batch
+
+
+WRITERS = {"csv": csv_rows, "jsonl": jsonl_rows}
+CONTENT_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
@@ -46,7 +46,7 @@ class ProductSearchForm(forms.Form):
 class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
-        fields = ['name', 'slug', 'description', 'price', 'category', 'image', 'is_featured']
+        fields = ['name', 'slug', 'description', 'price', 'stock', 'category', 'image', 'is_featured']
 
 
 
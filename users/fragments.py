@@ -0,0 +1,157 @@
+import time
+
+from django.core.cache import cache
+from django.db.models import Model
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils.safestring import mark_safe
+
+from .db import replicas
+from .models import Category, Product, ProductNeighbor
+
+
+# --------------------- FRAGMENT CACHE --------------------- #
+# Rendered HTML for catalog fragments (shop category sections, product cards,
+# the product detail block) is cached under keys that embed a generation
+# counter for each object it shows. Saving or deleting a Product bumps its own
+# generation and its category's; saving or deleting a Category bumps the
+# category's. Old keys are never read again and simply expire, so an edit
+# invalidates exactly the fragments that showed the object.
+#
+# Fragments are shared between users, so {% csrf_token %} is rendered as a
+# placeholder and swapped for the request's token on the way out.
+
+CACHE_TIMEOUT = 60 * 60 * 24
+CSRF_PLACEHOLDER = "__csrf_token_placeholder__"
+
+
+def _generation_key(kind, pk):
+    return f"generation:{kind}:{pk}"
+
+
+def _fresh_generation():
+    # Counters start from the clock, so one that was evicted never comes back
+    # with a value an old fragment key was built from
+    return time.time_ns() // 1000
+
+
+def _kind(obj):
+    return obj._meta.model_name
+
+
+def generations(kind, pks):
+    """{pk: current generation} for objects of one kind, from one cache lookup."""
+    keys = {pk: _generation_key(kind, pk) for pk in pks}
+    found = cache.get_many(list(keys.values()))
+    for pk, key in keys.items():
+        if key not in found:
+            cache.add(key, _fresh_generation(), None)
+            found[key] = cache.get(key)
+    return {pk: found[key] for pk, key in keys.items()}
+
+
+def bump(kind, *pks):
+    pks = {pk for pk in pks if pk is not None}
+    for pk in pks:
+        try:
+            cache.incr(_generation_key(kind, pk))
+        except ValueError:
+            cache.set(_generation_key(kind, pk), _fresh_generation(), None)
+    if pks and kind != "neighbors":
+        # Fragments re-rendered under the new generation must not come from a
+        # lagging replica. "neighbors" is bumped by every checkout's basket
+        # and only reorders recommendations, so it doesn't pin
+        replicas.pin_catalog()
+
+
+def bump_products(products):
+    """Invalidate fragments showing these products (for writes that skip signals)."""
+    bump("product", *(p.pk for p in products))
+    bump("category", *(p.category_id for p in products))
+    bump_listed_with(*(p.pk for p in products))
+
+
+def bump_listed_with(*pks):
+    # Product pages list their frequently-bought-together neighbors, so their
+    # "neighbors" generation (see users/conditional.py) follows neighbor edits
+    if pks:
+        bump("neighbors", *ProductNeighbor.objects.filter(neighbor_id__in=pks).values_list("product_id", flat=True))
+
+
+def fragment_keys(name, objects, *vary_on):
+    """{obj: cache key} for a fragment rendered once per object."""
+    gens = generations(_kind(objects[0]), [obj.pk for obj in objects]) if objects else {}
+    suffix = "".join(f":{value}" for value in vary_on)
+    return {obj: f"fragment:{name}:{_kind(obj)}{obj.pk}.{gens[obj.pk]}{suffix}" for obj in objects}
+
+
+def fragment_key(name, *vary_on):
+    """Cache key for a fragment that depends on the given objects and values."""
+    parts = []
+    for value in vary_on:
+        if isinstance(value, Model):
+            parts.append(f"{_kind(value)}{value.pk}.{generations(_kind(value), [value.pk])[value.pk]}")
+        else:
+            parts.append(str(value))
+    return f"fragment:{name}:" + ":".join(parts)
+
+
+def cached(name, vary_on, render):
+    """HTML for the fragment, from the cache or from render()."""
+    key = fragment_key(name, *vary_on)
+    html = cache.get(key)
+    if html is None:
+        html = render()
+        cache.set(key, html, CACHE_TIMEOUT)
+    return html
+
+
+def cached_many(name, objects, render_missing):
+    """{obj: html} for a fragment per object; misses are rendered together.
+
+    render_missing(objects) returns {obj: html} for the objects not in the cache.
+    """
+    keys = fragment_keys(name, objects)
+    found = cache.get_many(list(keys.values()))
+    missing = [obj for obj in objects if keys[obj] not in found]
+    if missing:
+        rendered = render_missing(missing)
+        cache.set_many({keys[obj]: rendered[obj] for obj in missing}, CACHE_TIMEOUT)
+        found.update({keys[obj]: rendered[obj] for obj in missing})
+    return {obj: found[keys[obj]] for obj in objects}
+
+
+def fill_csrf(html, token):
+    return mark_safe(html.replace(CSRF_PLACEHOLDER, str(token or "")))
+
+
+# --------------------- INVALIDATION --------------------- #
+@receiver(pre_save, sender=Product)
+def remember_previous_values(sender, instance, raw=False, **kwargs):
+    # A product moved to another category must also leave the old one's
+    # section, and users/conditional.py forgets the old slug
+    if not raw and instance.pk is not None:
+        instance._previous_category_id, instance._previous_slug = (
+            Product.objects.filter(pk=instance.pk).values_list("category_id", "slug").first() or (None, None)
+        )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def bump_product(sender, instance, **kwargs):
+    bump("product", instance.pk)
+    bump("category", instance.category_id, getattr(instance, "_previous_category_id", None))
+    if kwargs.get("created") is False:
+        bump_listed_with(instance.pk)
+
+
+@receiver(pre_delete, sender=Product)
+def bump_listed_with_deleted(sender, instance, **kwargs):
+    # Before the delete cascades to the ProductNeighbor rows naming it
+    bump_listed_with(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_category(sender, instance, **kwargs):
+    bump("category", instance.pk)
@@ -0,0 +1,150 @@
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from PIL import Image, ImageOps, features
+
+from . import fragments
+from .models import ImageDerivative, Product, Profile
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------- IMAGE DERIVATIVES --------------------- #
+# Uploaded product/profile images get resized WebP (and AVIF, when Pillow
+# supports it) copies, generated on a small thread pool after the upload's
+# transaction commits so add_product/edit_product don't wait on Pillow.
+# Templates use {% responsive_image %} (users/templatetags/images.py) to emit
+# <picture>/srcset markup pointing at them.
+
+WIDTHS = getattr(settings, "IMAGE_DERIVATIVE_WIDTHS", (200, 400, 800))
+QUALITY = 80
+CACHE_TIMEOUT = 60 * 60
+FORMATS = {"webp": "WEBP"}
+if features.check("avif"):
+    FORMATS["avif"] = "AVIF"
+
+IMAGE_FIELDS = {Product: ("image",), Profile: ("image", "avatar")}
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-derivatives")
+
+
+def derivative_name(digest, width, ext):
+    return f"derivatives/{digest[:2]}/{digest}-{width}.{ext}"
+
+
+def _cache_key(source):
+    return "image-derivatives:" + hashlib.md5(source.encode()).hexdigest()
+
+
+def generate(source):
+    """Create the derivatives for one stored image; returns the ImageDerivative or None."""
+    try:
+        with default_storage.open(source, "rb") as fh:
+            data = fh.read()
+        original = Image.open(BytesIO(data))
+        original = ImageOps.exif_transpose(original)
+    except (OSError, ValueError):
+        logger.warning("Could not read image %s for derivatives", source)
+        return None
+
+    digest = hashlib.sha1(data).hexdigest()
+    if original.mode not in ("RGB", "RGBA"):
+        original = original.convert("RGBA" if "transparency" in original.info else "RGB")
+
+    variants = {}
+    for ext, pil_format in FORMATS.items():
+        variants[ext] = []
+        for width in WIDTHS:
+            if width > original.width and variants[ext]:
+                break  # never upscale; keep at least one size
+            name = derivative_name(digest, width, ext)
+            if not default_storage.exists(name):
+                resized = original.copy()
+                resized.thumbnail((width, width * 4))
+                buffer = BytesIO()
+                resized.save(buffer, pil_format, quality=QUALITY)
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+            variants[ext].append(width)
+
+    derivative, _ = ImageDerivative.objects.update_or_create(
+        source=source, defaults={"digest": digest, "variants": variants}
+    )
+    cache.set(_cache_key(source), derivative, CACHE_TIMEOUT)
+    # Cached product fragments rendered before the derivatives existed show a plain <img>
+    fragments.bump_products(Product.objects.filter(image=source).only("id", "category_id"))
+    return derivative
+
+
+def _generate_in_worker(source):
+    close_old_connections()
+    try:
+        generate(source)
+    except Exception:
+        logger.exception("Generating derivatives for %s failed", source)
+    finally:
+        close_old_connections()
+
+
+def schedule(source):
+    """Generate derivatives once the current transaction commits."""
+    if not getattr(settings, "IMAGE_DERIVATIVES_ASYNC", True):
+        transaction.on_commit(lambda: generate(source))
+    else:
+        transaction.on_commit(lambda: _executor.submit(_generate_in_worker, source))
+
+
+# --------------------- LOOKUPS --------------------- #
+def get_derivative(source):
+    """Cached ImageDerivative for a stored image name, or None if there isn't one yet."""
+    if not source:
+        return None
+    key = _cache_key(source)
+    derivative = cache.get(key)
+    if derivative is None:
+        derivative = ImageDerivative.objects.filter(source=source).first() or False
+        # Remember misses briefly too, so grids of unprocessed images don't
+        # query on every render
+        cache.set(key, derivative, CACHE_TIMEOUT if derivative else 60)
+    return derivative or None
+
+
+def prime(sources):
+    """Load the derivatives for many images (e.g. a product grid) in one query."""
+    keys = {_cache_key(source): source for source in sources if source}
+    missing = [keys[key] for key in set(keys) - set(cache.get_many(list(keys)))]
+    if not missing:
+        return
+    found = {d.source: d for d in ImageDerivative.objects.filter(source__in=missing)}
+    cache.set_many({_cache_key(s): found.get(s, False) for s in missing}, 60)
+    cache.set_many({_cache_key(s): d for s, d in found.items()}, CACHE_TIMEOUT)
+
+
+def srcset(derivative, ext):
+    return ", ".join(
+        f"{default_storage.url(derivative_name(derivative.digest, width, ext))} {width}w"
+        for width in derivative.variants.get(ext, [])
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Profile)
+def generate_on_upload(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    for field in IMAGE_FIELDS[sender]:
+        if update_fields is not None and field not in update_fields:
+            continue
+        file = getattr(instance, field)
+        if not file or file.name == sender._meta.get_field(field).default:
+            continue  # placeholder images aren't uploads
+        if get_derivative(file.name) is None:
+            schedule(file.name)
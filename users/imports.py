@@ -0,0 +1,215 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from django import forms
+from django.conf import settings
+from django.db import reset_queries, transaction
+from django.utils import timezone
+
+from . import autocomplete, fragments, search
+from .forms import ProductForm
+from .models import Category, Product
+from .slugs import allocate_slugs
+
+
+# --------------------- BULK PRODUCT IMPORT --------------------- #
+# Streams CSV/JSONL rows, validates each one with ProductForm's rules and
+# upserts products keyed on slug: existing slugs are updated with
+# bulk_update, new ones inserted with bulk_create, one transaction per batch.
+# Only one batch is held in memory at a time and categories are resolved
+# from a dict loaded once, so file size doesn't change the memory needed.
+# Used by `manage.py import_products` and the seller import page.
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+UPDATE_FIELDS = ["name", "description", "price", "stock", "category", "is_featured", "updated_at"]
+NO_SELLER_ERROR = {"seller": ["New products need a seller; without one only existing products are updated."]}
+
+
+class ProductRowForm(ProductForm):
+    """ProductForm's fields and validation, with the category given by name or slug."""
+
+    category = forms.CharField()
+
+    class Meta(ProductForm.Meta):
+        fields = ["name", "slug", "description", "price", "stock", "is_featured"]
+
+    def __init__(self, *args, categories, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.categories = categories
+
+    def clean_category(self):
+        category = self.categories.get(self.cleaned_data["category"])
+        if category is None:
+            raise forms.ValidationError("Unknown category.")
+        return category
+
+    def validate_unique(self):
+        pass  # an existing slug is an update, not an error
+
+
+class CategoryCache:
+    """Category lookups by id, slug or name (case-insensitive) from one query."""
+
+    def __init__(self, create_missing=False):
+        self.create_missing = create_missing
+        self.by_key = {}
+        for category in Category.objects.all():
+            self.add(category)
+
+    def add(self, category):
+        for key in (str(category.pk), category.slug, category.name.strip().lower()):
+            self.by_key.setdefault(key, category)
+
+    def get(self, value):
+        value = str(value or "").strip()
+        category = self.by_key.get(value) or self.by_key.get(value.lower())
+        if category is None and value and self.create_missing:
+            category = Category.objects.create(name=value)
+            self.add(category)
+        return category
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []  # [(line number, {field: [messages]})], capped at MAX_REPORTED_ERRORS
+
+    def add_error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, errors))
+
+    @property
+    def ok(self):
+        return self.error_count == 0
+
+
+# --------------------- READERS --------------------- #
+def read_csv(stream):
+    # Line numbers count the header as line 1
+    for line, row in enumerate(csv.DictReader(stream), start=2):
+        yield line, row
+
+
+def read_jsonl(stream):
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as e:
+            yield line, e
+            continue
+        yield line, row if isinstance(row, dict) else ValueError("Each line must be a JSON object.")
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+def detect_format(filename):
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def text_stream(binary):
+    """Text view of an uploaded/opened binary file (a BOM from Excel is skipped)."""
+    return io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+
+
+# --------------------- IMPORT --------------------- #
+def _validate(rows, categories, result):
+    for line, row in rows:
+        if isinstance(row, Exception):
+            result.add_error(line, {"__all__": [str(row)]})
+            continue
+        data = {key: "" if value is None else value for key, value in row.items() if key}
+        form = ProductRowForm(data, categories=categories)
+        if form.is_valid():
+            product = form.instance
+            product.category = form.cleaned_data["category"]
+            yield line, product
+        else:
+            result.add_error(line, {field: list(messages) for field, messages in form.errors.items()})
+
+
+def _write_batch(batch, seller, result):
+    # Later rows for the same slug win
+    by_slug = {}
+    new_without_slug = []
+    for line, product in batch:
+        if product.slug:
+            by_slug[product.slug] = (line, product)
+        elif seller is None:
+            result.add_error(line, NO_SELLER_ERROR)
+        else:
+            new_without_slug.append(product)
+
+    existing = {
+        p.slug: p
+        for p in Product.objects.filter(slug__in=list(by_slug)).only("id", "slug", "seller_id", "sold", "category_id")
+    }
+    to_create, to_update = [], []
+    now = timezone.now()  # bulk_update doesn't apply auto_now
+    for slug, (line, product) in by_slug.items():
+        current = existing.get(slug)
+        if current is None and seller is None:
+            # Orders are per seller, so a sellerless product could never be checked out
+            result.add_error(line, NO_SELLER_ERROR)
+        elif current is None:
+            to_create.append(product)
+        elif seller is not None and current.seller_id != seller.pk:
+            result.add_error(line, {"slug": ["A product with this slug belongs to another seller."]})
+        else:
+            product.pk = current.pk
+            product.seller_id = current.seller_id
+            product.sold = current.sold
+            product.updated_at = now
+            to_update.append(product)
+    for product in to_create + new_without_slug:
+        product.seller = seller
+
+    with transaction.atomic():
+        Product.objects.bulk_create(to_create)
+        # Allocated after the rows above exist, so a generated slug can't collide with them
+        for product, slug in zip(new_without_slug, allocate_slugs(Product, [p.name for p in new_without_slug])):
+            product.slug = slug
+        Product.objects.bulk_create(new_without_slug)
+        to_create += new_without_slug
+        Product.objects.bulk_update(to_update, UPDATE_FIELDS)
+        if to_create and to_create[0].pk is None:
+            # MySQL can't return ids from a bulk insert
+            ids = dict(Product.objects.filter(slug__in=[p.slug for p in to_create]).values_list("slug", "pk"))
+            for product in to_create:
+                product.pk = ids[product.slug]
+        # bulk writes send no post_save, so keep the search and autocomplete indexes current here
+        search.index_products(to_create + to_update)
+    for product in to_create + to_update:
+        autocomplete.index.update("product", product.pk, product.name, product.slug, product.sold)
+    fragments.bump_products(to_create + to_update)
+    # An updated product may have moved out of its old category
+    fragments.bump("category", *(existing[p.slug].category_id for p in to_update))
+
+    result.created += len(to_create)
+    result.updated += len(to_update)
+    return to_create + to_update
+
+
+def import_products(stream, fmt="csv", seller=None, create_categories=False, batch_size=BATCH_SIZE):
+    """Import products from a text stream of CSV or JSONL rows; returns an ImportResult.
+
+    Valid rows are saved even when others fail; each failure is reported with
+    its line number and form errors. Without a seller, rows for new products
+    are failures too.
+    """
+    result = ImportResult()
+    categories = CategoryCache(create_missing=create_categories)
+    products = _validate(READERS[fmt](stream), categories, result)
+    while batch := list(islice(products, batch_size)):
+        _write_batch(batch, seller, result)
+        if settings.DEBUG:
+            reset_queries()  # otherwise every batch's SQL would be kept
+    return result
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from users.models import Order
+
+
+class Command(BaseCommand):
+    help = "Fill in the stored subtotal/shipping/total columns on existing orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        orders = (
+            Order.objects.only("id", "checkout_ref", "subtotal", "shipping_fee", "total_price")
+            .annotate(items_subtotal=Coalesce(
+                Sum(F("items__quantity") * F("items__price")), Value(0), output_field=DecimalField()
+            ))
+            .order_by("id")
+        )
+
+        batch, updated = [], 0
+        for order in orders.iterator(chunk_size=batch_size):
+            order.set_totals(order.items_subtotal)
+            batch.append(order)
+            if len(batch) >= batch_size:
+                Order.objects.bulk_update(batch, ["subtotal", "shipping_fee", "total_price"])
+                updated += len(batch)
+                batch = []
+        if batch:
+            Order.objects.bulk_update(batch, ["subtotal", "shipping_fee", "total_price"])
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Updated totals for {updated} orders."))
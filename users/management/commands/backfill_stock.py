@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Give every product with no stock a starting quantity. Checkout refuses to sell more than "
+        "Product.stock, which was 0 for every product created before sellers could set it, so run "
+        "this once when upgrading, before checkout is opened again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("quantity", type=int)
+
+    def handle(self, *args, **options):
+        if options["quantity"] < 1:
+            raise CommandError("quantity must be at least 1.")
+        updated = Product.objects.filter(stock=0).update(stock=options["quantity"])
+        self.stdout.write(self.style.SUCCESS(f"Set stock to {options['quantity']} on {updated} products."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from users.images import IMAGE_FIELDS, generate
+from users.models import ImageDerivative
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnails/WebP variants for uploaded images that don't have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Regenerate existing derivatives too.")
+
+    def handle(self, *args, **options):
+        done = set() if options["force"] else set(ImageDerivative.objects.values_list("source", flat=True))
+        created = 0
+        for model, fields in IMAGE_FIELDS.items():
+            for field in fields:
+                default = model._meta.get_field(field).default
+                names = (
+                    model.objects.exclude(**{field: ""}).exclude(**{field: default})
+                    .exclude(**{f"{field}__isnull": True})
+                    .values_list(field, flat=True).distinct()
+                )
+                for name in names.iterator():
+                    if name in done:
+                        continue
+                    done.add(name)
+                    if generate(name):
+                        created += 1
+        self.stdout.write(self.style.SUCCESS(f"Generated derivatives for {created} images."))
@@ -0,0 +1,49 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from users.imports import BATCH_SIZE, READERS, detect_format, import_products, text_stream
+
+
+class Command(BaseCommand):
+    help = "Create or update products (keyed on slug) from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=sorted(READERS), help="Defaults to the file extension.")
+        parser.add_argument("--seller", help="Username that owns the imported products; needed to create new ones.")
+        parser.add_argument("--create-categories", action="store_true", help="Create unknown categories.")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        seller = None
+        if options["seller"]:
+            try:
+                seller = get_user_model().objects.get(username=options["seller"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user named {options['seller']!r}.")
+
+        start = time.perf_counter()
+        try:
+            with open(options["path"], "rb") as fh:
+                result = import_products(
+                    text_stream(fh),
+                    options["format"] or detect_format(options["path"]),
+                    seller=seller,
+                    create_categories=options["create_categories"],
+                    batch_size=options["batch_size"],
+                )
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for line, errors in result.errors:
+            messages = "; ".join(f"{field}: {' '.join(msgs)}" for field, msgs in errors.items())
+            self.stderr.write(f"line {line}: {messages}")
+        if result.error_count > len(result.errors):
+            self.stderr.write(f"... and {result.error_count - len(result.errors)} more errors")
+        summary = (
+            f"{result.created} created, {result.updated} updated, {result.error_count} rejected "
+            f"in {time.perf_counter() - start:.1f}s."
+        )
+        self.stdout.write(self.style.SUCCESS(summary) if result.ok else self.style.WARNING(summary))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.recommendations import rebuild_recommendations
+
+
+class Command(BaseCommand):
+    help = "Recompute the frequently-bought-together tables from the orders table."
+
+    def handle(self, *args, **options):
+        pairs = rebuild_recommendations()
+        self.stdout.write(self.style.SUCCESS(f"Recommendations rebuilt from {pairs} product pairs."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.analytics import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the seller sales rollups from the orders table."
+
+    def handle(self, *args, **options):
+        rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS("Seller sales rollups rebuilt."))
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.analytics import rebuild_rollups
+from users.recommendations import rebuild_recommendations
+from users.search import rebuild_index
+from users.seeding import BATCH_SIZE, StoreSeeder
+
+
+class Command(BaseCommand):
+    help = "Fill the database with synthetic categories, users, products, carts, wishlists and orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=40)
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--sellers", type=int, default=500)
+        parser.add_argument("--products", type=int, default=1_000_000)
+        parser.add_argument("--orders", type=int, default=2_000_000)
+        parser.add_argument("--days", type=int, default=365, help="Spread orders over this many days.")
+        parser.add_argument("--carts", type=float, default=0.2, help="Fraction of users with a cart.")
+        parser.add_argument("--wishlists", type=float, default=0.3, help="Fraction of users with a wishlist.")
+        parser.add_argument("--password", help="Password for every generated user (default: unusable).")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--skip-search-index", action="store_true")
+
+    def handle(self, *args, **options):
+        if not 1 <= options["sellers"] < options["users"] or options["products"] < 1 or options["categories"] < 1:
+            raise CommandError("Need at least one category, product and seller, and fewer sellers than users.")
+
+        seeder = StoreSeeder(options["seed"], options["batch_size"], options["password"], log=self.stdout.write)
+        steps = [
+            ("categories", lambda: seeder.categories(options["categories"])),
+            ("users", lambda: seeder.users(options["users"], options["sellers"])),
+            ("products", lambda: seeder.products(options["products"])),
+            ("cart items", lambda: seeder.carts(options["carts"])),
+            ("wishlist items", lambda: seeder.wishlists(options["wishlists"])),
+            ("order items", lambda: seeder.orders(options["orders"], options["days"])),
+            ("sold counts", seeder.update_sold_counts),
+            ("seller rollups", rebuild_rollups),
+            ("product pairs", rebuild_recommendations),
+        ]
+        if not options["skip_search_index"]:
+            steps.append(("search index", lambda: rebuild_index(batch_size=options["batch_size"])))
+
+        started = time.perf_counter()
+        for label, step in steps:
+            start = time.perf_counter()
+            self.stdout.write(f"Seeding {label}...")
+            count = step()
+            done = f"{count} {label}" if isinstance(count, int) else label
+            self.stdout.write(f"  {done} in {time.perf_counter() - start:.1f}s")
+        self.stdout.write(self.style.SUCCESS(f"Store seeded in {time.perf_counter() - started:.1f}s."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from users.db.replicas import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database over its replica files, standing in for replication "
+        "when trying the read-replica setup locally (DB_REPLICAS=replica.sqlite3)."
+    )
+
+    def handle(self, *args, **options):
+        aliases = replicas()
+        if not aliases:
+            raise CommandError("No replicas configured; set DB_REPLICAS.")
+        primary = connections[DEFAULT_DB_ALIAS]
+        for alias in [DEFAULT_DB_ALIAS, *aliases]:
+            if connections[alias].vendor != "sqlite":
+                raise CommandError(f"{alias} isn't SQLite; real replicas are kept up to date by the server.")
+        primary.ensure_connection()
+        for alias in aliases:
+            replica = connections[alias]
+            replica.ensure_connection()
+            primary.connection.backup(replica.connection)
+            self.stdout.write(self.style.SUCCESS(f"Copied {primary.settings_dict['NAME']} to {alias}."))
@@ -0,0 +1,52 @@
+import json
+import os
+import shutil
+
+from django.core.management.base import BaseCommand
+
+from users import metrics
+
+
+class Command(BaseCommand):
+    help = "Print per-view query counts and latencies recorded by ViewMetricsMiddleware."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true", help="Print the merged histogram as JSON.")
+        parser.add_argument("--sort", default="wall", choices=["wall", "queries", "sql", "connect", "requests"])
+        parser.add_argument("--reset", action="store_true", help="Delete the flushed histograms afterwards.")
+
+    def handle(self, *args, **options):
+        views = metrics.collect()
+        if options["json"]:
+            self.stdout.write(json.dumps(views, indent=2, sort_keys=True))
+        elif not views:
+            self.stdout.write("No requests recorded yet.")
+        else:
+            self.print_table(views, options["sort"])
+
+        if options["reset"]:
+            metrics.histogram.reset()
+            if os.path.isdir(metrics.METRICS_DIR):
+                shutil.rmtree(metrics.METRICS_DIR)
+
+    def print_table(self, views, sort):
+        sort_keys = {
+            "wall": lambda s: s["wall_ms"] / s["requests"],
+            "queries": lambda s: s["queries"] / s["requests"],
+            "sql": lambda s: s["sql_ms"] / s["requests"],
+            "connect": lambda s: s["connect_ms"] / s["requests"],
+            "requests": lambda s: s["requests"],
+        }
+        header = (
+            f"{'view':<32} {'reqs':>7} {'q/req':>7} {'max q':>6} {'sql ms':>8} {'tpl ms':>8} {'conn ms':>8} {'wall ms':>8} "
+            f"{'p50':>6} {'p95':>6} {'p99':>6}"
+        )
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for view, s in sorted(views.items(), key=lambda item: sort_keys[sort](item[1]), reverse=True):
+            n = s["requests"]
+            self.stdout.write(
+                f"{view[:32]:<32} {n:>7} {s['queries'] / n:>7.1f} {s['max_queries']:>6} "
+                f"{s['sql_ms'] / n:>8.1f} {s['template_ms'] / n:>8.1f} {s['connect_ms'] / n:>8.1f} {s['wall_ms'] / n:>8.1f} "
+                f"{metrics.percentile(s, 0.5):>6} {metrics.percentile(s, 0.95):>6} {metrics.percentile(s, 0.99):>6}"
+            )
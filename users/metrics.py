@@ -0,0 +1,263 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates
+
+from . import querylog
+
+
+# --------------------- VIEW METRICS --------------------- #
+# ViewMetricsMiddleware times every request and, through a connection
+# execute wrapper and the TimedDjangoTemplates backend, how many
+# queries it ran and how long SQL and template rendering took; the
+# users.db backends add how long it waited to open (or take from the pool)
+# database connections. The numbers go out as a Server-Timing header and
+# into an in-process histogram per URL name. Each process writes its
+# histogram to METRICS_DIR every FLUSH_INTERVAL seconds; `manage.py
+# view_metrics` merges and prints them.
+
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+METRICS_DIR = getattr(settings, "VIEW_METRICS_DIR", os.path.join(tempfile.gettempdir(), "ecommerce-view-metrics"))
+FLUSH_INTERVAL = getattr(settings, "VIEW_METRICS_FLUSH_INTERVAL", 30)
+
+_current = ContextVar("view_metrics", default=None)
+
+
+class RequestMetrics:
+    __slots__ = ("queries", "sql_time", "template_time", "connects", "connect_time", "inspector")
+
+    def __init__(self, inspector=None):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.connects = 0
+        self.connect_time = 0.0
+        self.inspector = inspector
+
+
+def current():
+    """The RequestMetrics of the request being handled, or None."""
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.queries += 1
+        metrics.sql_time += elapsed
+        if metrics.inspector is not None:
+            metrics.inspector.record(sql, elapsed)
+
+
+def record_connect(elapsed):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.connects += 1
+        metrics.connect_time += elapsed
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # Installed once per connection (in whatever thread opens it) and a no-op
+    # outside a request, so sync views run in a thread pool are measured too
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# --------------------- TEMPLATES --------------------- #
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing each top-level render."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+# --------------------- HISTOGRAM --------------------- #
+def _empty_stats():
+    return {
+        "requests": 0,
+        "queries": 0,
+        "max_queries": 0,
+        "sql_ms": 0.0,
+        "template_ms": 0.0,
+        "connect_ms": 0.0,
+        "wall_ms": 0.0,
+        "buckets": [0] * (len(BUCKETS_MS) + 1),
+    }
+
+
+class Histogram:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+        self.last_flush = time.monotonic()
+
+    def add(self, view, metrics, wall_time):
+        wall_ms = wall_time * 1000
+        with self.lock:
+            stats = self.views.setdefault(view, _empty_stats())
+            stats["requests"] += 1
+            stats["queries"] += metrics.queries
+            stats["max_queries"] = max(stats["max_queries"], metrics.queries)
+            stats["sql_ms"] += metrics.sql_time * 1000
+            stats["template_ms"] += metrics.template_time * 1000
+            stats["connect_ms"] += metrics.connect_time * 1000
+            stats["wall_ms"] += wall_ms
+            stats["buckets"][bisect_left(BUCKETS_MS, wall_ms)] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {view: dict(stats, buckets=list(stats["buckets"])) for view, stats in self.views.items()}
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+    def flush(self, directory=None):
+        directory = directory or METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(path + ".tmp", path)
+        self.last_flush = time.monotonic()
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush >= FLUSH_INTERVAL:
+            try:
+                self.flush()
+            except OSError:
+                self.last_flush = time.monotonic()
+
+
+histogram = Histogram()
+
+
+def merge(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for view, stats in snapshot.items():
+            total = merged.setdefault(view, _empty_stats())
+            for field in ("requests", "queries", "sql_ms", "template_ms", "connect_ms", "wall_ms"):
+                total[field] += stats.get(field, 0)  # files flushed before connect_ms existed lack it
+            total["max_queries"] = max(total["max_queries"], stats["max_queries"])
+            total["buckets"] = [a + b for a, b in zip(total["buckets"], stats["buckets"])]
+    return merged
+
+
+def collect(directory=None):
+    """Histograms of every process that flushed to the directory, plus this one's."""
+    directory = directory or METRICS_DIR
+    own = f"{os.getpid()}.json"
+    snapshots = [histogram.snapshot()]
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith(".json") and name != own:
+                try:
+                    with open(os.path.join(directory, name)) as fh:
+                        snapshots.append(json.load(fh))
+                except (OSError, ValueError):
+                    continue
+    return merge(snapshots)
+
+
+def percentile(stats, fraction):
+    """Upper bound (ms) of the bucket holding the given fraction of requests."""
+    target = stats["requests"] * fraction
+    seen = 0
+    for bound, count in zip(BUCKETS_MS + (float("inf"),), stats["buckets"]):
+        seen += count
+        if count and seen >= target:
+            return bound
+    return 0
+
+
+# --------------------- MIDDLEWARE --------------------- #
+def server_timing(metrics, wall_time):
+    return ", ".join([
+        f'db;dur={metrics.sql_time * 1000:.1f};desc="{metrics.queries} queries"',
+        f"tpl;dur={metrics.template_time * 1000:.1f}",
+        f'conn;dur={metrics.connect_time * 1000:.1f};desc="{metrics.connects} connects"',
+        f"total;dur={wall_time * 1000:.1f}",
+    ])
+
+
+class ViewMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = getattr(settings, "VIEW_METRICS_SERVER_TIMING", True)
+        if iscoroutinefunction(get_response):
+            # Under ASGI the chain stays async, so async views aren't pushed onto a thread
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics(querylog.QueryInspector() if querylog.enabled() else None)
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics(querylog.QueryInspector() if querylog.enabled() else None)
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    def finish(self, request, response, metrics, wall_time):
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "<unresolved>"
+        histogram.add(view, metrics, wall_time)
+        histogram.maybe_flush()
+        if metrics.inspector is not None:
+            metrics.inspector.report(view, request.get_full_path())
+        if self.header:
+            response["Server-Timing"] = server_timing(metrics, wall_time)
+        return response
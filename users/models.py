@@ -1,3 +1,5 @@
+from decimal import ROUND_DOWN, Decimal
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
@@ -39,21 +41,15 @@ from django.db import models
 from django.conf import settings
 from django.utils.text import slugify
 from django.utils.crypto import get_random_string
+from .slugs import save_with_unique_slug
 
 class Category(models.Model):
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, blank=True)
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.name)
-            slug = base_slug
-            num = 1
-            while Category.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{num}"
-                num += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
+        # Fills in a unique slug from the name (one query, retried on races)
+        save_with_unique_slug(self, super().save, *args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -77,17 +73,21 @@ class Product(models.Model):
 
     is_featured = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Last-Modified for the product page; stock/sold updates don't touch it
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Keyset pagination orderings (see users/pagination.py)
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="product_created_id_idx"),
+            models.Index(fields=["-sold", "-id"], name="product_sold_id_idx"),
+            models.Index(fields=["category", "-created_at", "-id"], name="product_cat_created_id_idx"),
+            models.Index(fields=["category", "-sold", "-id"], name="product_cat_sold_id_idx"),
+        ]
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.name)
-            slug = base_slug
-            num = 1
-            while Product.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{num}"
-                num += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
+        # Fills in a unique slug from the name (one query, retried on races)
+        save_with_unique_slug(self, super().save, *args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -125,6 +125,36 @@ class Wishlist(models.Model):
 
 # --------------------- ORDER --------------------- #
 from users.models import Product  # adjust import based on your project structure
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce
+
+FREE_SHIPPING_THRESHOLD = Decimal("500")
+FLAT_SHIPPING_FEE = Decimal("50")
+
+
+def order_totals(subtotal):
+    """Return (subtotal, shipping_fee, total): free shipping for orders >= 500."""
+    subtotal = Decimal(subtotal or 0)
+    shipping_fee = FLAT_SHIPPING_FEE if subtotal < FREE_SHIPPING_THRESHOLD else Decimal("0")
+    return subtotal, shipping_fee, subtotal + shipping_fee
+
+
+def checkout_totals(subtotals):
+    """order_totals for the per-seller orders of one checkout.
+
+    Shipping is charged once on the combined subtotal, as the cart shows it,
+    and split across the orders in proportion to their subtotals.
+    """
+    subtotals = [Decimal(subtotal or 0) for subtotal in subtotals]
+    combined, shipping_fee, _ = order_totals(sum(subtotals))
+    shares = [
+        (shipping_fee * subtotal / combined).quantize(Decimal("0.01"), ROUND_DOWN) if combined else Decimal("0")
+        for subtotal in subtotals
+    ]
+    if shares:
+        shares[-1] += shipping_fee - sum(shares)  # rounding leftovers
+    return [(subtotal, share, subtotal + share) for subtotal, share in zip(subtotals, shares)]
+
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -143,24 +173,48 @@ class Order(models.Model):
     )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="Pending")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Shared by the per-seller orders created from one checkout
+    checkout_ref = models.UUIDField(blank=True, null=True, editable=False, db_index=True)
+
+    # Stored totals, computed at checkout and kept in sync by the OrderItem
+    # signals below so order listings don't have to touch the items table.
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    shipping_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["seller", "created_at"], name="order_seller_created_idx"),
+            models.Index(fields=["user", "created_at"], name="order_user_created_idx"),
+            # Order exports filter by date range and optionally status
+            models.Index(fields=["created_at"], name="order_created_idx"),
+            models.Index(fields=["status", "created_at"], name="order_status_created_idx"),
+        ]
 
     def __str__(self):
         return f"Order {self.id} - {self.user.username}"
 
-    @property
-    def subtotal(self):
-        """Sum of all order item totals."""
-        return sum(item.total_price for item in self.items.all())
-
-    @property
-    def shipping_fee(self):
-        """Example shipping fee logic: free shipping for orders >= 500."""
-        return 50 if self.subtotal < 500 else 0
-
-    @property
-    def total_price(self):
-        """Total including shipping."""
-        return self.subtotal + self.shipping_fee
+    def set_totals(self, subtotal):
+        """Set subtotal/shipping/total from the items' subtotal."""
+        if self.checkout_ref is None:
+            self.subtotal, self.shipping_fee, self.total_price = order_totals(subtotal)
+        else:
+            # Keeps the share of its checkout's shipping fee it was charged
+            self.subtotal, self.total_price = Decimal(subtotal), Decimal(subtotal) + self.shipping_fee
+
+    def recalculate_totals(self, save=True):
+        """Recompute subtotal/shipping/total from the order items in one query."""
+        subtotal = self.items.aggregate(
+            value=Coalesce(Sum(F("quantity") * F("price")), Value(0), output_field=models.DecimalField())
+        )["value"]
+        self.set_totals(subtotal)
+        if save:
+            Order.objects.filter(pk=self.pk).update(
+                subtotal=self.subtotal,
+                shipping_fee=self.shipping_fee,
+                total_price=self.total_price,
+            )
+        return self.total_price
 
 
 
@@ -204,12 +258,130 @@ class Payment(models.Model):
     def __str__(self):
         return f"Payment for Order {self.order.id}"
 
-from django.db.models.signals import post_save
+# --------------------- IMAGE DERIVATIVES --------------------- #
+# Resized WebP/AVIF copies of an uploaded image, generated by users/images.py.
+# Files are named after the digest of the original's content, so identical
+# uploads share derivatives.
+class ImageDerivative(models.Model):
+    source = models.CharField(max_length=255, unique=True)  # storage name of the original
+    digest = models.CharField(max_length=40)
+    variants = models.JSONField(default=dict)  # {"webp": [200, 400], "avif": [...]}
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.source
+
+
+# --------------------- SELLER ANALYTICS --------------------- #
+# Rollups maintained by users/analytics.py as orders are placed, so the seller
+# dashboard reads a handful of pre-aggregated rows instead of every order.
+class SellerDailySales(models.Model):
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="daily_sales")
+    day = models.DateField()
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["seller", "day"], name="unique_seller_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.seller_id} on {self.day}"
+
+
+class SellerProductSales(models.Model):
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="product_sales")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="seller_sales")
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["seller", "product"], name="unique_seller_product"),
+        ]
+        indexes = [
+            models.Index(fields=["seller", "-revenue"], name="seller_product_revenue_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} sold by {self.seller_id}"
+
+
+# --------------------- RECOMMENDATIONS --------------------- #
+# "Frequently bought together", maintained by users/recommendations.py.
+# ProductPair is the sparse co-occurrence matrix (baskets containing both
+# products, stored in both directions); ProductNeighbor keeps only the top
+# neighbors per product, which is all the product page reads.
+class ProductPair(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "other"], name="unique_product_pair"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.other_id}: {self.count}"
+
+
+class ProductNeighbor(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="neighbors")
+    neighbor = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    score = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["product", "-score", "neighbor"], name="product_neighbor_score_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.neighbor_id} ({self.score})"
+
+
+# --------------------- SEARCH INDEX --------------------- #
+# Inverted index over product name, description and category name, maintained
+# by users/search.py. One document per product, one posting per (term, doc).
+class SearchDocument(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="search_document")
+    length = models.PositiveIntegerField(default=0)  # weighted token count
+
+    def __str__(self):
+        return f"Search document for {self.product_id}"
+
+
+class SearchPosting(models.Model):
+    term = models.CharField(max_length=64)
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE, related_name="postings")
+    frequency = models.PositiveIntegerField(default=1)  # weighted term frequency
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["term", "document"], name="unique_search_posting"),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.document_id}"
+
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def sync_order_totals(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    order = Order.objects.only("checkout_ref", "shipping_fee").filter(pk=instance.order_id).first()
+    if order is not None:  # gone when the delete cascaded from the order
+        order.recalculate_totals()
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
@@ -260,52 +432,3 @@ class User(AbstractUser):
         help_text="Specific permissions for this user.",
         verbose_name="user permissions"
     )
-
-
-from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
-
-
-@csrf_exempt
-def remove_cart_ajax(request):
-    if request.method == "POST":
-        item_id = request.POST.get('item_id')
-        try:
-            item = CartItem.objects.get(id=item_id, cart__user=request.user)
-            item.delete()
-        except CartItem.DoesNotExist:
-            pass
-
-        # Recalculate totals
-        cart_items = CartItem.objects.filter(cart__user=request.user)
-        cart_total = sum([i.total for i in cart_items])
-        shipping = 10 if cart_total > 0 else 0
-
-        return JsonResponse({
-            'cart_total': cart_total,
-            'shipping': shipping
-        })
-    
-
-@csrf_exempt
-def update_cart_ajax(request):
-    if request.method == "POST":
-        item_id = request.POST.get('item_id')
-        qty = int(request.POST.get('quantity', 1))
-        try:
-            item = CartItem.objects.get(id=item_id, cart__user=request.user)
-            item.quantity = qty
-            item.save()
-        except CartItem.DoesNotExist:
-            pass
-
-        # Recalculate totals
-        cart_items = CartItem.objects.filter(cart__user=request.user)
-        cart_total = sum([i.total for i in cart_items])
-        shipping = 10 if cart_total > 0 else 0
-
-        return JsonResponse({
-            'item_total': item.total,
-            'cart_total': cart_total,
-            'shipping': shipping
-        })
@@ -0,0 +1,124 @@
+import uuid
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from . import recommendations
+from .analytics import record_orders
+from .models import CartItem, Order, OrderItem, Payment, Product, ShippingAddress, checkout_totals
+
+
+# --------------------- CHECKOUT --------------------- #
+# Places a checkout in one transaction: stock is reserved with conditional
+# UPDATEs (stock >= quantity), so two buyers racing for the last unit can't
+# both succeed. The cart is split into one order per seller, and orders,
+# items, shipping addresses and payments are each written with bulk_create,
+# and the seller analytics rollups are updated in the same transaction. The
+# cart's single shipping fee is split across the orders (checkout_totals), so
+# they add up to the total the cart and checkout page showed.
+
+class OutOfStock(Exception):
+    def __init__(self, shortages):
+        self.shortages = shortages  # [{"product": Product, "requested": n, "available": n}]
+        names = ", ".join(s["product"].name for s in shortages)
+        super().__init__(f"Not enough stock for: {names}")
+
+
+def _merge_lines(lines):
+    # The same product/size may appear twice; reserve it once
+    merged = {}
+    for product_id, quantity, size in lines:
+        key = (product_id, size)
+        merged[key] = merged.get(key, 0) + quantity
+    return merged
+
+
+def reserve_stock(products, quantities):
+    """Decrement stock and bump sold for every product, or raise OutOfStock."""
+    shortages = []
+    # Lock rows in a fixed order so concurrent checkouts can't deadlock
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        updated = Product.objects.filter(pk=product_id, stock__gte=quantity).update(
+            stock=F("stock") - quantity, sold=F("sold") + quantity
+        )
+        if not updated:
+            available = Product.objects.filter(pk=product_id).values_list("stock", flat=True).first() or 0
+            shortages.append({"product": products[product_id], "requested": quantity, "available": available})
+    if shortages:
+        raise OutOfStock(shortages)
+
+
+def _create_orders(orders, checkout_ref):
+    Order.objects.bulk_create(orders)
+    if orders and orders[0].pk is None:
+        # MySQL can't return ids from a bulk insert; read them back
+        ids = dict(Order.objects.filter(checkout_ref=checkout_ref).values_list("seller_id", "pk"))
+        for order in orders:
+            order.pk = ids[order.seller_id]
+    return orders
+
+
+@transaction.atomic
+def place_order(user, lines, shipping=None, payment_method=None):
+    """Create one order per seller from (product_id, quantity, size) lines.
+
+    Raises OutOfStock (and rolls everything back) if any line can't be filled.
+    """
+    merged = _merge_lines(lines)
+    if not merged:
+        raise ValueError("Cannot place an order without items")
+    products = Product.objects.in_bulk({product_id for product_id, _ in merged})
+
+    quantities = {}
+    for (product_id, _), quantity in merged.items():
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    reserve_stock(products, quantities)
+
+    items_by_seller = defaultdict(list)
+    for (product_id, size), quantity in merged.items():
+        product = products[product_id]
+        items_by_seller[product.seller_id].append(
+            OrderItem(product=product, quantity=quantity, size=size, price=product.price)
+        )
+
+    checkout_ref = uuid.uuid4()
+    orders = []
+    totals = checkout_totals(sum(item.total_price for item in items) for items in items_by_seller.values())
+    for seller_id, (subtotal, shipping_fee, total) in zip(items_by_seller, totals):
+        orders.append(Order(
+            user=user,
+            seller_id=seller_id,
+            status="Pending",
+            checkout_ref=checkout_ref,
+            subtotal=subtotal,
+            shipping_fee=shipping_fee,
+            total_price=total,
+        ))
+    _create_orders(orders, checkout_ref)
+
+    all_items = []
+    for order, items in zip(orders, items_by_seller.values()):
+        for item in items:
+            item.order = order
+        all_items.extend(items)
+    OrderItem.objects.bulk_create(all_items)
+    record_orders(orders, all_items)
+    recommendations.schedule(item.product_id for item in all_items)
+
+    if shipping:
+        ShippingAddress.objects.bulk_create([ShippingAddress(order=order, **shipping) for order in orders])
+    if payment_method:
+        Payment.objects.bulk_create([Payment(order=order, payment_method=payment_method) for order in orders])
+    return orders
+
+
+@transaction.atomic
+def checkout_cart(cart, shipping=None, payment_method=None):
+    """Place orders for everything in the cart and empty it."""
+    cart_items = CartItem.objects.filter(cart=cart)
+    lines = list(cart_items.values_list("product_id", "quantity", "size"))
+    orders = place_order(cart.user, lines, shipping, payment_method)
+    cart_items.delete()
+    return orders
@@ -0,0 +1,107 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.template.base import Node
+
+
+# --------------------- QUERY INSPECTOR --------------------- #
+# Opt-in (QUERY_INSPECTOR = True) companion to the view metrics: every query
+# of a request is normalized (literals and IN lists collapsed) so queries that
+# only differ in parameters group together. Groups run at least
+# DUPLICATE_QUERY_THRESHOLD times, and single queries slower than
+# SLOW_QUERY_MS, are appended to the QUERY_REPORT_FILE JSONL report with the
+# Python stack and the template line that ran them first.
+
+DUPLICATE_THRESHOLD = getattr(settings, "DUPLICATE_QUERY_THRESHOLD", 5)
+SLOW_MS = getattr(settings, "SLOW_QUERY_MS", 100)
+STACK_LIMIT = 12
+
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?|'[^']*'|-?\d+(?:\.\d+)?)\s*,?)+\)", re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.\"`])-?\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+_write_lock = threading.Lock()
+_OWN_FILES = {__file__, os.path.join(os.path.dirname(__file__), "metrics.py")}
+
+
+def enabled():
+    return getattr(settings, "QUERY_INSPECTOR", False)
+
+
+def report_file():
+    return getattr(settings, "QUERY_REPORT_FILE", os.path.join(settings.BASE_DIR, "var", "queries.jsonl"))
+
+
+def normalize(sql):
+    """SQL with parameters, literals and IN lists replaced by placeholders."""
+    sql = _IN_LIST.sub("IN (...)", sql)
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _SPACE.sub(" ", sql.replace("%s", "?")).strip()
+
+
+def _capture():
+    """(Python stack, innermost template "name:line") of the current query."""
+    stack = []
+    template = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename in _OWN_FILES:
+            frame = frame.f_back
+            continue
+        node = frame.f_locals.get("self")
+        if template is None and isinstance(node, Node) and node.token is not None:
+            origin = getattr(node, "origin", None)
+            template = f"{getattr(origin, 'template_name', None) or origin}:{node.token.lineno}"
+        path = code.co_filename
+        if len(stack) < STACK_LIMIT and "site-packages" not in path and os.sep + "django" + os.sep not in path:
+            stack.append(f"{os.path.relpath(path, settings.BASE_DIR)}:{frame.f_lineno} in {code.co_name}")
+        frame = frame.f_back
+    return stack, template
+
+
+class QueryInspector:
+    def __init__(self):
+        self.groups = {}
+        self.slow = []
+
+    def record(self, sql, duration):
+        key = normalize(sql)
+        group = self.groups.get(key)
+        if group is None:
+            stack, template = _capture()
+            self.groups[key] = group = {"count": 0, "total_ms": 0.0, "example": sql,
+                                        "stack": stack, "template": template}
+        group["count"] += 1
+        group["total_ms"] += duration * 1000
+        if duration * 1000 >= SLOW_MS:
+            stack, template = _capture()
+            self.slow.append({"sql": sql, "ms": round(duration * 1000, 2), "stack": stack, "template": template})
+
+    def findings(self):
+        for sql, group in self.groups.items():
+            if group["count"] >= DUPLICATE_THRESHOLD:
+                yield {"kind": "duplicate", "sql": sql, "count": group["count"],
+                       "total_ms": round(group["total_ms"], 2), "example": group["example"],
+                       "template": group["template"], "stack": group["stack"]}
+        for slow in self.slow:
+            yield {"kind": "slow", **slow}
+
+    def report(self, view, path):
+        lines = [
+            json.dumps({"time": time.time(), "view": view, "path": path, **finding})
+            for finding in self.findings()
+        ]
+        if not lines:
+            return 0
+        filename = report_file()
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with _write_lock, open(filename, "a") as fh:
+            fh.write("\n".join(lines) + "\n")
+        return len(lines)
@@ -0,0 +1,179 @@
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import permutations
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from . import fragments
+from .analytics import _bulk_insert, _increment
+from .models import Order, OrderItem, ProductNeighbor, ProductPair
+
+logger = logging.getLogger(__name__)
+
+# --------------------- FREQUENTLY BOUGHT TOGETHER --------------------- #
+# A basket is one checkout (all the per-seller orders sharing a checkout_ref,
+# or a single order from before checkout_ref existed). ProductPair counts the
+# baskets every pair of products appeared in; ProductNeighbor keeps each
+# product's TOP_K highest counts, so the product page reads one short index
+# range. rebuild_recommendations() recomputes both with a GROUP BY in the
+# database; record_basket() folds each new checkout in once it commits, on a
+# background thread so checkout latency doesn't pay for it.
+#
+# Counts only grow, so a product's top-k can only change through the pairs
+# of the basket just recorded, and the incremental update stays exact.
+
+TOP_K = 10
+SHOWN = 4
+
+# One worker: baskets recorded by this process never race each other, and
+# baskets that queue up while it works are written in one transaction
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recommendations")
+_pending = []
+_pending_lock = threading.Lock()
+
+
+def _pair_counts_sql():
+    item = connection.ops.quote_name(OrderItem._meta.db_table)
+    order = connection.ops.quote_name(Order._meta.db_table)
+    pair = connection.ops.quote_name(ProductPair._meta.db_table)
+    # The ORM can't join orders to each other on checkout_ref, so this one is raw SQL
+    return f"""
+        INSERT INTO {pair} (product_id, other_id, count)
+        SELECT p, q, SUM(n) FROM (
+            SELECT a.product_id AS p, b.product_id AS q, COUNT(DISTINCT oa.checkout_ref) AS n
+            FROM {item} a
+            JOIN {order} oa ON oa.id = a.order_id
+            JOIN {order} ob ON ob.checkout_ref = oa.checkout_ref
+            JOIN {item} b ON b.order_id = ob.id
+            WHERE a.product_id <> b.product_id
+            GROUP BY a.product_id, b.product_id
+            UNION ALL
+            SELECT a.product_id, b.product_id, COUNT(DISTINCT a.order_id)
+            FROM {item} a
+            JOIN {order} oa ON oa.id = a.order_id
+            JOIN {item} b ON b.order_id = a.order_id
+            WHERE oa.checkout_ref IS NULL AND a.product_id <> b.product_id
+            GROUP BY a.product_id, b.product_id
+        ) pairs
+        GROUP BY p, q
+    """
+
+
+@transaction.atomic
+def rebuild_recommendations():
+    """Recompute the co-occurrence counts and every product's top neighbors."""
+    ProductNeighbor.objects.all().delete()
+    ProductPair.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(_pair_counts_sql())
+
+    ranked = (
+        ProductPair.objects.annotate(rank=Window(
+            RowNumber(), partition_by=F("product_id"), order_by=(F("count").desc(), F("other_id").asc()),
+        ))
+        .filter(rank__lte=TOP_K)
+        .values_list("product_id", "other_id", "count")
+    )
+    _bulk_insert(ProductNeighbor, (
+        ProductNeighbor(product_id=product, neighbor_id=other, score=count)
+        for product, other, count in ranked.iterator()
+    ))
+    transaction.on_commit(lambda: fragments.bump("neighbors", "all"))
+    return ProductPair.objects.count()
+
+
+def _top(scores):
+    # Highest count first; ties go to the lower product id, as in the rebuild
+    return dict(sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:TOP_K])
+
+
+@transaction.atomic
+def record_baskets(baskets):
+    """Count newly placed baskets (sorted product id lists) and update top neighbors."""
+    changed = set()
+    for products in baskets:
+        changed.update(_record_basket(products))
+    if changed:
+        # Product pages whose list changed stop answering 304 (users/conditional.py)
+        transaction.on_commit(lambda: fragments.bump("neighbors", *changed))
+
+
+def _record_basket(products):
+    pairs = ProductPair.objects.filter(product_id__in=products, other_id__in=products)
+    pairs.update(count=F("count") + 1)
+    counts = {(p, q): count for p, q, count in pairs.values_list("product_id", "other_id", "count")}
+    missing = [pair for pair in permutations(products, 2) if pair not in counts]
+    if missing:
+        # First time these products meet
+        try:
+            with transaction.atomic():
+                ProductPair.objects.bulk_create(ProductPair(product_id=p, other_id=q, count=1) for p, q in missing)
+        except IntegrityError:
+            # Another checkout created some of the rows first
+            for p, q in missing:
+                _increment(ProductPair, {"product_id": p, "other_id": q}, {"count": 1})
+        counts = {(p, q): count for p, q, count in pairs.values_list("product_id", "other_id", "count")}
+
+    current = defaultdict(dict)
+    for p, q, score in ProductNeighbor.objects.filter(product_id__in=products).values_list(
+        "product_id", "neighbor_id", "score"
+    ):
+        current[p][q] = score
+    changed = {}
+    for p in products:
+        top = _top({**current[p], **{q: counts[(p, q)] for q in products if q != p}})
+        if top != current[p]:
+            changed[p] = top
+    if changed:
+        ProductNeighbor.objects.filter(product_id__in=changed).delete()
+        ProductNeighbor.objects.bulk_create(
+            ProductNeighbor(product_id=p, neighbor_id=q, score=score)
+            for p, top in changed.items() for q, score in top.items()
+        )
+    return changed
+
+
+def _record_pending():
+    with _pending_lock:
+        baskets = _pending[:]
+        _pending.clear()
+    close_old_connections()
+    try:
+        record_baskets(baskets)
+    except Exception:
+        logger.exception("Recording %d baskets for recommendations failed", len(baskets))
+    finally:
+        close_old_connections()
+
+
+def _enqueue(products):
+    with _pending_lock:
+        _pending.append(products)
+        if len(_pending) == 1:
+            _executor.submit(_record_pending)
+
+
+def schedule(product_ids):
+    """Record a checkout's basket once the current transaction commits."""
+    products = sorted(set(product_ids))
+    if len(products) < 2:
+        return
+    if not getattr(settings, "RECOMMENDATIONS_ASYNC", True):
+        transaction.on_commit(lambda: record_baskets([products]))
+    else:
+        transaction.on_commit(lambda: _enqueue(products))
+
+
+def frequently_bought_with(product, limit=SHOWN):
+    """Products most often bought together with this one, best first."""
+    rows = (
+        ProductNeighbor.objects.filter(product=product)
+        .select_related("neighbor")
+        .order_by("-score", "neighbor_id")[:limit]
+    )
+    return [row.neighbor for row in rows]
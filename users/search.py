@@ -0,0 +1,217 @@
+import math
+import re
+from collections import Counter
+
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Avg, Case, Count, FloatField, Sum, Value, When
+from django.db.models.functions import Cast, Ln
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Category, Product, SearchDocument, SearchPosting
+
+
+# --------------------- SEARCH --------------------- #
+# Pure-database full-text search: an inverted index stored in SearchDocument /
+# SearchPosting with BM25 ranking, so it works the same on SQLite and MySQL
+# without an external search service.
+
+FIELD_WEIGHTS = {"name": 3, "category": 2, "description": 1}
+BM25_K1 = 1.2
+BM25_B = 0.75
+FEATURED_BOOST = 1.25
+SOLD_BOOST = 0.1  # multiplied by log(1 + sold)
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "the", "to", "with",
+}
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(token):
+    # Very small stemmer: "shirts" and "shirt" should land on the same term
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        token = token[:-1]
+    return token[:64]
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [normalize(t) for t in TOKEN_RE.findall(text.lower()) if t not in STOP_WORDS]
+
+
+def document_terms(product, category_name=None):
+    """Weighted term frequencies for a product across all indexed fields."""
+    if category_name is None:
+        category_name = product.category.name if product.category_id else ""
+    terms = Counter()
+    fields = {"name": product.name, "category": category_name, "description": product.description}
+    for field, text in fields.items():
+        for token in tokenize(text):
+            terms[token] += FIELD_WEIGHTS[field]
+    return terms
+
+
+# --------------------- INDEXING --------------------- #
+def index_products(products, category_names=None):
+    """(Re)index an iterable of products using bulk writes."""
+    products = list(products)
+    if not products:
+        return
+    category_names = category_names or {}
+    ids = [p.pk for p in products]
+
+    documents, postings = [], []
+    for product in products:
+        terms = document_terms(product, category_names.get(product.category_id))
+        documents.append(SearchDocument(product_id=product.pk, length=sum(terms.values())))
+        postings.extend(
+            SearchPosting(term=term, document_id=product.pk, frequency=freq)
+            for term, freq in terms.items()
+        )
+
+    with transaction.atomic():
+        SearchDocument.objects.filter(product_id__in=ids).delete()
+        SearchDocument.objects.bulk_create(documents)
+        SearchPosting.objects.bulk_create(postings, batch_size=1000)
+
+
+def index_product(product):
+    index_products([product])
+
+
+def rebuild_index(batch_size=1000):
+    """Index every product; returns the number of documents written."""
+    category_names = dict(Category.objects.values_list("id", "name"))
+    SearchDocument.objects.all().delete()
+    total = 0
+    batch = []
+    for product in Product.objects.only("id", "name", "description", "category_id").iterator(chunk_size=batch_size):
+        batch.append(product)
+        if len(batch) >= batch_size:
+            index_products(batch, category_names)
+            total += len(batch)
+            batch = []
+    index_products(batch, category_names)
+    return total + len(batch)
+
+
+@receiver(post_save, sender=Product)
+def reindex_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_product(instance)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created=False, raw=False, **kwargs):
+    # A renamed category changes the "category" field of all of its products
+    if raw or created:
+        return
+    category_names = {instance.pk: instance.name}
+    products = Product.objects.filter(category=instance).only("id", "name", "description", "category_id")
+    index_products(products, category_names)
+
+# Deleting a product cascades to its SearchDocument and postings.
+
+
+# --------------------- QUERYING --------------------- #
+class RankedDocuments:
+    """Sliceable {"document_id", "score"} rows with a precomputed count.
+
+    Paginator would otherwise count() the scored query, doing the ranking
+    work twice per page.
+    """
+
+    def __init__(self, queryset, count):
+        self.queryset = queryset
+        self._count = count
+
+    def count(self):
+        return self._count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, key):
+        return self.queryset[key]
+
+    def __iter__(self):
+        return iter(self.queryset)
+
+
+def ranked_documents(query):
+    """Ranked documents matching every query term, best first.
+
+    BM25 is evaluated inside the database (one GROUP BY over the postings of
+    the query terms), so only the requested page of ids comes back to Python.
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return None
+
+    stats = SearchDocument.objects.aggregate(count=Count("pk"), avg_length=Avg("length"))
+    doc_count = stats["count"] or 0
+    avg_length = stats["avg_length"] or 1.0
+    if not doc_count:
+        return None
+
+    postings = SearchPosting.objects.filter(term__in=terms)
+    df_by_term = dict(postings.values_list("term").annotate(df=Count("pk")).order_by())
+    idf = {
+        term: math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+        for term, df in df_by_term.items()
+    }
+    if len(idf) < len(terms):
+        return None  # every term has to match
+
+    # Drive the match from the rarest term so common words like "cotton"
+    # don't make the database score most of the catalog.
+    rarest = max(idf, key=idf.get)
+    if len(idf) > 1:
+        postings = postings.filter(
+            document_id__in=SearchPosting.objects.filter(term=rarest).values("document_id")
+        )
+
+    frequency = Cast("frequency", FloatField())
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * Cast("document__length", FloatField()) / avg_length)
+    term_score = frequency * (BM25_K1 + 1) / (frequency + norm)
+    term_idf = Case(*[When(term=t, then=Value(v)) for t, v in idf.items()], output_field=FloatField())
+    boost = (1 + SOLD_BOOST * Ln(1 + Cast("document__product__sold", FloatField()))) * Case(
+        When(document__product__is_featured=True, then=Value(FEATURED_BOOST)),
+        default=Value(1.0),
+        output_field=FloatField(),
+    )
+
+    documents = postings.values("document_id")
+    if len(idf) > 1:
+        documents = documents.annotate(matched=Count("pk")).filter(matched=len(idf))
+        count = documents.count()
+    else:
+        count = df_by_term[rarest]
+    scored = documents.annotate(
+        score=Sum(term_idf * term_score, output_field=FloatField()) * boost
+    ).order_by("-score", "-document_id")
+    return RankedDocuments(scored, count)
+
+
+def rank(query):
+    """Return [(product_id, score)] for the query, best match first."""
+    documents = ranked_documents(query)
+    if documents is None:
+        return []
+    return [(row["document_id"], row["score"]) for row in documents]
+
+
+def search_products(query, page=1, per_page=20):
+    """Return a Paginator page whose object_list holds ranked Product objects."""
+    documents = ranked_documents(query)
+    if documents is None:
+        documents = RankedDocuments(SearchPosting.objects.none().values("document_id"), 0)
+    page_obj = Paginator(documents, per_page).get_page(page)
+    ids = [row["document_id"] for row in page_obj.object_list]
+    products = Product.objects.select_related("category").in_bulk(ids)
+    page_obj.object_list = [products[pid] for pid in ids if pid in products]
+    return page_obj
@@ -0,0 +1,262 @@
+import math
+import random
+import uuid
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import reset_queries, transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import Cart, CartItem, Category, Order, OrderItem, Product, Profile, Wishlist, order_totals
+
+
+# --------------------- SYNTHETIC STORE DATA --------------------- #
+# Used by `manage.py seed_store` (and the storefront benchmark) to fill a
+# database with realistic volumes. Rows are produced by generators and
+# written with bulk_create in fixed-size batches, so memory stays flat: the
+# only per-row state kept is three compact arrays describing the products.
+# Product popularity is Zipfian (a few products get most of the orders) and
+# order dates follow a seasonal curve with weekend and year-end peaks.
+
+BATCH_SIZE = 2000
+ZIPF_EXPONENT = 1.1
+
+WORDS = (
+    "cotton linen silk denim leather wool summer winter classic slim regular casual formal party "
+    "kurta saree shirt dress jeans jacket shoe sneaker sandal bag watch scarf belt cap red blue "
+    "black white green printed striped checked floral vintage premium basic oversized cropped"
+).split()
+CATEGORY_NAMES = (
+    "Men", "Women", "Kids", "Footwear", "Accessories", "Ethnic Wear", "Sportswear", "Winter Wear",
+    "Bags", "Watches", "Jewellery", "Beauty", "Home", "Electronics", "Books", "Toys",
+)
+STATUSES = (("Delivered", 80), ("Shipped", 8), ("Pending", 7), ("Cancelled", 5))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def zipf_rank(rng, n, s=ZIPF_EXPONENT):
+    """A rank in [0, n) drawn from an (approximate, continuous) Zipf distribution."""
+    u = rng.random()
+    if abs(s - 1) < 1e-9:
+        rank = math.exp(u * math.log(n + 1)) - 1
+    else:
+        rank = ((n + 1) ** (1 - s) - 1) * u + 1
+        rank = rank ** (1 / (1 - s)) - 1
+    return min(int(rank), n - 1)
+
+
+def seasonal_weights(days, end):
+    """Relative order volume for each of the `days` days up to `end`."""
+    weights = []
+    for offset in range(days):
+        day = end - timedelta(days=days - 1 - offset)
+        season = 1 + 0.35 * math.sin(2 * math.pi * (day.timetuple().tm_yday - 80) / 365)
+        if day.month in (11, 12):
+            season *= 1.8  # festive season / year-end sales
+        if day.weekday() >= 5:
+            season *= 1.25
+        weights.append(season)
+    return weights
+
+
+@contextmanager
+def explicit_timestamps(model, field):
+    """Let bulk_create write the given auto_now_add field."""
+    field = model._meta.get_field(field)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _fill_pks(model, objs, key):
+    # MySQL can't return ids from a bulk insert; read them back by a unique key
+    if objs and objs[0].pk is None:
+        ids = dict(model.objects.filter(**{f"{key}__in": [getattr(o, key) for o in objs]}).values_list(key, "pk"))
+        for obj in objs:
+            obj.pk = ids[getattr(obj, key)]
+
+
+class StoreSeeder:
+    def __init__(self, seed=0, batch_size=BATCH_SIZE, password=None, log=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.password = make_password(password) if password else "!"  # hashed once, shared by every user
+        self.log = log or (lambda message: None)
+        self.prefix = uuid.uuid4().hex[:6]  # keeps usernames/slugs unique across runs
+        self.user_ids = array("q")
+        self.seller_ids = array("q")
+        # Products sorted by seller: ids, prices (cents), and each seller's range
+        self.product_ids = array("q")
+        self.product_prices = array("q")
+        self.product_sellers = array("q")
+        self.seller_ranges = {}
+
+    def insert(self, model, objs, key=None):
+        """bulk_create objs in batches; yields each saved batch."""
+        written = 0
+        for batch in batched(objs, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+                if key:
+                    _fill_pks(model, batch, key)
+            if settings.DEBUG:
+                reset_queries()  # otherwise every batch's SQL would be kept
+            written += len(batch)
+            if written % (self.batch_size * 50) < self.batch_size:
+                self.log(f"  {model.__name__}: {written}")
+            yield batch
+
+    def write(self, model, objs, key=None):
+        return sum(len(batch) for batch in self.insert(model, objs, key))
+
+    # --------------------- ROWS --------------------- #
+    def categories(self, n):
+        base = len(CATEGORY_NAMES)
+        names = [CATEGORY_NAMES[i % base] + (f" {i // base + 1}" if i >= base else "") for i in range(n)]
+        rows = (Category(name=name, slug=f"{slugify(name)}-{self.prefix}") for name in names)
+        self.category_ids = [c.pk for batch in self.insert(Category, rows, key="slug") for c in batch]
+        return n
+
+    def users(self, n, sellers):
+        User = get_user_model()
+        now = timezone.now()
+
+        def rows():
+            for i in range(n):
+                yield User(username=f"{'seller' if i < sellers else 'user'}{i}-{self.prefix}",
+                           email=f"user{i}@example.com", password=self.password, date_joined=now)
+
+        for batch in self.insert(User, rows(), key="username"):
+            # bulk_create skips the post_save receiver that creates profiles
+            self.write(Profile, (
+                Profile(user_id=user.pk, role="Seller" if user.username.startswith("seller") else "Customer")
+                for user in batch
+            ))
+            for user in batch:
+                (self.seller_ids if user.username.startswith("seller") else self.user_ids).append(user.pk)
+        return n
+
+    def products(self, n):
+        rng = self.rng
+        sellers = self.seller_ids or array("q", [0])
+        per_seller = math.ceil(n / len(sellers))
+
+        def rows():
+            for i in range(n):
+                seller = sellers[i // per_seller]
+                name = " ".join(rng.choice(WORDS) for _ in range(3)).title()
+                yield Product(
+                    category_id=rng.choice(self.category_ids),
+                    seller_id=seller or None,
+                    name=name,
+                    slug=f"{slugify(name)}-{self.prefix}-{i}",
+                    description=" ".join(rng.choice(WORDS) for _ in range(20)),
+                    price=Decimal(int(rng.lognormvariate(6.5, 0.8)) + 99),
+                    stock=rng.randint(0, 500),
+                )
+
+        # Generated seller by seller, so each seller's products are one range
+        for batch in self.insert(Product, rows(), key="slug"):
+            for product in batch:
+                self.product_ids.append(product.pk)
+                self.product_prices.append(int(product.price * 100))
+                self.product_sellers.append(product.seller_id or 0)
+        for index, seller in enumerate(self.product_sellers):
+            start, _ = self.seller_ranges.get(seller, (index, index))
+            self.seller_ranges[seller] = (start, index + 1)
+        self.spread = next(m for m in range(7919, 7919 + n + 2) if math.gcd(m, n) == 1)
+        return n
+
+    def popular_product(self):
+        # Rank 0 is the most popular; spread ranks over the id space so
+        # bestsellers aren't all from the first seller
+        rank = zipf_rank(self.rng, len(self.product_ids))
+        return (rank * self.spread) % len(self.product_ids)
+
+    def carts(self, fraction):
+        rng = self.rng
+        owners = [user for user in self.user_ids if rng.random() < fraction]
+        total = 0
+        for batch in self.insert(Cart, (Cart(user_id=user) for user in owners), key="user_id"):
+            total += self.write(CartItem, (
+                CartItem(cart_id=cart.pk, product_id=self.product_ids[index], quantity=rng.randint(1, 3))
+                for cart in batch
+                for index in {self.popular_product() for _ in range(rng.randint(1, 5))}
+            ))
+        return total
+
+    def wishlists(self, fraction):
+        rng = self.rng
+        owners = [user for user in self.user_ids if rng.random() < fraction]
+        Item = Wishlist.items.through
+        total = 0
+        for batch in self.insert(Wishlist, (Wishlist(user_id=user) for user in owners), key="user_id"):
+            total += self.write(Item, (
+                Item(wishlist_id=wishlist.pk, product_id=self.product_ids[index])
+                for wishlist in batch
+                for index in {self.popular_product() for _ in range(rng.randint(1, 8))}
+            ))
+        return total
+
+    def orders(self, n, days=365):
+        rng = self.rng
+        end = timezone.localdate()
+        weights = seasonal_weights(days, end)
+        cum_weights = [sum(weights[:i + 1]) for i in range(len(weights))]
+        day_offsets = range(days)
+        statuses, status_weights = zip(*STATUSES)
+        tz = timezone.get_current_timezone()
+        buyers = self.user_ids or self.seller_ids
+
+        def rows():
+            for _ in range(n):
+                first = self.popular_product()
+                start, stop = self.seller_ranges[self.product_sellers[first]]
+                lines = {first: rng.randint(1, 3)}
+                for _ in range(rng.choices((0, 1, 2, 3), (60, 25, 10, 5))[0]):
+                    lines.setdefault(rng.randrange(start, stop), 1)
+                subtotal = Decimal(sum(self.product_prices[i] * q for i, q in lines.items())) / 100
+                subtotal, shipping, total = order_totals(subtotal)
+                day = end - timedelta(days=days - 1 - rng.choices(day_offsets, cum_weights=cum_weights)[0])
+                created = datetime.combine(day, time(rng.randrange(24), rng.randrange(60)), tzinfo=tz)
+                order = Order(
+                    user_id=rng.choice(buyers), seller_id=self.product_sellers[first] or None,
+                    status=rng.choices(statuses, status_weights)[0], created_at=created,
+                    checkout_ref=uuid.uuid4(), subtotal=subtotal, shipping_fee=shipping, total_price=total,
+                )
+                order.lines = lines
+                yield order
+
+        items = 0
+        with explicit_timestamps(Order, "created_at"):
+            for batch in self.insert(Order, rows(), key="checkout_ref"):
+                items += self.write(OrderItem, (
+                    OrderItem(order_id=order.pk, product_id=self.product_ids[index], quantity=quantity,
+                              price=Decimal(self.product_prices[index]) / 100)
+                    for order in batch for index, quantity in order.lines.items()
+                ))
+        return items
+
+    # --------------------- DERIVED DATA --------------------- #
+    def update_sold_counts(self):
+        sold = (
+            OrderItem.objects.filter(product=OuterRef("pk")).values("product")
+            .annotate(total=Sum("quantity")).values("total")
+        )
+        Product.objects.update(sold=Coalesce(Subquery(sold), 0))
@@ -0,0 +1,74 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+
+# --------------------- SLUGS --------------------- #
+# Collisions are resolved by reading every existing "<base>" / "<base>-<n>"
+# slug with one prefix query and taking the next free number, instead of one
+# exists() query per candidate. Saves retry when a concurrent insert grabs the
+# same slug first.
+
+MAX_ATTEMPTS = 5
+BASES_PER_QUERY = 100
+
+
+def base_slug(model, text):
+    max_length = model._meta.get_field("slug").max_length
+    # Leave room for a "-<n>" suffix
+    return slugify(text)[: max_length - 8].strip("-") or model._meta.model_name
+
+
+def _taken_numbers(model, bases):
+    """{base: set of suffix numbers in use}; 0 stands for the bare base."""
+    taken = {base: set() for base in bases}
+    patterns = {base: re.compile(rf"^{re.escape(base)}(?:-(\d+))?$") for base in bases}
+    bases = list(taken)
+    for i in range(0, len(bases), BASES_PER_QUERY):
+        chunk = bases[i:i + BASES_PER_QUERY]
+        query = reduce(or_, (Q(slug__startswith=base) for base in chunk))
+        for slug in model._default_manager.filter(query).values_list("slug", flat=True).iterator():
+            for base in chunk:
+                match = patterns[base].match(slug)
+                if match:
+                    taken[base].add(int(match.group(1) or 0))
+    return taken
+
+
+def _next_slug(base, taken):
+    number = 0 if 0 not in taken else max(taken) + 1
+    taken.add(number)
+    return base if number == 0 else f"{base}-{number}"
+
+
+def allocate_slugs(model, texts):
+    """Unique slugs for many new rows at once (e.g. bulk imports)."""
+    bases = [base_slug(model, text) for text in texts]
+    taken = _taken_numbers(model, set(bases))
+    return [_next_slug(base, taken[base]) for base in bases]
+
+
+def unique_slug(model, text):
+    return allocate_slugs(model, [text])[0]
+
+
+def save_with_unique_slug(instance, save, *args, **kwargs):
+    """Call save(), filling in instance.slug from instance.name if it is blank."""
+    if instance.slug:
+        return save(*args, **kwargs)
+    model = type(instance)
+    for attempt in range(MAX_ATTEMPTS):
+        instance.slug = unique_slug(model, instance.name)
+        try:
+            with transaction.atomic():
+                return save(*args, **kwargs)
+        except IntegrityError:
+            # Only retry if someone else took our slug in the meantime
+            lost_race = model._default_manager.filter(slug=instance.slug).exists()
+            instance.slug = ""
+            if not lost_race or attempt == MAX_ATTEMPTS - 1:
+                raise
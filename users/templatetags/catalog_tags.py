@@ -0,0 +1,11 @@
+from django import template
+
+from users.catalog import build_catalog
+
+register = template.Library()
+
+
+@register.simple_tag
+def get_catalog(per_category_limit=None, best_sellers_limit=10):
+    """Usage: {% load catalog_tags %}{% get_catalog 8 as catalog %}"""
+    return build_catalog(per_category_limit=per_category_limit, best_sellers_limit=best_sellers_limit)
@@ -0,0 +1,36 @@
+from django import template
+
+from users import fragments
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        vary_on = [value.resolve(context) for value in self.vary_on]
+
+        def render():
+            with context.push(csrf_token=fragments.CSRF_PLACEHOLDER):
+                return self.nodelist.render(context)
+
+        html = fragments.cached(self.name.resolve(context), vary_on, render)
+        return fragments.fill_csrf(html, context.get("csrf_token"))
+
+
+@register.tag
+def cachedfragment(parser, token):
+    """Cache the enclosed HTML, keyed on the current generation of the given objects.
+
+    Usage: {% load fragments %}{% cachedfragment "product-card" product %}...{% endcachedfragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and at least one object or value.")
+    nodelist = parser.parse(("endcachedfragment",))
+    parser.delete_first_token()
+    return CachedFragmentNode(nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(b) for b in bits[2:]])
@@ -0,0 +1,29 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from users.images import FORMATS, get_derivative, srcset
+
+register = template.Library()
+
+DEFAULT_SIZES = "(max-width: 768px) 100vw, 33vw"
+
+
+@register.simple_tag
+def responsive_image(image, alt="", sizes=DEFAULT_SIZES, css_class=""):
+    """<picture> with AVIF/WebP srcsets when derivatives exist, else a plain <img>.
+
+    Usage: {% load images %}{% responsive_image product.image alt=product.name %}
+    """
+    if not image:
+        return ""
+    img = format_html(
+        '<img src="{}" alt="{}" class="{}" loading="lazy" decoding="async">', image.url, alt, css_class
+    )
+    derivative = get_derivative(image.name)
+    if derivative is None:
+        return img
+    sources = format_html_join(
+        "", '<source type="image/{}" srcset="{}" sizes="{}">',
+        ((ext, srcset(derivative, ext), sizes) for ext in FORMATS if derivative.variants.get(ext)),
+    )
+    return format_html("<picture>{}{}</picture>", sources, img)
@@ -1,3 +1,1525 @@
-from django.test import TestCase
+import asyncio
+import csv
+import importlib
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.utils import load_backend
+from django.db.models import Sum
+from django.http import Http404
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+from PIL import Image as PILImage
+
+from ecommerce import urls as ecommerce_urls
+
+from . import urls as users_urls
+from . import aio, autocomplete, conditional, counters, exports, fragments, images, metrics, querylog, seeding, slugs
+from .analytics import rebuild_rollups, seller_stats
+from .cart import cart_summary, cart_totals
+from .catalog import build_catalog
+from .db import replicas
+from .db.pool import ConnectionPool, PoolExhausted, borrowing
+from .imports import import_products
+from .models import Cart, CartItem, Category, Order, OrderItem, Product, ProductNeighbor, ProductPair
+from .orders import OutOfStock, place_order
+from .pagination import InvalidCursor, keyset_page
+from .recommendations import frequently_bought_with, rebuild_recommendations
+from .search import search_products
+from .slugs import allocate_slugs
+
+User = get_user_model()
+
+
+def make_product(category, name="Product", price="10.00", **kwargs):
+    return Product.objects.create(category=category, name=name, price=Decimal(price), **kwargs)
+
+
+# --------------------- CATALOG --------------------- #
+class CatalogTests(TestCase):
+    def seed(self, n_categories, per_category=3):
+        for c in range(n_categories):
+            category = Category.objects.create(name=f"Category {c}")
+            for p in range(per_category):
+                make_product(category, name=f"Item {c}-{p}", sold=c * 10 + p, is_featured=(p == 0))
+
+    def test_build_catalog_groups_products(self):
+        self.seed(3)
+        catalog = build_catalog()
+        self.assertEqual(len(catalog["category_products"]), 3)
+        for category, products in catalog["category_products"].items():
+            self.assertEqual(len(products), 3)
+            self.assertTrue(all(p.category_id == category.id for p in products))
+        self.assertEqual(len(catalog["featured_products"]), 3)
+        self.assertEqual([p.sold for p in catalog["best_sellers"]][:3], [22, 21, 20])
+
+    def test_per_category_limit(self):
+        self.seed(2, per_category=5)
+        catalog = build_catalog(per_category_limit=2, best_sellers_limit=1)
+        for products in catalog["category_products"].values():
+            self.assertEqual(len(products), 2)
+        self.assertEqual(len(catalog["best_sellers"]), 1)
+
+    def test_limited_to_given_categories(self):
+        self.seed(3)
+        first, second = Category.objects.order_by("id")[:2]
+        with self.assertNumQueries(1):
+            catalog = build_catalog(categories=[first, second])
+        self.assertEqual(list(catalog["category_products"]), [first, second])
+        self.assertEqual([p.name for p in catalog["category_products"][first]], ["Item 0-2", "Item 0-1", "Item 0-0"])
+
+    def test_query_count_is_independent_of_category_count(self):
+        self.seed(2)
+        with self.assertNumQueries(2):
+            build_catalog()
+        self.seed(8)
+        with self.assertNumQueries(2):
+            build_catalog(per_category_limit=2)
+
+    def test_shop_view_query_count_is_fixed(self):
+        user = User.objects.create_user("shopper", password="pass12345")
+        self.client.force_login(user)
+
+        self.seed(2)
+        cache.clear()
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.client.get(reverse("users:shop")).status_code, 200)
+        self.seed(10)
+        cache.clear()
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.client.get(reverse("users:shop")).status_code, 200)
+        self.assertEqual(len(small), len(large))
+
+
+# --------------------- ORDER TOTALS --------------------- #
+class OrderTotalsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", password="pass12345")
+        self.category = Category.objects.create(name="Shoes")
+        self.product = make_product(self.category, price="120.00")
+
+    def make_order(self):
+        return Order.objects.create(user=self.user, seller=self.user)
+
+    def test_totals_follow_order_items(self):
+        order = self.make_order()
+        item = OrderItem.objects.create(order=order, product=self.product, quantity=2, price=Decimal("120.00"))
+        order.refresh_from_db()
+        self.assertEqual(order.subtotal, Decimal("240.00"))
+        self.assertEqual(order.shipping_fee, Decimal("50.00"))
+        self.assertEqual(order.total_price, Decimal("290.00"))
+
+        item.quantity = 5
+        item.save()
+        order.refresh_from_db()
+        self.assertEqual(order.subtotal, Decimal("600.00"))
+        self.assertEqual(order.shipping_fee, Decimal("0.00"))
+        self.assertEqual(order.total_price, Decimal("600.00"))
+
+        item.delete()
+        order.refresh_from_db()
+        self.assertEqual(order.subtotal, Decimal("0.00"))
+
+    def test_backfill_command(self):
+        order = self.make_order()
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, price=Decimal("120.00"))
+        Order.objects.filter(pk=order.pk).update(subtotal=0, shipping_fee=0, total_price=0)
+
+        call_command("backfill_order_totals", batch_size=1, stdout=StringIO())
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, Decimal("170.00"))
+
+    def test_my_orders_is_a_single_order_query(self):
+        self.client.force_login(self.user)
+        for _ in range(2):
+            OrderItem.objects.create(order=self.make_order(), product=self.product, quantity=1, price=Decimal("120.00"))
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse("users:my_orders"))
+        for _ in range(6):
+            OrderItem.objects.create(order=self.make_order(), product=self.product, quantity=1, price=Decimal("120.00"))
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse("users:my_orders"))
+        self.assertContains(response, "$170.00")
+        self.assertEqual(len(few), len(many))
+
+
+# --------------------- SEARCH --------------------- #
+class SearchTests(TestCase):
+    def setUp(self):
+        self.sarees = Category.objects.create(name="Sarees")
+        self.shoes = Category.objects.create(name="Shoes")
+
+    def test_index_follows_product_changes(self):
+        product = make_product(self.shoes, name="Running Sneaker")
+        self.assertEqual([p.pk for p in search_products("sneakers").object_list], [product.pk])
+
+        product.name = "Trail Boot"
+        product.save()
+        self.assertEqual(list(search_products("sneaker").object_list), [])
+        self.assertEqual(len(search_products("boot").object_list), 1)
+
+        product.delete()
+        self.assertEqual(list(search_products("boot").object_list), [])
+
+    def test_matches_description_and_category(self):
+        product = make_product(self.sarees, name="Banarasi", description="Handwoven silk with zari border")
+        self.assertEqual(search_products("silk").object_list, [product])
+        self.assertEqual(search_products("saree").object_list, [product])
+
+        self.sarees.name = "Ethnic Wear"
+        self.sarees.save()
+        self.assertEqual(search_products("ethnic").object_list, [product])
+
+    def test_ranking_prefers_name_matches_and_popularity(self):
+        in_description = make_product(self.shoes, name="Loafer", description="leather loafer, not a sandal")
+        in_name = make_product(self.shoes, name="Leather Sandal")
+        popular = make_product(self.shoes, name="Leather Sandal", sold=500)
+        ranked = search_products("sandal").object_list
+        self.assertEqual(ranked, [popular, in_name, in_description])
+
+    def test_pagination(self):
+        for i in range(5):
+            make_product(self.shoes, name=f"Canvas Shoe {i}")
+        page = search_products("canvas", page=2, per_page=2)
+        self.assertEqual(page.number, 2)
+        self.assertEqual(page.paginator.count, 5)
+        self.assertEqual(len(page.object_list), 2)
+
+    def test_search_view(self):
+        make_product(self.shoes, name="Canvas Shoe")
+        response = self.client.get(reverse("users:search"), {"q": "canvas"})
+        self.assertContains(response, "Canvas Shoe")
+
+    def test_product_list_search_pages(self):
+        for i in range(25):
+            make_product(self.shoes, name=f"Canvas Shoe {i}")
+        url = reverse("users:product_list")
+        response = self.client.get(url, {"query": "canvas"})
+        self.assertEqual(len(response.context["products"]), 20)
+        self.assertContains(response, "?query=canvas&page=2")
+        response = self.client.get(url, {"query": "canvas", "page": 2})
+        self.assertEqual(response.context["page_obj"].number, 2)
+        self.assertEqual(len(response.context["products"]), 5)
+
+
+# --------------------- AUTOCOMPLETE --------------------- #
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        self.shoes = Category.objects.create(name="Shoes")
+        self.slow = make_product(self.shoes, name="Running Shoe", sold=3)
+        self.fast = make_product(self.shoes, name="Runner Sandal", sold=40)
+        make_product(self.shoes, name="Leather Belt", sold=100)
+        autocomplete.index.build()
+
+    def labels(self, query, limit=8):
+        return [r["label"] for r in autocomplete.index.lookup(query, limit)]
+
+    def test_prefix_lookup_ranked_by_popularity(self):
+        self.assertEqual(self.labels("run"), ["Runner Sandal", "Running Shoe"])
+        self.assertEqual(self.labels("run", limit=1), ["Runner Sandal"])
+        self.assertEqual(self.labels("running sh"), ["Running Shoe"])
+        self.assertEqual(self.labels("sho"), ["Shoes", "Running Shoe"])
+        self.assertEqual(self.labels("r"), [])
+
+    def test_prefix_may_be_a_stop_word(self):
+        make_product(self.shoes, name="Formal Oxford", sold=5)
+        autocomplete.index.build()
+        self.assertEqual(self.labels("be"), ["Leather Belt"])
+        self.assertEqual(self.labels("for"), ["Formal Oxford"])
+        self.assertEqual(self.labels("the formal ox"), ["Formal Oxford"])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.slow.name = "Trail Boot"
+        self.slow.save()
+        self.assertEqual(self.labels("run"), ["Runner Sandal"])
+        self.assertEqual(self.labels("trail"), ["Trail Boot"])
+
+        self.fast.delete()
+        self.assertEqual(self.labels("run"), [])
+
+        Category.objects.create(name="Sarees")
+        self.assertEqual(self.labels("sare"), ["Sarees"])
+
+    def test_endpoint(self):
+        response = self.client.get(reverse("users:autocomplete"), {"q": "runn"})
+        results = response.json()["results"]
+        self.assertEqual([r["label"] for r in results], ["Runner Sandal", "Running Shoe"])
+        self.assertEqual(results[0]["url"], reverse("users:product_detail", args=[self.fast.slug]))
+
+    def test_stale_index_is_rebuilt_once_in_the_background(self):
+        index = autocomplete.index
+        index.built_at -= autocomplete.MAX_AGE + 1
+        started, finish = threading.Event(), threading.Event()
+
+        def slow_build():
+            started.set()
+            finish.wait(5)
+
+        with mock.patch.object(index, "build", side_effect=slow_build) as build:
+            for _ in range(3):
+                # Served from the old index while the rebuild runs
+                self.assertEqual([r["label"] for r in autocomplete.suggest("run")], ["Runner Sandal", "Running Shoe"])
+            self.assertTrue(started.wait(5))
+            finish.set()
+            with index._build_lock:  # released once the rebuild is done
+                pass
+        self.assertEqual(build.call_count, 1)
+
+    def test_changes_during_a_build_are_kept(self):
+        index = autocomplete.PrefixIndex()
+        load = index._load
+
+        def load_then_rename():
+            loaded = load()
+            self.slow.name = "Trail Boot"
+            self.slow.save()
+            index.update("product", self.slow.pk, self.slow.name, self.slow.slug, self.slow.sold)
+            return loaded
+
+        with mock.patch.object(index, "_load", side_effect=load_then_rename):
+            index.build()
+        self.assertEqual([r["label"] for r in index.lookup("trail")], ["Trail Boot"])
+
+    def test_lookup_cache_is_bounded(self):
+        with mock.patch.object(autocomplete, "CACHE_SIZE", 3):
+            for prefix in ["ru", "run", "runn", "sh", "sho"]:
+                self.labels(prefix)
+            self.assertEqual(list(autocomplete.index._cache), [("runn", 8), ("sh", 8), ("sho", 8)])
+
+    def test_renamed_category_keeps_indexed_popularity(self):
+        self.assertEqual(autocomplete.index.popularity("category", self.shoes.pk), 143)
+        self.shoes.name = "Footwear"
+        self.shoes.save()
+        self.assertEqual(autocomplete.index.popularity("category", self.shoes.pk), 143)
+        self.assertEqual(self.labels("foot"), ["Footwear"])
+
+
+# --------------------- CHECKOUT --------------------- #
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller")
+        self.buyer = User.objects.create_user("buyer")
+        category = Category.objects.create(name="Shoes")
+        self.shoe = make_product(category, name="Shoe", price="100.00", stock=5, seller=self.seller)
+        self.sock = make_product(category, name="Sock", price="5.00", stock=1, seller=self.seller)
+
+    def test_place_order_reserves_stock(self):
+        [order] = place_order(self.buyer, [(self.shoe.id, 2, "9"), (self.sock.id, 1, None)])
+        self.shoe.refresh_from_db()
+        self.assertEqual((self.shoe.stock, self.shoe.sold), (3, 2))
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(order.subtotal, Decimal("205.00"))
+        self.assertEqual(order.total_price, Decimal("255.00"))
+
+    def test_shortage_rolls_back_everything(self):
+        with self.assertRaises(OutOfStock) as ctx:
+            place_order(self.buyer, [(self.shoe.id, 1, None), (self.sock.id, 2, None)])
+        self.assertEqual(
+            [(s["product"], s["requested"], s["available"]) for s in ctx.exception.shortages],
+            [(self.sock, 2, 1)],
+        )
+        self.shoe.refresh_from_db()
+        self.assertEqual(self.shoe.stock, 5)
+        self.assertFalse(Order.objects.exists())
+
+    def test_cart_is_split_per_seller(self):
+        other_seller = User.objects.create_user("other")
+        hat = make_product(self.shoe.category, name="Hat", price="20.00", stock=5, seller=other_seller)
+        shipping = {"address": "1 Main St", "city": "Pune", "state": "MH", "zipcode": "411001", "phone": "1"}
+
+        orders = place_order(self.buyer, [(self.shoe.id, 1, None), (hat.id, 2, None)], shipping, "card")
+        by_seller = {order.seller_id: order for order in orders}
+        self.assertEqual(set(by_seller), {self.seller.id, other_seller.id})
+        self.assertEqual(by_seller[self.seller.id].subtotal, Decimal("100.00"))
+        self.assertEqual(by_seller[other_seller.id].subtotal, Decimal("40.00"))
+        self.assertEqual(len({order.checkout_ref for order in orders}), 1)
+        # One shipping fee for the whole cart, split across the orders
+        self.assertEqual(sum(order.shipping_fee for order in orders), Decimal("50.00"))
+        self.assertEqual(sum(order.total_price for order in orders), cart_totals(Decimal("140.00"))[2])
+        for order in Order.objects.all():
+            self.assertEqual(order.items.get().product.seller_id, order.seller_id)
+            self.assertEqual(order.shippingaddress.city, "Pune")
+            self.assertEqual(order.payment.payment_method, "card")
+
+    def test_backfill_stock_command(self):
+        legacy = make_product(self.shoe.category, name="Legacy", seller=self.seller)
+        call_command("backfill_stock", "7", stdout=StringIO())
+        legacy.refresh_from_db()
+        self.shoe.refresh_from_db()
+        self.assertEqual((legacy.stock, self.shoe.stock), (7, 5))
+        place_order(self.buyer, [(legacy.id, 1, None)])
+
+    def test_split_orders_are_charged_the_displayed_total(self):
+        other_seller = User.objects.create_user("other")
+        hat = make_product(self.shoe.category, name="Hat", price="100.00", stock=5, seller=other_seller)
+        cart = Cart.objects.create(user=self.buyer)
+        CartItem.objects.create(cart=cart, product=self.shoe, quantity=1)
+        CartItem.objects.create(cart=cart, product=hat, quantity=1)
+        self.client.force_login(self.buyer)
+        displayed = self.client.get(reverse("users:checkout")).context["total"]
+        self.assertEqual(displayed, cart_summary(self.buyer)["total"])
+        self.assertEqual(displayed, Decimal("250.00"))
+
+        self.client.post(reverse("users:checkout"), {
+            "full_name": "Buyer", "email": "buyer@example.com", "address": "1 Main St",
+            "city": "Pune", "state": "MH", "zip_code": "411001", "phone": "12345",
+            "payment_method": "cod",
+        })
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(Order.objects.aggregate(total=Sum("total_price"))["total"], displayed)
+
+        # Editing an item later keeps the order's share of the shipping fee
+        order = Order.objects.get(seller=other_seller)
+        item = order.items.get()
+        item.quantity = 2
+        item.save()
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, Decimal("200.00") + order.shipping_fee)
+
+    def test_fan_out_without_bulk_insert_ids(self):
+        other_seller = User.objects.create_user("other")
+        hat = make_product(self.shoe.category, name="Hat", price="20.00", stock=5, seller=other_seller)
+        with mock.patch.object(type(connection.features), "can_return_rows_from_bulk_insert", False):
+            orders = place_order(self.buyer, [(self.shoe.id, 1, None), (hat.id, 1, None)])
+        for order in orders:
+            self.assertEqual(order.items.get().product.seller_id, order.seller_id)
+
+    def test_checkout_view_places_order_and_empties_cart(self):
+        cart = Cart.objects.create(user=self.buyer)
+        CartItem.objects.create(cart=cart, product=self.shoe, quantity=2)
+        self.client.force_login(self.buyer)
+        response = self.client.post(reverse("users:checkout"), {
+            "full_name": "Buyer", "email": "buyer@example.com", "address": "1 Main St",
+            "city": "Pune", "state": "MH", "zip_code": "411001", "phone": "12345",
+            "payment_method": "cod",
+        })
+        self.assertRedirects(response, reverse("users:order_success"), fetch_redirect_response=False)
+        order = Order.objects.get()
+        self.assertEqual(order.shippingaddress.city, "Pune")
+        self.assertEqual(order.payment.payment_method, "cod")
+        self.assertFalse(CartItem.objects.filter(cart=cart).exists())
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def test_parallel_checkouts_do_not_oversell(self):
+        seller = User.objects.create_user("seller")
+        buyers = [User.objects.create_user(f"buyer{i}") for i in range(12)]
+        product = make_product(Category.objects.create(name="Rare"), name="Rare", stock=3, seller=seller)
+        barrier = threading.Barrier(len(buyers))
+        outcomes = []
+
+        def buy(user):
+            barrier.wait()
+            deadline = time.monotonic() + 10
+            try:
+                while True:
+                    try:
+                        place_order(user, [(product.id, 1, None)])
+                        outcomes.append("ok")
+                        return
+                    except OutOfStock:
+                        outcomes.append("short")
+                        return
+                    except OperationalError:
+                        if time.monotonic() > deadline:
+                            outcomes.append("locked")  # fails the counts below instead of hanging
+                            raise
+                        time.sleep(0.01)  # SQLite allows one writer at a time
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=buy, args=(user,)) for user in buyers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(15)
+
+        product.refresh_from_db()
+        self.assertEqual(outcomes.count("ok"), 3)
+        self.assertEqual(outcomes.count("short"), 9)
+        self.assertEqual((product.stock, product.sold), (0, 3))
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), 3)
+
+
+# --------------------- SELLER ANALYTICS --------------------- #
+class SellerAnalyticsTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller")
+        self.buyer = User.objects.create_user("buyer")
+        category = Category.objects.create(name="Shoes")
+        self.shoe = make_product(category, name="Shoe", price="100.00", stock=50, seller=self.seller)
+        self.sock = make_product(category, name="Sock", price="5.00", stock=50, seller=self.seller)
+
+    def test_rollups_follow_checkouts(self):
+        place_order(self.buyer, [(self.shoe.id, 2, None), (self.sock.id, 3, None)])
+        place_order(self.buyer, [(self.sock.id, 1, None)])
+
+        stats = seller_stats(self.seller)
+        self.assertEqual(stats["total_orders"], 2)
+        self.assertEqual(stats["total_units"], 6)
+        self.assertEqual(stats["total_revenue"], Decimal("220.00"))
+        self.assertEqual([row.product for row in stats["top_products"]], [self.shoe, self.sock])
+        self.assertEqual(stats["daily_sales"][-1]["orders"], 2)
+        self.assertEqual(stats["weekly_sales"][-1]["revenue"], Decimal("220.00"))
+        self.assertEqual(len(stats["daily_sales"]), 30)
+
+    def test_rebuild_matches_incremental(self):
+        place_order(self.buyer, [(self.shoe.id, 2, None), (self.sock.id, 3, None)])
+        place_order(self.buyer, [(self.sock.id, 1, None)])
+        before = seller_stats(self.seller)
+        rebuild_rollups()
+        after = seller_stats(self.seller)
+        for key in ("total_orders", "total_units", "total_revenue", "daily_sales"):
+            self.assertEqual(before[key], after[key])
+
+    def test_dashboard_query_count_is_fixed(self):
+        self.client.force_login(self.seller)
+        place_order(self.buyer, [(self.shoe.id, 1, None)])
+        with CaptureQueriesContext(connection) as few:
+            self.assertContains(self.client.get(reverse("users:seller_dashboard")), "Top Products")
+        for _ in range(10):
+            place_order(self.buyer, [(self.shoe.id, 1, None), (self.sock.id, 1, None)])
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(reverse("users:seller_dashboard"))
+        self.assertEqual(len(few), len(many))
+
+
+# --------------------- SLUGS --------------------- #
+class SlugTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Tops")
+
+    def test_collisions_are_numbered(self):
+        slugs = [make_product(self.category, name="T-Shirt").slug for _ in range(3)]
+        self.assertEqual(slugs, ["t-shirt", "t-shirt-1", "t-shirt-2"])
+        # Similar-looking slugs don't count as collisions
+        make_product(self.category, name="T-Shirt Dress")
+        self.assertEqual(make_product(self.category, name="T-Shirt").slug, "t-shirt-3")
+
+    def test_allocate_slugs_uses_one_query(self):
+        make_product(self.category, name="T-Shirt")
+        with self.assertNumQueries(1):
+            slugs = allocate_slugs(Product, ["T-Shirt"] * 50 + ["Jeans", "Jeans"])
+        self.assertEqual(len(set(slugs)), 52)
+        self.assertEqual(slugs[:2], ["t-shirt-1", "t-shirt-2"])
+        self.assertEqual(slugs[-2:], ["jeans", "jeans-1"])
+
+    def test_long_names_fit_the_column(self):
+        slug = make_product(self.category, name="Very Long Name " * 20).slug
+        self.assertLessEqual(len(slug), Product._meta.get_field("slug").max_length)
+
+    def test_retries_when_a_concurrent_insert_wins(self):
+        make_product(self.category, name="Hoodie")
+        real = slugs.unique_slug
+        stale = iter(["hoodie"])  # what a racing request would have computed
+        with mock.patch.object(slugs, "unique_slug", side_effect=lambda m, t: next(stale, None) or real(m, t)):
+            self.assertEqual(make_product(self.category, name="Hoodie").slug, "hoodie-1")
+
+
+# --------------------- IMAGES --------------------- #
+def png_upload(name="photo.png", size=(1000, 500)):
+    buffer = BytesIO()
+    PILImage.new("RGB", size, (200, 30, 30)).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media, IMAGE_DERIVATIVES_ASYNC=False)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+        self.category = Category.objects.create(name="Prints")
+
+    def test_upload_generates_hashed_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = make_product(self.category, name="Poster", image=png_upload())
+
+        derivative = images.get_derivative(product.image.name)
+        self.assertEqual(derivative.variants["webp"], [200, 400, 800])
+        for width in derivative.variants["webp"]:
+            name = images.derivative_name(derivative.digest, width, "webp")
+            self.assertTrue(default_storage.exists(name))
+            with default_storage.open(name) as fh:
+                self.assertEqual(PILImage.open(fh).width, width)
+
+        html = Template("{% load images %}{% responsive_image p.image alt=p.name %}").render(Context({"p": product}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn("-400.webp 400w", html)
+        self.assertIn(product.image.url, html)
+
+    def test_small_images_are_not_upscaled_and_duplicates_share_files(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = make_product(self.category, name="Icon", image=png_upload("a.png", (300, 300)))
+            second = make_product(self.category, name="Icon", image=png_upload("b.png", (300, 300)))
+        a = images.get_derivative(first.image.name)
+        b = images.get_derivative(second.image.name)
+        self.assertEqual(a.variants["webp"], [200])
+        self.assertEqual(a.digest, b.digest)
+
+    def test_plain_img_until_derivatives_exist(self):
+        product = make_product(self.category, name="Poster", image=png_upload())
+        html = Template("{% load images %}{% responsive_image p.image %}").render(Context({"p": product}))
+        self.assertTrue(html.startswith("<img "))
+
+
+# --------------------- PAGINATION --------------------- #
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.shoes = Category.objects.create(name="Shoes")
+        self.hats = Category.objects.create(name="Hats")
+        self.products = [
+            make_product(self.shoes if i % 2 else self.hats, name=f"Item {i}", sold=i % 3)
+            for i in range(11)
+        ]
+
+    def walk(self, queryset, ordering, limit=3):
+        seen, cursor = [], None
+        while True:
+            page = keyset_page(queryset, ordering, cursor, limit)
+            seen.extend(p.pk for p in page["items"])
+            if not page["has_next"]:
+                return seen
+            cursor = page["next_cursor"]
+
+    def test_pages_cover_everything_once_in_order(self):
+        expected_new = list(Product.objects.order_by("-created_at", "-id").values_list("pk", flat=True))
+        self.assertEqual(self.walk(Product.objects.all(), "new"), expected_new)
+        # Ties on sold are broken by id
+        expected_popular = list(Product.objects.order_by("-sold", "-id").values_list("pk", flat=True))
+        self.assertEqual(self.walk(Product.objects.all(), "popular"), expected_popular)
+
+    def test_deep_pages_use_the_same_query_shape(self):
+        first = keyset_page(Product.objects.all(), "popular", limit=2)
+        with self.assertNumQueries(1):
+            keyset_page(Product.objects.all(), "popular", first["next_cursor"], limit=2)
+
+    def test_bad_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            keyset_page(Product.objects.all(), "new", "not-a-cursor")
+        response = self.client.get(reverse("users:product_feed"), {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_json_feed(self):
+        response = self.client.get(reverse("users:product_feed"), {"category": self.shoes.slug, "limit": 4})
+        data = response.json()
+        self.assertEqual(len(data["results"]), 4)
+        response = self.client.get(reverse("users:product_feed"), {
+            "category": self.shoes.slug, "limit": 4, "cursor": data["next_cursor"],
+        })
+        data = response.json()
+        self.assertEqual(len(data["results"]), 1)
+        self.assertIsNone(data["next_cursor"])
+
+    def test_product_list_page(self):
+        response = self.client.get(reverse("users:product_list"))
+        self.assertEqual(len(response.context["products"]), 11)
+        self.assertNotContains(response, "Next &raquo;")
+
+
+# --------------------- CART --------------------- #
+class CartTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer")
+        self.cart = Cart.objects.create(user=self.user)
+        self.category = Category.objects.create(name="Shoes")
+        self.client.force_login(self.user)
+
+    def add(self, price, quantity):
+        product = make_product(self.category, name=f"Item {price}", price=price)
+        return CartItem.objects.create(cart=self.cart, product=product, quantity=quantity)
+
+    def test_summary_is_one_query(self):
+        self.add("100.00", 2)
+        self.add("12.50", 4)
+        with self.assertNumQueries(1):
+            summary = cart_summary(self.user)
+        self.assertEqual(summary["subtotal"], Decimal("250.00"))
+        self.assertEqual(summary["shipping"], Decimal("50"))
+        self.assertEqual(summary["total"], Decimal("300.00"))
+        self.assertEqual((summary["item_count"], summary["line_count"]), (6, 2))
+        self.assertEqual(cart_summary(User.objects.create_user("empty"))["total"], 0)
+
+    def test_view_cart_queries_do_not_grow_with_items(self):
+        self.add("10.00", 1)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse("users:view_cart"))
+        for i in range(5):
+            self.add(f"{20 + i}.00", 2)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse("users:view_cart"))
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(response.context["cart_total"], Decimal("230.00"))
+        self.assertEqual(response.context["grand_total"], Decimal("280.00"))
+
+    def test_ajax_update_and_remove(self):
+        item = self.add("100.00", 1)
+        other = self.add("5.00", 1)
+        data = self.client.post(reverse("users:update_cart_ajax"), {"item_id": item.id, "quantity": 5}).json()
+        self.assertEqual(data["item_total"], "500.00")
+        self.assertEqual((data["cart_total"], data["shipping"], data["total"]), ("505.00", "0.00", "505.00"))
+
+        data = self.client.post(reverse("users:remove_cart_ajax"), {"item_id": item.id}).json()
+        self.assertEqual((data["cart_total"], data["total"], data["item_count"]), ("5.00", "55.00", 1))
+
+        stranger = User.objects.create_user("stranger")
+        self.client.force_login(stranger)
+        response = self.client.post(reverse("users:remove_cart_ajax"), {"item_id": other.id})
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(CartItem.objects.filter(id=other.id).exists())
+
+    def test_order_summary(self):
+        self.add("100.00", 2)
+        response = self.client.get(reverse("users:order_summary"))
+        order = response.context["order"]
+        self.assertEqual(order["items"][0].total_price, Decimal("200.00"))
+        self.assertEqual(order["total_price"], Decimal("250.00"))
+
+
+class AnonymousCartTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Shoes")
+        self.shoe = make_product(category, name="Shoe", price="100.00")
+        self.sock = make_product(category, name="Sock", price="5.00")
+
+    def test_anonymous_cart_writes_no_cart_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("users:add_to_cart", args=[self.shoe.id]))
+            self.client.get(reverse("users:add_to_cart", args=[self.shoe.id]))
+            self.client.get(reverse("users:add_to_cart", args=[self.sock.id]))
+        self.assertFalse([q for q in queries if "users_cart" in q["sql"] and not q["sql"].startswith("SELECT")])
+        self.assertFalse(CartItem.objects.exists())
+
+        response = self.client.get(reverse("users:view_cart"))
+        self.assertEqual(response.context["cart_total"], Decimal("205.00"))
+        self.assertEqual(response.context["cart_count"], 3)
+
+        data = self.client.post(reverse("users:update_cart_ajax"), {"item_id": self.sock.id, "quantity": 3}).json()
+        self.assertEqual((data["item_total"], data["cart_total"]), ("15.00", "215.00"))
+        data = self.client.post(reverse("users:remove_cart_ajax"), {"item_id": self.shoe.id}).json()
+        self.assertEqual((data["cart_total"], data["item_count"]), ("15.00", 3))
+
+    def test_session_cart_is_merged_on_login(self):
+        user = User.objects.create_user("buyer", password="pw-12345")
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=self.shoe, quantity=1)
+
+        self.client.get(reverse("users:add_to_cart", args=[self.shoe.id]))
+        self.client.get(reverse("users:add_to_cart", args=[self.sock.id]))
+        self.client.post(reverse("users:login"), {"username": "buyer", "password": "pw-12345"})
+
+        self.assertEqual(
+            dict(CartItem.objects.filter(cart=cart).values_list("product_id", "quantity")),
+            {self.shoe.id: 2, self.sock.id: 1},
+        )
+        self.assertNotIn("cart", self.client.session)
+
+    def test_session_cart_is_merged_on_register(self):
+        self.client.get(reverse("users:add_to_cart", args=[self.sock.id]))
+        self.client.post(reverse("users:register"), {
+            "username": "newbie", "email": "new@example.com", "password": "pw-12345", "confirm_password": "pw-12345",
+        })
+        user = User.objects.get(username="newbie")
+        merged = CartItem.objects.filter(cart__user=user).values_list("product_id", flat=True)
+        self.assertEqual(list(merged), [self.sock.id])
+
+
+class NavbarCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("buyer")
+        category = Category.objects.create(name="Shoes")
+        self.shoe = make_product(category, name="Shoe")
+        self.sock = make_product(category, name="Sock")
+        self.client.force_login(self.user)
+
+    def counts(self):
+        response = self.client.get(reverse("users:about"))
+        return response.context["cart_count"], response.context["wishlist_count"]
+
+    def test_counts_are_cached_and_invalidated(self):
+        self.client.get(reverse("users:add_to_cart", args=[self.shoe.id]))
+        self.client.get(reverse("users:add_to_wishlist", args=[self.sock.id]))
+        self.assertEqual(self.counts(), (1, 1))
+
+        # A cached page render needs no count queries
+        with CaptureQueriesContext(connection) as queries:
+            self.counts()
+        self.assertFalse([q for q in queries if "users_cartitem" in q["sql"] or "users_wishlist" in q["sql"]])
+
+        self.client.get(reverse("users:add_to_cart", args=[self.shoe.id]))
+        self.assertEqual(self.counts(), (2, 1))
+        item = CartItem.objects.get()
+        self.client.post(reverse("users:update_cart_ajax"), {"item_id": item.id, "quantity": 5})
+        self.assertEqual(self.counts(), (5, 1))
+        self.client.get(reverse("users:remove_from_wishlist", args=[self.sock.id]))
+        self.assertEqual(self.counts(), (5, 0))
+        self.client.post(reverse("users:remove_cart_ajax"), {"item_id": item.id})
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_deleting_a_wishlisted_product_drops_the_count(self):
+        self.client.get(reverse("users:add_to_wishlist", args=[self.sock.id]))
+        self.client.get(reverse("users:add_to_wishlist", args=[self.shoe.id]))
+        self.assertEqual(self.counts(), (0, 2))
+        self.sock.delete()
+        self.assertEqual(self.counts(), (0, 1))
+        Product.objects.filter(pk=self.shoe.pk).delete()
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_anonymous_counts_come_from_session(self):
+        self.client.logout()
+        self.client.get(reverse("users:add_to_cart", args=[self.shoe.id]))
+        self.client.get(reverse("users:add_to_cart", args=[self.sock.id]))
+        self.assertEqual(self.counts(), (2, 0))
+
+
+# --------------------- METRICS --------------------- #
+class ViewMetricsTests(TestCase):
+    def setUp(self):
+        metrics.histogram.reset()
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir, ignore_errors=True)
+        patcher = mock.patch.object(metrics, "METRICS_DIR", self.metrics_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        category = Category.objects.create(name="Shoes")
+        for i in range(3):
+            make_product(category, name=f"Shoe {i}")
+
+    def test_server_timing_and_histogram(self):
+        response = self.client.get(reverse("users:product_list"))
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn("tpl;dur=", timing)
+        self.assertRegex(timing, r'conn;dur=[\d.]+;desc="\d+ connects"')
+        self.client.get(reverse("users:product_list"))
+
+        stats = metrics.histogram.snapshot()["users:product_list"]
+        self.assertEqual(stats["requests"], 2)
+        self.assertGreater(stats["queries"], 0)
+        self.assertGreater(stats["template_ms"], 0)
+        self.assertEqual(sum(stats["buckets"]), 2)
+
+    def test_command_merges_flushed_histograms(self):
+        self.client.get(reverse("users:product_list"))
+        with mock.patch("os.getpid", return_value=1):
+            metrics.histogram.flush()  # another worker's file
+        out = StringIO()
+        call_command("view_metrics", "--json", stdout=out)
+        self.assertEqual(json.loads(out.getvalue())["users:product_list"]["requests"], 2)
+
+        call_command("view_metrics", "--reset", stdout=StringIO())
+        out = StringIO()
+        call_command("view_metrics", stdout=out)
+        self.assertIn("No requests recorded", out.getvalue())
+
+
+class QueryInspectorTests(TestCase):
+    def setUp(self):
+        for i in range(5):
+            make_product(Category.objects.create(name=f"Category {i}"), name=f"Shoe {i}")
+        self.report = tempfile.NamedTemporaryFile(suffix=".jsonl", delete=False).name
+        self.addCleanup(os.remove, self.report)
+
+    def read_report(self):
+        with open(self.report) as fh:
+            return [json.loads(line) for line in fh]
+
+    def test_normalize(self):
+        self.assertEqual(
+            querylog.normalize("SELECT *  FROM t WHERE id IN (%s, %s, %s) AND name = 'o''k' AND n = 10 AND m = %s"),
+            "SELECT * FROM t WHERE id IN (...) AND name = ? AND n = ? AND m = ?",
+        )
+
+    def test_n_plus_one_is_traced_to_the_template_line(self):
+        inspector = querylog.QueryInspector()
+        token = metrics._current.set(metrics.RequestMetrics(inspector))
+        try:
+            Template("{% for p in products %}\n{{ p.category.name }}{% endfor %}").render(
+                Context({"products": Product.objects.all()})
+            )
+        finally:
+            metrics._current.reset(token)
+
+        with override_settings(QUERY_REPORT_FILE=self.report):
+            self.assertEqual(inspector.report("test", "/"), 1)
+        [finding] = self.read_report()
+        self.assertEqual((finding["kind"], finding["count"]), ("duplicate", 5))
+        self.assertIn('FROM "users_category" WHERE "users_category"."id" = ?', finding["sql"])
+        self.assertTrue(finding["template"].endswith(":2"))
+        self.assertTrue(any(frame.startswith("users/tests.py") for frame in finding["stack"]))
+
+    def test_middleware_reports_slow_queries_when_enabled(self):
+        self.client.get(reverse("users:product_list"))
+        self.assertEqual(os.path.getsize(self.report), 0)  # off by default
+
+        with override_settings(QUERY_INSPECTOR=True, QUERY_REPORT_FILE=self.report), \
+                mock.patch.object(querylog, "SLOW_MS", 0):
+            self.client.get(reverse("users:product_list"))
+        findings = self.read_report()
+        self.assertTrue(findings)
+        self.assertEqual({(f["kind"], f["view"]) for f in findings}, {("slow", "users:product_list")})
+
+
+# --------------------- CONNECTION MANAGEMENT --------------------- #
+class FakeConnection:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_reuses_idle_connections_up_to_its_size(self):
+        pool = ConnectionPool(2, timeout=0.05)
+        first, second = pool.acquire(FakeConnection), pool.acquire(FakeConnection)
+        with self.assertRaises(PoolExhausted):
+            pool.acquire(FakeConnection)
+        pool.release(first)
+        self.assertIs(pool.acquire(FakeConnection), first)
+
+        # A released connection failing the health check is replaced
+        pool.release(second)
+        third = pool.acquire(FakeConnection, usable=lambda conn: False)
+        self.assertTrue(second.closed)
+        self.assertIsNot(third, second)
+
+    def test_waits_for_a_release(self):
+        pool = ConnectionPool(1, timeout=5)
+        held = pool.acquire(FakeConnection)
+        threading.Timer(0.05, pool.release, [held]).start()
+        self.assertIs(pool.acquire(FakeConnection), held)
+
+    def test_idle_connections_expire(self):
+        pool = ConnectionPool(1, max_idle=0)
+        old = pool.acquire(FakeConnection)
+        pool.release(old)
+        time.sleep(0.01)
+        self.assertIsNot(pool.acquire(FakeConnection), old)
+        self.assertTrue(old.closed)
+
+    def test_pooled_backend_hands_connections_back(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_dict = {
+            **connection.settings_dict,
+            "ENGINE": "users.db.sqlite3",
+            "NAME": os.path.join(directory, "pool.sqlite3"),
+            "CONN_MAX_AGE": 0,
+            "POOL": {"SIZE": 1, "TIMEOUT": 0.05},
+        }
+        backend = load_backend("users.db.sqlite3")
+        wrapper = backend.DatabaseWrapper(settings_dict, alias="pool-test")
+        other = backend.DatabaseWrapper(settings_dict, alias="pool-test")
+        self.addCleanup(wrapper.pool.close_all)
+
+        request_metrics = metrics.RequestMetrics()
+        token = metrics._current.set(request_metrics)
+        try:
+            wrapper.ensure_connection()
+        finally:
+            metrics._current.reset(token)
+        self.assertEqual(request_metrics.connects, 1)
+
+        raw = wrapper.connection
+        with self.assertRaises(OperationalError):
+            other.ensure_connection()  # the only connection is in use
+        with borrowing(), self.assertRaises(PoolExhausted):
+            other.ensure_connection()  # aio.gather() falls back to the request's connection
+        wrapper.close()
+        other.ensure_connection()
+        self.assertIs(other.connection, raw)
+        other.close()
+
+
+# --------------------- READ REPLICAS --------------------- #
+@override_settings(DATABASE_REPLICAS=["replica_test"], RECOMMENDATIONS_ASYNC=False)
+class ReplicaRoutingTests(TransactionTestCase):
+    """A second SQLite file stands in for the replica, copied by sync_replica."""
+
+    databases = "__all__"  # resolved in setUpClass, once replica_test exists
+
+    @classmethod
+    def setUpClass(cls):
+        directory = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, directory, ignore_errors=True)
+        connections.settings["replica_test"] = {
+            **connections.settings["default"], "NAME": os.path.join(directory, "replica.sqlite3"),
+        }
+        cls.addClassCleanup(connections.settings.pop, "replica_test")
+        cls.addClassCleanup(connections.__delitem__, "replica_test")
+        cls.addClassCleanup(lambda: connections["replica_test"].close())
+        super().setUpClass()
+
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.shoe = make_product(Category.objects.create(name="Shoes"), name="Old Shoe", seller=self.seller, stock=5)
+
+    def sync_replica(self):
+        call_command("sync_replica", stdout=StringIO())
+        cache.delete(replicas.CATALOG_PIN_KEY)
+
+    def test_catalog_reads_go_to_the_replica(self):
+        self.sync_replica()
+        Product.objects.filter(pk=self.shoe.pk).update(name="New Shoe")  # not replicated yet
+        url = reverse("users:product_detail", args=[self.shoe.slug])
+        self.assertContains(self.client.get(url), "Old Shoe")
+
+        # A product edit sends catalog reads to the primary until the replica catches up
+        self.shoe.refresh_from_db()
+        self.shoe.name = "Newer Shoe"
+        self.shoe.save()
+        self.assertContains(self.client.get(url), "Newer Shoe")
+
+    def test_checkout_pins_the_buyer_to_the_primary(self):
+        buyer = User.objects.create_user("buyer")
+        CartItem.objects.create(cart=Cart.objects.create(user=buyer), product=self.shoe, quantity=1)
+        self.sync_replica()
+        self.client.force_login(buyer)
+        response = self.client.post(reverse("users:checkout"), {
+            "full_name": "Buyer", "email": "buyer@example.com", "address": "1 Main St",
+            "city": "Pune", "state": "MH", "zip_code": "411001", "phone": "12345",
+            "payment_method": "cod",
+        })
+        self.assertEqual(response.cookies[replicas.PIN_COOKIE]["max-age"], replicas.PIN_SECONDS)
+        self.assertEqual(len(self.client.get(reverse("users:my_orders")).context["orders"]), 1)
+
+        # Once the pin expires, my_orders reads the replica, which hasn't seen the order
+        del self.client.cookies[replicas.PIN_COOKIE]
+        self.assertEqual(len(self.client.get(reverse("users:my_orders")).context["orders"]), 0)
+        self.sync_replica()
+        self.assertEqual(len(self.client.get(reverse("users:my_orders")).context["orders"]), 1)
+
+    async def test_async_streamed_exports_read_the_replica(self):
+        buyer = await User.objects.acreate(username="buyer")
+        await sync_to_async(place_order)(buyer, [(self.shoe.id, 1, None)])
+        await sync_to_async(self.sync_replica)()
+        await sync_to_async(place_order)(buyer, [(self.shoe.id, 1, None)])  # not replicated yet
+
+        await self.async_client.aforce_login(self.seller)
+        response = await self.async_client.get(reverse("users:export_orders"), {"format": "jsonl"})
+        self.assertTrue(response.is_async)
+        lines = b"".join([chunk async for chunk in response.streaming_content]).splitlines()
+        self.assertEqual(len(lines), 1)
+
+
+# --------------------- SEEDING --------------------- #
+class SeedStoreTests(TestCase):
+    def test_seed_store_command(self):
+        out = StringIO()
+        call_command("seed_store", "--categories", "3", "--users", "30", "--sellers", "3", "--products", "60",
+                     "--orders", "200", "--batch-size", "25", "--password", "pw-12345", stdout=out)
+        self.assertIn("Store seeded", out.getvalue())
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Product.objects.count(), 60)
+        self.assertEqual(Order.objects.count(), 200)
+
+        # Orders are single-seller, dated in the past year, with consistent totals and sold counts
+        for order in Order.objects.prefetch_related("items__product")[:20]:
+            self.assertEqual({item.product.seller_id for item in order.items.all()}, {order.seller_id})
+            self.assertEqual(order.subtotal, sum(item.total_price for item in order.items.all()))
+        oldest = Order.objects.order_by("created_at").first().created_at
+        self.assertGreater(oldest, timezone.now() - timedelta(days=366))
+        self.assertEqual(
+            Product.objects.aggregate(n=Sum("sold"))["n"], OrderItem.objects.aggregate(n=Sum("quantity"))["n"]
+        )
+        buyer = User.objects.filter(username__startswith="user").first()
+        self.assertTrue(self.client.login(username=buyer.username, password="pw-12345"))
+
+    def test_seed_store_needs_a_seller(self):
+        with self.assertRaisesMessage(CommandError, "seller"):
+            call_command("seed_store", "--users", "30", "--sellers", "0", "--products", "60", stdout=StringIO())
+        self.assertFalse(User.objects.exists())
+
+    def test_popularity_is_skewed(self):
+        rng = random.Random(1)
+        ranks = [seeding.zipf_rank(rng, 1000) for _ in range(5000)]
+        self.assertTrue(all(0 <= rank < 1000 for rank in ranks))
+        self.assertGreater(sum(rank < 10 for rank in ranks), len(ranks) * 0.3)
+
+
+# --------------------- IMPORTS --------------------- #
+class ProductImportTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", is_staff=True)
+        self.shoes = Category.objects.create(name="Shoes")
+        self.existing = make_product(self.shoes, name="Old Runner", slug="runner", stock=1, seller=self.seller)
+
+    def run_import(self, text, fmt="csv", **kwargs):
+        return import_products(StringIO(text), fmt, **kwargs)
+
+    def test_csv_upserts_on_slug_and_reports_bad_rows(self):
+        result = self.run_import(
+            "name,slug,description,price,stock,category,is_featured\n"
+            "Runner,runner,Fast,120.00,7,shoes,true\n"
+            "Boot,,Warm,80,3,Shoes,\n"
+            "Bad price,bad,,abc,1,Shoes,\n"
+            "No category,nocat,,10,1,Hats,\n"
+            "Boot,boot,,90,2,Shoes,\n",
+            seller=self.seller,
+        )
+        self.assertEqual((result.created, result.updated, result.error_count), (2, 1, 2))
+        self.assertEqual([line for line, _ in result.errors], [4, 5])
+        self.assertIn("price", result.errors[0][1])
+        self.assertIn("category", result.errors[1][1])
+
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, self.existing.price, self.existing.stock), ("Runner", Decimal("120.00"), 7))
+        self.assertTrue(self.existing.is_featured)
+        # The slugless "Boot" got a slug that doesn't clash with the explicit one
+        self.assertEqual(sorted(Product.objects.filter(name="Boot").values_list("slug", flat=True)), ["boot", "boot-1"])
+        self.assertEqual([p.name for p in search_products("boot").object_list], ["Boot", "Boot"])
+
+    def test_jsonl_with_category_creation_and_batches(self):
+        lines = [json.dumps({"name": f"Hat {i}", "slug": f"hat-{i}", "price": "5", "stock": 1, "category": "Hats"})
+                 for i in range(7)]
+        lines.insert(3, "not json")
+        with CaptureQueriesContext(connection) as queries:
+            result = self.run_import(
+                "\n".join(lines), "jsonl", seller=self.seller, create_categories=True, batch_size=3
+            )
+        self.assertEqual((result.created, result.error_count), (7, 1))
+        # One existing-slug lookup and one product insert per batch, not per row
+        inserts = [q for q in queries if q["sql"].startswith('INSERT INTO "users_product"')]
+        self.assertEqual(len(inserts), 3)
+        # Categories are loaded once; the other query is the new category's slug check
+        self.assertEqual(len([q for q in queries if 'FROM "users_category"' in q["sql"]]), 2)
+        self.assertEqual(Category.objects.get(name="Hats").products.count(), 7)
+
+    def test_cannot_overwrite_another_sellers_product(self):
+        other = User.objects.create_user("other")
+        result = self.run_import("name,slug,price,stock,category\nMine,runner,1,1,Shoes\n", seller=other)
+        self.assertEqual(result.errors[0][1], {"slug": ["A product with this slug belongs to another seller."]})
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.name, "Old Runner")
+
+    def test_upload_view_and_command(self):
+        self.client.force_login(self.seller)
+        upload = SimpleUploadedFile("items.csv", b"\xef\xbb\xbfname,price,stock,category\nSandal,15,4,Shoes\n")
+        response = self.client.post(reverse("users:import_products"), {"file": upload})
+        self.assertEqual(response.context["result"].created, 1)
+        self.assertEqual(Product.objects.get(name="Sandal").seller, self.seller)
+
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as fh:
+            fh.write('{"name": "Clog", "price": "9", "stock": 1, "category": "Shoes"}\n')
+        self.addCleanup(os.remove, fh.name)
+        out = StringIO()
+        call_command("import_products", fh.name, "--seller", "seller", stdout=out)
+        self.assertIn("1 created, 0 updated, 0 rejected", out.getvalue())
+
+    def test_command_without_seller_only_updates(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as fh:
+            fh.write("name,slug,price,stock,category\nRunner,runner,20,5,Shoes\nNew,new,9,1,Shoes\nLoafer,,9,1,Shoes\n")
+        self.addCleanup(os.remove, fh.name)
+        out, err = StringIO(), StringIO()
+        call_command("import_products", fh.name, stdout=out, stderr=err)
+        self.assertIn("0 created, 1 updated, 2 rejected", out.getvalue())
+        self.assertIn("line 3: seller: New products need a seller", err.getvalue())
+        self.assertIn("line 4: seller:", err.getvalue())
+        self.assertEqual(list(Product.objects.values_list("slug", "seller")), [("runner", self.seller.pk)])
+
+
+# --------------------- ORDER EXPORT --------------------- #
+SHIPPING = {"address": "1 Main St", "city": "Pune", "state": "MH", "zipcode": "411001", "country": "India", "phone": "1"}
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller")
+        self.other = User.objects.create_user("other")
+        self.buyer = User.objects.create_user("buyer")
+        category = Category.objects.create(name="Shoes")
+        self.shoe = make_product(category, name="Shoe", price="100.00", stock=50, seller=self.seller)
+        self.hat = make_product(category, name="Hat", price="20.00", stock=50, seller=self.other)
+
+    def test_csv_rows_and_chunked_queries(self):
+        for _ in range(5):
+            place_order(self.buyer, [(self.shoe.id, 2, "42")], shipping=SHIPPING, payment_method="cod")
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(exports.csv_rows(exports.export_queryset(), chunk_size=2))
+        # One streamed orders query (address, payment and users joined) plus one items query per chunk
+        self.assertEqual(len(queries), 4)
+        self.assertEqual(len(rows), 6)
+        header = rows[0].strip().split(",")
+        line = dict(zip(header, rows[1].strip().split(",")))
+        self.assertEqual(line["seller"], "seller")
+        self.assertEqual(line["city"], "Pune")
+        self.assertEqual(line["payment_method"], "cod")
+        self.assertEqual(line["line_total"], "200.00")
+        self.assertEqual((line["shipping_fee"], line["order_total"]), ("50.00", "250.00"))
+
+    def test_filters(self):
+        place_order(self.buyer, [(self.shoe.id, 1, None), (self.hat.id, 1, None)])
+        old = place_order(self.buyer, [(self.shoe.id, 1, None)])[0]
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=10), status="Delivered")
+
+        self.assertEqual(exports.export_queryset(seller=self.other).count(), 1)
+        self.assertEqual(exports.export_queryset(status="Delivered").get(), old)
+        today = timezone.localdate()
+        self.assertEqual(exports.export_queryset(date_from=today - timedelta(days=1)).count(), 2)
+        self.assertEqual(exports.export_queryset(date_to=today - timedelta(days=5)).get(), old)
+
+    def test_sellers_only_export_their_own_sales(self):
+        place_order(self.buyer, [(self.shoe.id, 1, None), (self.hat.id, 3, None)])
+        self.client.force_login(self.other)
+        url = reverse("users:export_orders")
+        # A non-staff user asking for someone else's sales still only gets their own
+        response = self.client.get(url, {"format": "jsonl", "seller": self.seller.pk})
+        records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual([(r["seller"], r["items"][0]["quantity"]) for r in records], [("other", 3)])
+
+        self.assertEqual(self.client.get(url, {"status": "Lost"}).status_code, 400)
+
+    def test_formula_cells_are_quoted(self):
+        self.shoe.name = "=HYPERLINK(\"http://evil\")"
+        self.shoe.save()
+        place_order(self.buyer, [(self.shoe.id, 1, "-1")], shipping={**SHIPPING, "address": "@home"})
+        rows = list(csv.DictReader(exports.csv_rows(exports.export_queryset())))
+        self.assertEqual(rows[0]["product"], "'=HYPERLINK(\"http://evil\")")
+        self.assertEqual((rows[0]["size"], rows[0]["address"]), ("'-1", "'@home"))
+        self.assertEqual(rows[0]["line_total"], "100.00")
+
+
+@override_settings(RECOMMENDATIONS_ASYNC=False)
+class AsgiOrderExportTests(TransactionTestCase):
+    def test_streams_in_batches_under_asgi(self):
+        seller = User.objects.create_user("seller")
+        shoe = make_product(Category.objects.create(name="Shoes"), name="Shoe", stock=50, seller=seller)
+        for _ in range(5):
+            place_order(User.objects.create_user(f"buyer{_}"), [(shoe.id, 1, None)])
+        self.client.force_login(seller)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        scope = {
+            "type": "http", "method": "GET", "path": reverse("users:export_orders"),
+            "query_string": b"format=jsonl", "headers": [(b"host", b"testserver"), (b"cookie", cookie.encode())],
+        }
+        sent = []
+        received = False
+
+        async def receive():
+            nonlocal received
+            if received:
+                await asyncio.Event().wait()  # the client never disconnects
+            received = True
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            if message.get("body"):
+                message["records_read"] = record.call_count
+            sent.append(message)
+
+        with mock.patch.object(exports, "BATCH_ROWS", 2), \
+                mock.patch.object(exports, "order_record", wraps=exports.order_record) as record:
+            async_to_sync(ASGIHandler())(scope, receive, send)
+        bodies = [m for m in sent if m.get("body")]
+        self.assertEqual(sent[0]["status"], 200)
+        # Each batch is sent before the next is read, not the whole export at once
+        self.assertEqual([m["records_read"] for m in bodies], [2, 4, 5])
+        self.assertEqual(len(b"".join(m["body"] for m in bodies).splitlines()), 5)
+
+
+# --------------------- RECOMMENDATIONS --------------------- #
+@override_settings(RECOMMENDATIONS_ASYNC=False)
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.buyer = User.objects.create_user("buyer")
+        sellers = [User.objects.create_user("seller1"), User.objects.create_user("seller2")]
+        category = Category.objects.create(name="Shoes")
+        self.products = [
+            make_product(category, name=f"P{i}", stock=100, seller=sellers[i % 2]) for i in range(6)
+        ]
+
+    def buy(self, *indexes):
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.buyer, [(self.products[i].id, 1, None) for i in indexes])
+
+    def neighbors(self):
+        return sorted(ProductNeighbor.objects.values_list("product_id", "neighbor_id", "score"))
+
+    def test_incremental_matches_rebuild(self):
+        p = self.products
+        # Baskets span sellers, so one checkout is split into several orders
+        self.buy(0, 1, 2)
+        self.buy(0, 1)
+        self.buy(0, 3)
+        self.buy(4)
+        legacy = Order.objects.create(user=self.buyer, seller=p[0].seller)  # no checkout_ref
+        OrderItem.objects.bulk_create([OrderItem(order=legacy, product=p[i], price=1) for i in (0, 5)])
+
+        self.assertEqual(frequently_bought_with(p[0]), [p[1], p[2], p[3]])
+        self.assertEqual(ProductPair.objects.get(product=p[0], other=p[1]).count, 2)
+        incremental = self.neighbors()
+
+        self.assertEqual(rebuild_recommendations(), 10)
+        # The rebuild also picks up the legacy order written without place_order
+        self.assertEqual(self.neighbors(), sorted(incremental + [(p[0].id, p[5].id, 1), (p[5].id, p[0].id, 1)]))
+
+    def test_top_k_is_capped(self):
+        with mock.patch("users.recommendations.TOP_K", 2):
+            self.buy(0, 1, 2, 3)
+            self.buy(0, 3)
+            self.buy(0, 2)
+        top = ProductNeighbor.objects.filter(product=self.products[0]).order_by("-score", "neighbor_id")
+        self.assertEqual([(n.neighbor_id, n.score) for n in top], [(self.products[2].id, 2), (self.products[3].id, 2)])
+
+    def test_product_page_uses_one_lookup(self):
+        self.buy(0, 1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("users:product_detail", args=[self.products[0].slug]))
+        self.assertEqual(list(response.context["bought_together"]), [self.products[1]])
+        self.assertEqual(len([q for q in queries if "users_productneighbor" in q["sql"]]), 1)
+
+
+# --------------------- FRAGMENT CACHE --------------------- #
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("shopper")
+        self.client.force_login(self.user)
+        self.shoes = Category.objects.create(name="Shoes")
+        self.hats = Category.objects.create(name="Hats")
+        self.boot = make_product(self.shoes, name="Boot")
+        self.clog = make_product(self.shoes, name="Clog")
+        self.cap = make_product(self.hats, name="Cap")
+
+    def section_keys(self):
+        return fragments.fragment_keys("category-section", [self.shoes, self.hats])
+
+    def test_shop_sections_are_reused_until_a_product_changes(self):
+        url = reverse("users:shop")
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as cached:
+            self.assertContains(self.client.get(url), "Boot")
+        self.assertFalse([q for q in cached if 'FROM "users_product"' in q["sql"]])
+
+        before = self.section_keys()
+        self.boot.name = "Riding Boot"
+        self.boot.save()
+        after = self.section_keys()
+        self.assertNotEqual(before[self.shoes], after[self.shoes])
+        self.assertEqual(before[self.hats], after[self.hats])
+
+        clog_card = fragments.fragment_key("product-card", self.clog)
+        self.assertIsNotNone(cache.get(clog_card))
+        self.assertContains(self.client.get(url), "Riding Boot")
+        # The unchanged card was reused while re-rendering the section
+        self.assertIsNotNone(cache.get(clog_card))
+
+    def test_moving_a_product_invalidates_both_categories(self):
+        before = self.section_keys()
+        self.cap.category = self.shoes
+        self.cap.save()
+        after = self.section_keys()
+        self.assertNotEqual(before[self.shoes], after[self.shoes])
+        self.assertNotEqual(before[self.hats], after[self.hats])
+
+    def test_cached_cards_carry_each_visitors_csrf_token(self):
+        url = reverse("users:shop")
+        tokens = []
+        for name in ("a", "b"):
+            self.client.force_login(User.objects.create_user(name))
+            html = self.client.get(url).content.decode()
+            self.assertNotIn(fragments.CSRF_PLACEHOLDER, html)
+            tokens.append(set(re.findall(r'name="csrfmiddlewaretoken" value="(\w+)"', html)))
+            self.assertEqual(len(tokens[-1]), 1)
+        self.assertNotEqual(tokens[0], tokens[1])
+
+    def test_product_detail_and_category_pages(self):
+        detail = reverse("users:product_detail", args=[self.cap.slug])
+        self.client.get(detail)
+        # Writes that skip signals aren't seen until the product's generation moves
+        Product.objects.filter(pk=self.cap.pk).update(description="Woollen")
+        self.assertNotContains(self.client.get(detail), "Woollen")
+        fragments.bump_products([self.cap])
+        self.assertContains(self.client.get(detail), "Woollen")
+
+        response = self.client.get(reverse("users:category_view", args=[self.shoes.slug]))
+        self.assertContains(response, "Clog")
+        self.assertNotContains(response, "Cap")
+
+
+# --------------------- CONDITIONAL GET --------------------- #
+@override_settings(RECOMMENDATIONS_ASYNC=False)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("shopper")
+        self.client.force_login(self.user)
+        self.shoes = Category.objects.create(name="Shoes")
+        self.boot = make_product(self.shoes, name="Boot")
+        self.clog = make_product(self.shoes, name="Clog")
+        self.detail = reverse("users:product_detail", args=[self.boot.slug])
+
+    def revalidate(self, url, **params):
+        first = self.client.get(url, params)
+        self.assertEqual(first.status_code, 200)
+        self.client.get(url, params)  # the first response set the CSRF cookie the ETag includes
+        etag = self.client.get(url, params)["ETag"]
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_product_is_answered_304_without_querying_or_rendering(self):
+        response = self.client.get(self.detail)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("Last-Modified", response)
+        self.client.get(self.detail)
+        etag = self.client.get(self.detail)["ETag"]
+        with CaptureQueriesContext(connection) as queries, self.assertTemplateNotUsed("users/product_details.html"):
+            response = self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in queries if 'FROM "users_product"' in q["sql"]])
+
+    def test_changes_to_the_page_change_the_etag(self):
+        etag = self.revalidate(self.detail)["ETag"]
+        self.boot.price = "12.00"
+        self.boot.save()
+        self.assertEqual(self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(self.detail)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(user=self.user, seller=self.user)
+            for product in (self.boot, self.clog):
+                OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+            rebuild_recommendations()
+        self.assertEqual(self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Renaming a product listed under "frequently bought together"
+        etag = self.client.get(self.detail)["ETag"]
+        self.clog.name = "Wooden Clog"
+        self.clog.save()
+        response = self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Wooden Clog")
+
+        # The navbar cart badge
+        etag = response["ETag"]
+        CartItem.objects.create(cart=Cart.objects.create(user=self.user), product=self.clog, quantity=1)
+        self.assertEqual(self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_renamed_slug_is_not_served_from_the_old_mapping(self):
+        self.revalidate(self.detail)
+        self.boot.slug = "riding-boot"
+        self.boot.save()
+        self.assertEqual(self.client.get(self.detail).status_code, 404)
+
+    def test_category_pages(self):
+        url = reverse("users:category_view", args=[self.shoes.slug])
+        response = self.revalidate(url)
+        self.assertEqual(response.status_code, 304)
+        etag = response["ETag"]
+        make_product(self.shoes, name="Sandal")
+        self.assertContains(self.client.get(url, HTTP_IF_NONE_MATCH=etag), "Sandal")
+        # Sold counts change without bumping anything, so that ordering always renders
+        self.assertNotIn("ETag", self.client.get(url, {"order": "popular"}))
+
+    def test_media_is_served_with_etags(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        os.makedirs(os.path.join(media, "derivatives", "ab"))
+        with open(os.path.join(media, "derivatives", "ab", "abc-200.webp"), "wb") as fh:
+            fh.write(b"image")
+        factory = RequestFactory()
+        with override_settings(MEDIA_ROOT=media):
+            response = conditional.serve_media(factory.get("/media/x"), "derivatives/ab/abc-200.webp")
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("immutable", response["Cache-Control"])
+            request = factory.get("/media/x", HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(conditional.serve_media(request, "derivatives/ab/abc-200.webp").status_code, 304)
+            with self.assertRaises(Http404):
+                conditional.serve_media(factory.get("/media/x"), "missing.png")
+
+
+# --------------------- ASYNC VIEWS --------------------- #
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("shopper")
+        self.shoes = Category.objects.create(name="Shoes")
+        self.boot = make_product(self.shoes, name="Boot")
+
+    def use_async_views(self):
+        # users/urls.py picks the storefront views when it is imported
+        with override_settings(ASYNC_VIEWS=True):
+            importlib.reload(users_urls)
+            importlib.reload(ecommerce_urls)
+        clear_url_caches()
+        self.addCleanup(clear_url_caches)
+        self.addCleanup(importlib.reload, ecommerce_urls)
+        self.addCleanup(importlib.reload, users_urls)
+
+    def test_wsgi_keeps_the_sync_views(self):
+        for name, args in [("shop", []), ("product_detail", [self.boot.slug]), ("search", []), ("cart_count", [])]:
+            self.assertFalse(iscoroutinefunction(resolve(reverse(f"users:{name}", args=args)).func), name)
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse("users:shop")), "Boot")
+        self.assertContains(self.client.get(reverse("users:search"), {"q": "boot"}), "Boot")
+        self.assertEqual(self.client.get(reverse("users:cart_count")).json(), {"cart_count": 0, "wishlist_count": 0})
+
+    async def test_views_run_through_the_async_stack(self):
+        self.use_async_views()
+        self.assertTrue(iscoroutinefunction(resolve(reverse("users:shop")).func))
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse("users:shop"))
+        self.assertContains(response, "Boot")
+        self.assertIn("queries", response["Server-Timing"])
+
+        response = await self.async_client.get(reverse("users:product_detail", args=[self.boot.slug]))
+        self.assertContains(response, "Boot")
+        response = await self.async_client.get(reverse("users:search"), {"q": "boot"})
+        self.assertContains(response, "Boot")
+
+    def test_cart_count(self):
+        self.use_async_views()
+        url = reverse("users:cart_count")
+        self.client.get(reverse("users:add_to_cart", args=[self.boot.id]))
+        self.assertEqual(self.client.get(url).json(), {"cart_count": 1, "wishlist_count": 0})
+
+        self.client.force_login(self.user)
+        CartItem.objects.filter(cart__user=self.user).update(quantity=3)
+        counters.invalidate(self.user.pk)
+        self.assertEqual(self.client.get(url).json(), {"cart_count": 3, "wishlist_count": 0})
+        # Counted once, then served from the navbar cache
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse([q for q in queries if "users_cartitem" in q["sql"]])
+
+
+class QueryFanOutTests(TransactionTestCase):
+    def test_groups_run_on_their_own_threads_and_connections(self):
+        Category.objects.create(name="Shoes")
+        barrier = threading.Barrier(2, timeout=5)
+
+        def count(model):
+            barrier.wait()  # both groups are running at once
+            return model.objects.count(), threading.get_ident()
+
+        (categories, first), (users, second) = async_to_sync(aio.gather)(
+            lambda: count(Category), lambda: count(User)
+        )
+        self.assertEqual((categories, users), (1, 0))
+        self.assertNotEqual(first, second)
@@ -1,18 +1,24 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI the read-heavy storefront pages are served by async views
+# (ecommerce/asgi.py sets ASYNC_VIEWS); WSGI keeps the sync ones
+ASYNC = getattr(settings, "ASYNC_VIEWS", False)
+
 app_name = "users"
 
 urlpatterns = [
     path("", views.base_view, name="base"),
-    path("shop/", views.shop_view, name="shop"),
+    path("shop/", views.ashop_view if ASYNC else views.shop_view, name="shop"),
     path("about/", views.about_view, name="about"),
     path("contact/", views.contact_view, name="contact"),
     
 
     path("products/", views.product_list, name="product_list"),
-    path("product/<slug:slug>/", views.product_detail, name="product_detail"),
+    path("product/<slug:slug>/", views.aproduct_detail if ASYNC else views.product_detail, name="product_detail"),
     path("category/<slug:slug>/", views.category_view, name="category_view"),
+    path("api/products/", views.product_feed, name="product_feed"),
 
     path("cart/", views.view_cart, name="view_cart"),
     path("cart/add/<int:product_id>/", views.add_to_cart, name="add_to_cart"),
@@ -28,6 +34,8 @@ urlpatterns = [
 
     path("dashboard/", views.seller_dashboard, name="seller_dashboard"),
     path("add-product/", views.add_product, name="add_product"),
+    path("import-products/", views.import_products, name="import_products"),
+    path("dashboard/export-orders/", views.export_orders, name="export_orders"),
    
     path('wishlist/add/<int:product_id>/', views.add_to_wishlist, name='add_to_wishlist'),
     path('wishlist/remove/<int:product_id>/', views.remove_from_wishlist, name='remove_from_wishlist'),
@@ -40,10 +48,12 @@ urlpatterns = [
 
     path('dashboard/', views.seller_dashboard, name='seller_dashboard'),
     path('checkout/success/', views.order_success, name='order_success'),
-    path("search/", views.search, name="search"),
+    path("search/", views.asearch if ASYNC else views.search, name="search"),
+    path("search/autocomplete/", views.autocomplete, name="autocomplete"),
     path('update-cart-ajax/', views.update_cart_ajax, name='update_cart_ajax'),
     path('cart/update/', views.update_cart_ajax, name='update_cart_ajax'),
     path('cart/remove/', views.remove_cart_ajax, name='remove_cart_ajax'),
+    path('cart/count/', views.acart_count if ASYNC else views.cart_count, name='cart_count'),
     path('my-orders/', views.my_orders, name='my_orders'),
 
     
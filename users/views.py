@@ -1,4 +1,13 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
+from django.core.handlers.asgi import ASGIRequest
+from django.template.loader import render_to_string
+from django.middleware.csrf import get_token
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import condition, require_GET
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
@@ -10,35 +19,69 @@ from django.contrib.admin.views.decorators import staff_member_required
 
 
 from .forms import RegisterForm, ProductSearchForm, ProductForm
-from .models import Product, Category, Cart, CartItem, Wishlist, Order, OrderItem
+from .models import Product, Category, Cart, CartItem, Wishlist, Order
+from .catalog import build_catalog
+from .pagination import PAGE_SIZE, InvalidCursor, keyset_page
+from .search import search_products
+from .analytics import seller_stats
+from .recommendations import frequently_bought_with
+from .context_processors import navbar_counts
+from .images import prime as prime_images
+from . import aio, cart as cart_service, conditional, counters, fragments
+from . import imports as product_imports
+from . import exports as order_exports
 
 # --------------------- GENERAL VIEWS --------------------- #
 def base_view(request):
     return render(request, "users/base.html")
 
 
+def _render_category_sections(categories):
+    # Products of every uncached category in one query
+    products = build_catalog(categories=categories)["category_products"]
+    prime_images(p.image.name for items in products.values() for p in items)
+    return {
+        category: render_to_string("users/_category_section.html", {
+            "category": category,
+            "products": products[category],
+            "csrf_token": fragments.CSRF_PLACEHOLDER,
+        })
+        for category in categories
+    }
+
+
+def _category_sections():
+    # Each category's section is cached until one of its products changes
+    categories = list(Category.objects.order_by("id"))
+    sections = fragments.cached_many("category-section", categories, _render_category_sections)
+    return [sections[category] for category in categories]
+
+
+async def _navbar_counts(request):
+    # Warms the cache the navbar context processor reads while rendering;
+    # anonymous counts come from the session and cost nothing
+    if request.user.is_authenticated:
+        return await counters.anavbar_counts(request.user)
+
+
 @login_required(login_url='users:login')
 def shop_view(request):
-    # Get all products
-    all_products = Product.objects.all()
-    
-    # Get all categories
-    categories = Category.objects.all()
-    
-    # Prepare a dictionary mapping each category to its products
-    category_products = {}
-    for category in categories:
-        category_products[category.name] = Product.objects.filter(category=category)
-    
-    # Featured products and best sellers
-    featured_products = Product.objects.filter(is_featured=True)
-    best_sellers = Product.objects.order_by('-sold')[:10]
-
+    token = get_token(request)
     return render(request, "users/shop.html", {
-        "all_products": all_products,
-        "category_products": category_products,
-        "featured_products": featured_products,
-        "best_sellers": best_sellers
+        "category_sections": [fragments.fill_csrf(section, token) for section in _category_sections()],
+    })
+
+
+# The async storefront views below are used under ASGI (settings.ASYNC_VIEWS,
+# see users/urls.py). They fan their independent queries out over
+# aio.gather() and warm the navbar counts alongside.
+@login_required(login_url='users:login')
+async def ashop_view(request):
+    await aio.resolve_user(request)
+    sections, _ = await aio.gather(_category_sections, _navbar_counts(request))
+    token = get_token(request)
+    return await sync_to_async(render)(request, "users/shop.html", {
+        "category_sections": [fragments.fill_csrf(section, token) for section in sections],
     })
 
 
@@ -106,30 +149,31 @@ def profile_view(request):
 
 # --------------------- CART --------------------- #
 def view_cart(request):
-    # Get cart for logged-in user
+    # Logged-in users have a Cart; anonymous visitors keep theirs in the session
     if request.user.is_authenticated:
-        cart_items = CartItem.objects.filter(cart__user=request.user)
-        cart_total = sum([item.total for item in cart_items])
-        shipping_cost = 10  # Example flat shipping
+        cart_items = list(cart_service.cart_items(request.user))
+        summary = cart_service.cart_summary(request.user)
     else:
-        cart_items = []
-        cart_total = 0
-        shipping_cost = 0
+        cart_items = cart_service.session_cart_items(request.session)
+        summary = cart_service.summarize(cart_items)
 
     context = {
         'cart_items': cart_items,
-        'cart_total': cart_total,
-        'shipping_cost': shipping_cost,
-        'cart_count': cart_items.count(),
-        'wishlist_count': 0,  # replace with real wishlist count if needed
+        'cart_total': summary["subtotal"],
+        'shipping_cost': summary["shipping"],
+        'grand_total': summary["total"],
     }
     return render(request, 'users/cart.html', context)
 
 
 
-@login_required(login_url='users:login')
 def add_to_cart(request, product_id):
     product = get_object_or_404(Product, id=product_id)
+    if not request.user.is_authenticated:
+        cart_service.add_to_session(request.session, product.id)
+        messages.success(request, f"{product.name} added to cart.")
+        return redirect("users:view_cart")
+
     cart, _ = Cart.objects.get_or_create(user=request.user,)
     cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
     if not created:
@@ -139,8 +183,13 @@ def add_to_cart(request, product_id):
     return redirect("users:view_cart")  # redirect to cart page
 
 
-@login_required(login_url='users:login')
 def remove_from_cart(request, item_id):
+    if not request.user.is_authenticated:
+        # Session cart items are identified by product id
+        cart_service.set_session_quantity(request.session, item_id, 0)
+        messages.info(request, "Item removed from cart.")
+        return redirect("users:view_cart")
+
     cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
     cart_item.delete()
     messages.info(request, "Item removed from cart.")
@@ -176,7 +225,6 @@ def wishlist_view(request):
     wishlist_items = wishlist.items.all()
     context = {
         'wishlist_items': wishlist_items,
-        'wishlist_count': wishlist_items.count(),
     }
     return render(request, 'users/wishlist.html', context)
 
@@ -192,60 +240,55 @@ def remove_from_wishlist(request, product_id):
 
 # --------------------- CHECKOUT --------------------- #
 from .forms import CheckoutForm  # <-- we’ll use a Django form for shipping details
+from .models import order_totals
+from .orders import OutOfStock, checkout_cart, place_order
 
 @login_required(login_url='users:login')
 def checkout(request, product_id=None):
-    shipping_cost = 50  # example shipping cost
-
     if product_id:  # Single product checkout
         product = get_object_or_404(Product, id=product_id)
         items = None
         subtotal = product.price
-        total = subtotal + shipping_cost
     else:  # Cart checkout
         cart = get_object_or_404(Cart, user=request.user)
-        items = cart.items.all()
+        summary = cart_service.cart_summary(request.user)
 
-        if not items.exists():
+        if not summary["line_count"]:
             messages.error(request, "Your cart is empty!")
             return redirect("users:shop")
 
-        subtotal = sum(item.product.price * item.quantity for item in items)
-        total = subtotal + shipping_cost
+        items = cart_service.cart_items(request.user)
+        subtotal = summary["subtotal"]
         product = None
+    subtotal, shipping_cost, total = order_totals(subtotal)
 
     if request.method == "POST":
         form = CheckoutForm(request.POST)
         if form.is_valid():
-            order = Order.objects.create(
-                user=request.user,
-                seller=(product.seller if product else items[0].product.seller),
-                
-                status="Pending"
-            )
-
-            if product:  # Single product order
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=1,
-                    size=request.POST.get("size", None),
-                    price=product.price
-                )
-            else:  # Multiple cart items
-                for item in items:
-                    OrderItem.objects.create(
-                        order=order,
-                        product=item.product,
-                        quantity=item.quantity,
-                        size=item.size if hasattr(item, 'size') else None,
-                        price=item.product.price
+            data = form.cleaned_data
+            shipping = {
+                "address": data["address"],
+                "city": data["city"],
+                "state": data["state"],
+                "zipcode": data["zip_code"],
+                "phone": data["phone"],
+            }
+            try:
+                if product:  # Single product order
+                    lines = [(product.id, 1, request.POST.get("size") or None)]
+                    place_order(request.user, lines, shipping, data["payment_method"])
+                else:  # Everything in the cart; the cart is emptied in the same transaction
+                    checkout_cart(cart, shipping, data["payment_method"])
+            except OutOfStock as e:
+                for shortage in e.shortages:
+                    messages.error(
+                        request,
+                        f"Only {shortage['available']} left of {shortage['product'].name} "
+                        f"(you asked for {shortage['requested']}).",
                     )
-                # Remove items from cart after order
-                items.delete()
-
-            messages.success(request, "Your order has been placed successfully! 🎉")
-            return redirect("users:order_success")
+            else:
+                messages.success(request, "Your order has been placed successfully! 🎉")
+                return redirect("users:order_success")
     else:
         form = CheckoutForm()
 
@@ -261,25 +304,86 @@ def checkout(request, product_id=None):
 
 
 # --------------------- PRODUCTS --------------------- #
+def _keyset_page(request, products):
+    try:
+        return keyset_page(products, request.GET.get("order"), request.GET.get("cursor"))
+    except InvalidCursor:
+        return keyset_page(products, request.GET.get("order"))
+
+
 def product_list(request):
     products = Product.objects.all()
+    page = page_obj = None
     form = ProductSearchForm(request.GET)
-    if form.is_valid():
-        query = form.cleaned_data.get("query")
-        if query:
-            products = products.filter(name__icontains=query)
-    return render(request, "users/product_list.html", {"products": products, "form": form})
+    query = form.cleaned_data.get("query") if form.is_valid() else None
+    if query:
+        page_obj = search_products(query, page=request.GET.get("page"))
+        products = page_obj.object_list
+    else:
+        page = _keyset_page(request, products)
+        products = page["items"]
+    return render(request, "users/product_list.html", {
+        "products": products, "form": form, "query": query, "page": page, "page_obj": page_obj,
+    })
 
 
+@condition(etag_func=conditional.product_etag)
 def product_detail(request, slug):
     product = get_object_or_404(Product, slug=slug)
-    return render(request, "users/product_details.html", {"product": product})
+    response = render(request, "users/product_details.html", {
+        "product": product,
+        "bought_together": frequently_bought_with(product),
+    })
+    return conditional.revalidate(response, last_modified=product.updated_at)
 
 
+@aio.condition(conditional.product_etag)
+async def aproduct_detail(request, slug):
+    await aio.resolve_user(request)
+    product = await aget_object_or_404(Product, slug=slug)
+    bought_together, _ = await aio.gather(partial(frequently_bought_with, product), _navbar_counts(request))
+    response = await sync_to_async(render)(request, "users/product_details.html", {
+        "product": product,
+        "bought_together": bought_together,
+    })
+    return conditional.revalidate(response, last_modified=product.updated_at)
+
+
+@condition(etag_func=conditional.category_etag)
 def category_view(request, slug):
     category = get_object_or_404(Category, slug=slug)
-    products = category.products.all()
-    return render(request, "users/category.html", {"category": category, "products": products})
+    page = _keyset_page(request, category.products.all())
+    response = render(request, "users/category.html", {"category": category, "products": page["items"], "page": page})
+    return conditional.revalidate(response)
+
+
+@require_GET
+def product_feed(request):
+    """JSON product listing: ?category=<slug>&order=new|popular&cursor=...&limit=..."""
+    products = Product.objects.all()
+    if request.GET.get("category"):
+        products = products.filter(category__slug=request.GET["category"])
+    try:
+        limit = int(request.GET.get("limit", PAGE_SIZE))
+        page = keyset_page(products, request.GET.get("order"), request.GET.get("cursor"), limit)
+    except (InvalidCursor, ValueError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({
+        "results": [
+            {
+                "id": p.id,
+                "name": p.name,
+                "slug": p.slug,
+                "price": str(p.price),
+                "sold": p.sold,
+                "image": p.image.url if p.image else None,
+                "url": reverse("users:product_detail", args=[p.slug]),
+            }
+            for p in page["items"]
+        ],
+        "order": page["ordering"],
+        "next_cursor": page["next_cursor"],
+    })
 
 
 # --------------------- SELLER DASHBOARD --------------------- #
@@ -303,20 +407,51 @@ def add_product(request):
 
 
 
+@staff_member_required(login_url='users:login')
+def import_products(request):
+    result = None
+    if request.method == 'POST' and request.FILES.get('file'):
+        upload = request.FILES['file']
+        result = product_imports.import_products(
+            product_imports.text_stream(upload),
+            product_imports.detect_format(upload.name),
+            seller=request.user,
+            create_categories=bool(request.POST.get('create_categories')),
+        )
+        if result.ok:
+            messages.success(request, f"Imported {result.created} new and {result.updated} updated products.")
+        else:
+            messages.warning(request, f"{result.error_count} rows were rejected; the valid rows were imported.")
+    return render(request, 'users/import_products.html', {'result': result})
+
+
+@login_required(login_url='users:login')
+def export_orders(request):
+    # Staff can export every order; anyone else only their own sales
+    form = order_exports.OrderExportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    filters = {key: form.cleaned_data[key] for key in ('date_from', 'date_to', 'status', 'seller')}
+    if not request.user.is_staff:
+        filters['seller'] = request.user
+    fmt = form.cleaned_data['format']
+    rows = order_exports.WRITERS[fmt](order_exports.export_queryset(**filters))
+    if isinstance(request, ASGIRequest):
+        rows = order_exports.arows(rows)  # a sync iterator would be read whole before sending
+    response = StreamingHttpResponse(rows, content_type=order_exports.CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="orders.{fmt}"'
+    return response
+
+
 @login_required(login_url='users:login')
 def seller_dashboard(request):
     # Only fetch products created by this seller (logged-in user)
-    products = Product.objects.filter(seller=request.user)
-
-    # Example stats (you can adjust later)
-    total_orders = 0
-    total_revenue = 0
+    products = Product.objects.filter(seller=request.user).select_related("category")
 
-    return render(request, "users/seller_dashboard.html", {
-        "products": products,
-        "total_orders": total_orders,
-        "total_revenue": total_revenue,
-    })
+    # Sales figures come from the pre-aggregated rollups, not the orders table
+    context = seller_stats(request.user)
+    context["products"] = products
+    return render(request, "users/seller_dashboard.html", context)
 
 
 
@@ -378,81 +513,125 @@ def order_success(request):
 
 def search(request):
     query = request.GET.get("q", "")
-    results = Product.objects.filter(name__icontains=query) if query else []
-    return render(request, "users/search_results.html", {"query": query, "results": results})
+    page_obj = search_products(query, page=request.GET.get("page")) if query else None
+    results = page_obj.object_list if page_obj else []
+    return render(request, "users/search_results.html", {"query": query, "results": results, "page_obj": page_obj})
+
+
+async def asearch(request):
+    await aio.resolve_user(request)
+    query = request.GET.get("q", "")
+    page_obj = None
+    if query:
+        page_obj, _ = await aio.gather(
+            partial(search_products, query, page=request.GET.get("page")), _navbar_counts(request)
+        )
+    results = page_obj.object_list if page_obj else []
+    return await sync_to_async(render)(request, "users/search_results.html", {
+        "query": query, "results": results, "page_obj": page_obj,
+    })
 
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 from .models import CartItem
+from .autocomplete import suggest
 
-@require_POST
-def update_cart_ajax(request):
-    item_id = request.POST.get('item_id')
-    quantity = request.POST.get('quantity')
 
+@require_GET
+def cart_count(request):
+    """Navbar badge counts as JSON, for refreshing them without a page load."""
+    return JsonResponse(navbar_counts(request))
+
+
+@require_GET
+async def acart_count(request):
+    if (await aio.resolve_user(request)).is_authenticated:
+        counts = await counters.anavbar_counts(request.user)
+    else:
+        counts = await sync_to_async(navbar_counts)(request)  # from the session
+    return JsonResponse(counts)
+
+
+@require_GET
+def autocomplete(request):
+    query = request.GET.get("q", "")
     try:
-        item = CartItem.objects.get(id=item_id)
-        item.quantity = quantity
-        item.save()
-        # Return updated totals
-        return JsonResponse({
-            'item_total': item.get_total_price(),
-            'cart_total': item.cart.get_total_price(),
-            'shipping': item.cart.get_shipping_cost()
-        })
-    except CartItem.DoesNotExist:
-        return JsonResponse({'error': 'Item not found'}, status=404)
-    
+        limit = min(int(request.GET.get("limit", 8)), 20)
+    except ValueError:
+        limit = 8
+    return JsonResponse({"query": query, "results": suggest(query, limit)})
 
+
+def _session_cart_json(request, item_id=None):
+    items = cart_service.session_cart_items(request.session)
+    data = cart_service.summary_json(cart_service.summarize(items))
+    for item in items:
+        if item.id == item_id:
+            data['item_total'] = cart_service.money(item.line_total)
+    return JsonResponse(data)
+
+
+@require_POST
 def update_cart_ajax(request):
-    if request.method == 'POST':
-        item_id = request.POST.get('item_id')
+    try:
+        item_id = int(request.POST.get('item_id'))
         quantity = int(request.POST.get('quantity', 1))
-        item = CartItem.objects.get(id=item_id)
-        item.quantity = quantity
-        item.save()
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'Invalid quantity'}, status=400)
+    if quantity < 1:
+        return JsonResponse({'error': 'Invalid quantity'}, status=400)
+
+    if not request.user.is_authenticated:
+        if item_id not in cart_service.session_lines(request.session):
+            return JsonResponse({'error': 'Item not found'}, status=404)
+        cart_service.set_session_quantity(request.session, item_id, quantity)
+        return _session_cart_json(request, item_id)
+
+    updated = CartItem.objects.filter(id=item_id, cart__user=request.user).update(quantity=quantity)
+    if not updated:
+        return JsonResponse({'error': 'Item not found'}, status=404)
+    counters.invalidate(request.user.pk)  # update() sends no signals
 
-        cart = item.cart
-        item_total = item.total
-        cart_total = cart.total
-        shipping = cart.shipping_cost  # or set a fixed value
+    item = cart_service.cart_items(request.user).get(id=item_id)
+    summary = cart_service.cart_summary(request.user)
+    return JsonResponse({'item_total': cart_service.money(item.line_total), **cart_service.summary_json(summary)})
 
-        return JsonResponse({'item_total': item_total, 'cart_total': cart_total, 'shipping': shipping})
 
+@require_POST
 def remove_cart_ajax(request):
-    if request.method == 'POST':
-        item_id = request.POST.get('item_id')
-        item = CartItem.objects.get(id=item_id)
-        cart = item.cart
-        item.delete()
-
-        cart_total = cart.total
-        shipping = cart.shipping_cost  # or fixed value
-        return JsonResponse({'cart_total': cart_total, 'shipping': shipping})
-    
+    if not request.user.is_authenticated:
+        try:
+            item_id = int(request.POST.get('item_id'))
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'Item not found'}, status=404)
+        if item_id not in cart_service.session_lines(request.session):
+            return JsonResponse({'error': 'Item not found'}, status=404)
+        cart_service.set_session_quantity(request.session, item_id, 0)
+        return _session_cart_json(request)
+
+    deleted, _ = CartItem.objects.filter(id=request.POST.get('item_id'), cart__user=request.user).delete()
+    if not deleted:
+        return JsonResponse({'error': 'Item not found'}, status=404)
+    return JsonResponse(cart_service.summary_json(cart_service.cart_summary(request.user)))
+
 
 @login_required(login_url='users:login')
 def order_summary(request):
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    items = CartItem.objects.filter(cart=cart)
-
-    # Calculate total price per item and overall subtotal
+    # Line totals and the subtotal come from the database
+    items = list(cart_service.cart_items(request.user))
     for item in items:
-        item.total_price = item.product.price * item.quantity  # Add total_price to each item
-
-    subtotal = sum(item.total_price for item in items)
-    shipping_fee = 50  # example fixed shipping
-    total_price = subtotal + shipping_fee
+        item.total_price = item.line_total
+    summary = cart_service.cart_summary(request.user)
 
     context = {
         "order": {
             "items": items,
-            "subtotal": subtotal,
-            "shipping_fee": shipping_fee,
-            "total_price": total_price
+            "subtotal": summary["subtotal"],
+            "shipping_fee": summary["shipping"],
+            "total_price": summary["total"]
         }
     }
-    return render(request, "users/order_summary.html", )
+    return render(request, "users/order_summary.html", context)
 
 
 
@@ -462,21 +641,3 @@ def my_orders(request):
     orders = Order.objects.filter(user=request.user).order_by('-created_at')
     return render(request, "users/my_orders.html", {"orders": orders})
 
-
-
-@login_required
-def remove_cart_ajax(request):
-    if request.method == "POST":
-        item_id = request.POST.get("item_id")
-        item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
-        item.delete()
-
-        # recalculate totals
-        cart_items = CartItem.objects.filter(cart__user=request.user)
-        cart_total = sum(i.product.price * i.quantity for i in cart_items)
-        shipping = 50 if cart_total < 500 else 0
-
-        return JsonResponse({
-            "cart_total": cart_total,
-            "shipping": shipping
-        })